@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import Activity
+
+
+@admin.register(Activity)
+class ActivityAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'team', 'kind', 'object_id', 'action', 'actor')
+    list_filter = ('kind', 'action')
+    raw_id_fields = ('team', 'actor')
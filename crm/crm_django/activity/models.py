@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+from team.models import Team
+
+
+class Activity(models.Model):
+    """
+    One change to a lead, client or note, appended by activity.signals.
+
+    Rows are only ever inserted. ``changes`` is keyed by field (attname):
+    ``[old, new]`` pairs for the fields an update changed, the values set
+    for a creation, and the last values for a deletion. Long strings are
+    cut short, see ``activity.recording.MAX_VALUE_LENGTH``.
+
+    Attributes:
+        kind (str): ``lead``, ``client`` or ``note``.
+        object_id (int): Primary key of the changed row, which may be gone.
+        actor (User): Who made the change, when it came from a request.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    CHOICES_ACTION = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    )
+
+    team = models.ForeignKey(Team, related_name='activity', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=16, choices=CHOICES_ACTION)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    actor = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'activity'
+        indexes = [
+            # the team's feed, newest first (keyset pagination)
+            models.Index(fields=['team', 'created_at', 'id'], name='activity_team_created_idx'),
+            # the history of one object
+            models.Index(fields=['team', 'kind', 'object_id', 'created_at', 'id'], name='activity_object_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s %s' % (self.kind, self.object_id, self.action)
@@ -0,0 +1,177 @@
+import asyncio
+import contextvars
+import functools
+import logging
+from collections import namedtuple
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.db import models, transaction
+from django.utils import timezone
+
+from client.models import Client, Note
+from crm_django.bulk import insert_rows
+from lead.models import Lead
+from team.models import Team
+from .models import Activity
+
+logger = logging.getLogger(__name__)
+
+# Model -> recorded fields (attnames)
+TRACKED_FIELDS = {
+    Lead: (
+        'company', 'contact_person', 'email', 'phone', 'website',
+        'confidence', 'estimated_value', 'status', 'priority', 'assigned_to_id',
+    ),
+    Client: ('company', 'contact_person', 'email', 'phone', 'website'),
+    Note: ('client_id', 'name', 'body'),
+}
+
+# Strings longer than this are cut short in the log
+MAX_VALUE_LENGTH = 200
+BATCH_SIZE = 1000
+# A request's buffer is written out early once it holds this many entries
+MAX_BUFFERED = 10 * BATCH_SIZE
+
+# An Activity row waiting to be inserted; a model instance per entry would
+# cost more than the INSERT when a bulk path logs thousands of them
+Entry = namedtuple('Entry', 'team_id kind object_id action changes')
+
+# The current request's ActivityMiddleware buffer
+_buffer = contextvars.ContextVar('activity_buffer', default=None)
+
+
+def compact(value):
+    if isinstance(value, str) and len(value) > MAX_VALUE_LENGTH:
+        return value[:MAX_VALUE_LENGTH - 1] + '…'
+    return value
+
+
+def snapshot_entry(model, instance, action):
+    """A created/deleted entry holding the row's non-empty values."""
+    values = {name: getattr(instance, name) for name in TRACKED_FIELDS[model]}
+    return Entry(
+        instance.team_id, model._meta.model_name, instance.pk, action,
+        {name: compact(value) for name, value in values.items() if value not in (None, '')},
+    )
+
+
+def update_entry(model, pk, team_id, old, new):
+    """An updated entry with ``[old, new]`` for each field in ``old`` that changed, or None."""
+    changes = {name: [compact(old[name]), compact(new[name])] for name in old if old[name] != new[name]}
+    if not changes:
+        return None
+    return Entry(team_id, model._meta.model_name, pk, Activity.UPDATED, changes)
+
+
+def record(entries, using=None):
+    """
+    Log ``entries`` once the current transaction commits; they are dropped
+    with it if it rolls back.
+    """
+    entries = [entry for entry in entries if entry is not None]
+    if entries:
+        transaction.on_commit(functools.partial(committed, entries, _buffer.get()), using=using)
+
+
+def committed(entries, buffer):
+    if buffer is not None and not buffer.flushed:
+        buffer.add(entries)
+    else:
+        insert(entries, buffer.actor_id() if buffer is not None else None)
+
+
+def insert(entries, actor_id=None):
+    if any(entry.action == Activity.DELETED for entry in entries):
+        # deleting a team deletes its rows as well; their entries go with it
+        team_ids = {entry.team_id for entry in entries}
+        teams = set(Team.objects.filter(pk__in=team_ids).values_list('pk', flat=True))
+        entries = [entry for entry in entries if entry.team_id in teams]
+    now = timezone.now()
+    insert_rows(
+        Activity, ['team', 'kind', 'object_id', 'action', 'changes', 'actor', 'created_at'],
+        [(*entry, actor_id, now) for entry in entries], batch_size=BATCH_SIZE,
+    )
+
+
+class ActivityBuffer:
+    """The entries of one request's committed writes, waiting to be inserted."""
+
+    def __init__(self, request):
+        self.request = request
+        self.entries = []
+        self.flushed = False
+
+    def add(self, entries):
+        self.entries.extend(entries)
+        if len(self.entries) >= MAX_BUFFERED:
+            # bounds the memory of imports and other large writes
+            entries, self.entries = self.entries, []
+            insert(entries, self.actor_id())
+
+    def actor_id(self):
+        user = getattr(self.request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+    def flush(self):
+        self.flushed = True
+        if self.entries:
+            insert(self.entries, self.actor_id())
+
+
+def tracked_value(value):
+    """``(known, stored value)`` for a bulk update value; expressions are not known up front."""
+    if isinstance(value, models.Model):
+        return True, value.pk
+    if hasattr(value, 'resolve_expression'):
+        return False, None
+    return True, value
+
+
+class ActivityMiddleware:
+    """
+    Collect the activity of a request's writes as they commit and insert it
+    all with one INSERT once the response is ready, attributed to the
+    requesting user. A request that writes a thousand rows (imports, bulk
+    updates, conversions) adds one statement, and larger ones are written
+    out every ``MAX_BUFFERED`` entries; a failure to log is itself logged
+    and does not fail the request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        buffer = ActivityBuffer(request)
+        token = _buffer.set(buffer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _buffer.reset(token)
+        self.flush(buffer)
+        return response
+
+    async def __acall__(self, request):
+        buffer = ActivityBuffer(request)
+        token = _buffer.set(buffer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _buffer.reset(token)
+        if buffer.entries:
+            await sync_to_async(self.flush, thread_sensitive=False)(buffer)
+        else:
+            buffer.flushed = True
+        return response
+
+    def flush(self, buffer):
+        try:
+            buffer.flush()
+        except Exception:
+            logger.exception('Could not record %d activity entries', len(buffer.entries))
@@ -0,0 +1,9 @@
+from rest_framework import serializers
+
+from .models import Activity
+
+
+class ActivitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Activity
+        fields = ['id', 'kind', 'object_id', 'action', 'changes', 'actor', 'created_at']
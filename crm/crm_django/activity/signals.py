@@ -0,0 +1,63 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from crm_django.signals import post_bulk_create, pre_bulk_update
+from .models import Activity
+from .recording import TRACKED_FIELDS, record, snapshot_entry, tracked_value, update_entry
+
+
+def remember_previous_values(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    loaded = instance.get_loaded_values()
+    fields = [name for name in TRACKED_FIELDS[sender] if name not in instance.get_deferred_fields()]
+    if not all(name in loaded for name in fields):
+        # built by hand: read the row being replaced
+        instance._activity_previous = sender._default_manager.using(using).filter(pk=instance.pk).values(*fields).first()
+
+
+def record_save(sender, instance, created, raw=False, using=None, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        record([snapshot_entry(sender, instance, Activity.CREATED)], using)
+        return
+    old = instance.__dict__.pop('_activity_previous', None) or instance.get_loaded_values()
+    fields = [name for name in TRACKED_FIELDS[sender] if name in old]
+    if update_fields is not None:
+        saved = {sender._meta.get_field(name).attname for name in update_fields}
+        fields = [name for name in fields if name in saved]
+    new = {name: getattr(instance, name) for name in fields}
+    record([update_entry(sender, instance.pk, instance.team_id, {name: old[name] for name in fields}, new)], using)
+
+
+def record_delete(sender, instance, using=None, **kwargs):
+    record([snapshot_entry(sender, instance, Activity.DELETED)], using)
+
+
+def record_bulk_create(sender, instances, using=None, **kwargs):
+    record([snapshot_entry(sender, instance, Activity.CREATED) for instance in instances], using)
+
+
+def record_bulk_update(sender, pks, changes, using=None, **kwargs):
+    new = {}
+    for name, value in changes.items():
+        attname = sender._meta.get_field(name).attname
+        known, value = tracked_value(value)
+        if known and attname in TRACKED_FIELDS[sender]:
+            new[attname] = value
+    if not new:
+        return
+    rows = sender._default_manager.using(using).filter(pk__in=pks).values('pk', 'team_id', *new)
+    record([
+        update_entry(sender, row['pk'], row['team_id'], {name: row[name] for name in new}, new)
+        for row in rows
+    ], using)
+
+
+for model in TRACKED_FIELDS:
+    label = model._meta.label
+    pre_save.connect(remember_previous_values, sender=model, dispatch_uid='activity_pre_save_%s' % label)
+    post_save.connect(record_save, sender=model, dispatch_uid='activity_save_%s' % label)
+    post_delete.connect(record_delete, sender=model, dispatch_uid='activity_delete_%s' % label)
+    post_bulk_create.connect(record_bulk_create, sender=model, dispatch_uid='activity_bulk_create_%s' % label)
+    pre_bulk_update.connect(record_bulk_update, sender=model, dispatch_uid='activity_bulk_update_%s' % label)
@@ -0,0 +1,127 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from client.conversion import convert_leads
+from client.models import Client, Note
+from crm_django.bulk import bulk_update
+from crm_django.testing import QueryCountTestCase
+from lead.models import Lead
+from team.context import invalidate_team_cache
+from team.models import Team
+from .models import Activity
+
+
+class ActivityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.token = Token.objects.create(user=cls.user)
+        cls.leads = [
+            Lead.objects.create(
+                team=cls.team, company='Company %d' % i, contact_person='Person', email='lead%d@example.com' % i,
+                phone='555', created_by=cls.user,
+            ).pk
+            for i in range(3)
+        ]
+        cls.client_row = Client.objects.create(
+            team=cls.team, company='Client', contact_person='Person', email='client@example.com', phone='555',
+            created_by=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def changes(self):
+        return list(Activity.objects.order_by('id').values_list('kind', 'action', 'changes', 'actor_id'))
+
+    def test_api_writes_are_logged_with_diffs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lead = self.client.post('/api/v1/leads/', {
+                'company': 'Acme', 'contact_person': 'Ann', 'email': 'ann@example.com', 'phone': '555',
+            }, format='json').json()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/v1/leads/%d/' % lead['id'], {'company': 'Acme Inc', 'phone': '555'}, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/v1/leads/%d/' % lead['id'])
+
+        (_, created, first, actor), (_, updated, diff, _), (_, deleted, last, _) = self.changes()
+        self.assertEqual((created, updated, deleted), (Activity.CREATED, Activity.UPDATED, Activity.DELETED))
+        self.assertEqual(first['company'], 'Acme')
+        self.assertEqual(actor, self.user.pk)
+        self.assertEqual(diff, {'company': ['Acme', 'Acme Inc']})
+        self.assertEqual(last['company'], 'Acme Inc')
+
+    def test_bulk_paths_are_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_update(Lead, self.leads[:2], {'priority': Lead.HIGH})
+        with self.captureOnCommitCallbacks(execute=True):
+            convert_leads(self.team.pk, self.user, self.leads[2:])
+
+        updates = Activity.objects.filter(kind='lead', action=Activity.UPDATED)
+        self.assertEqual(updates.count(), 3)
+        self.assertEqual(updates.get(object_id=self.leads[0]).changes, {'priority': [Lead.MEDIUM, Lead.HIGH]})
+        self.assertEqual(updates.get(object_id=self.leads[2]).changes, {'status': [Lead.NEW, Lead.WON]})
+        self.assertEqual(Activity.objects.filter(kind='client', action=Activity.CREATED).count(), 1)
+
+    def test_unchanged_and_rolled_back_saves_are_not_logged(self):
+        client = Client.objects.get(pk=self.client_row.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.save()
+        self.assertFalse(Activity.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Note.objects.create(team=self.team, client=client, name='Lost', created_by=self.user)
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+            Note.objects.create(team=self.team, client=client, name='Call', body='x' * 500, created_by=self.user)
+        entry = Activity.objects.get()
+        self.assertEqual(entry.changes['name'], 'Call')
+        self.assertEqual(len(entry.changes['body']), 200)
+
+    def test_feed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_update(Lead, Lead.objects.values_list('pk', flat=True), {'status': Lead.LOST})
+
+        ids, url = [], '/api/v1/activity/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            ids += [entry['id'] for entry in page['results']]
+            url = page['next']
+        self.assertEqual(ids, list(Activity.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+        history = self.client.get('/api/v1/activity/?kind=lead&object_id=%d' % self.leads[0]).json()['results']
+        self.assertEqual([entry['changes'] for entry in history], [{'status': [Lead.NEW, Lead.LOST]}])
+
+
+class ActivityQueryCountTests(QueryCountTestCase):
+    def test_feed_queries(self):
+        self.assertConstantQueries('/api/v1/activity/?page_size=100', self.make_activity)
+
+    def make_activity(self, count):
+        Activity.objects.bulk_create([
+            Activity(team=self.team, kind='lead', object_id=i, action=Activity.CREATED, actor=self.user)
+            for i in range(count)
+        ])
+
+
+class ActivityTeamDeletionTests(TestCase):
+    def test_cascade_of_deleted_team_is_dropped(self):
+        user = User.objects.create_user('owner@example.com')
+        team = Team.objects.create(name='Gone', created_by=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Lead.objects.create(team=team, company='A', contact_person='B', email='a@example.com', created_by=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            team.delete()
+        self.assertFalse(Activity.objects.exists())
@@ -0,0 +1,36 @@
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+
+from crm_django.pagination import KeysetPagination
+from team.context import TeamContextMixin
+from .models import Activity
+from .serializers import ActivitySerializer
+
+
+class ActivityPagination(KeysetPagination):
+    page_size = 50
+    ordering = ('-created_at', '-id')
+
+
+class ActivityViewSet(TeamContextMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    The team's activity feed, newest first, with keyset pagination.
+
+    ``?kind=lead&object_id=1`` narrows it to the history of one object.
+    """
+    queryset = Activity.objects.all()
+    serializer_class = ActivitySerializer
+    pagination_class = ActivityPagination
+
+    def get_queryset(self):
+        activity = self.queryset.filter(team_id=self.get_team_id())
+        kind = self.request.query_params.get('kind')
+        if kind:
+            activity = activity.filter(kind=kind)
+        object_id = self.request.query_params.get('object_id')
+        if object_id:
+            try:
+                activity = activity.filter(object_id=int(object_id))
+            except ValueError:
+                raise ValidationError({'object_id': 'Must be an integer.'})
+        return activity
@@ -0,0 +1,51 @@
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from crm_django.bulk import bulk_create, bulk_update
+from lead.models import Lead
+from team.models import Team
+from team.quotas import reserve
+from .models import Client
+
+# Lead fields copied onto the new client
+CLIENT_FIELDS = ('company', 'contact_person', 'email', 'phone', 'website')
+
+
+def convert_leads(team_id, user, lead_ids):
+    """
+    Turn the team's leads ``lead_ids`` into clients and mark them won.
+
+    Runs in one transaction: the clients are inserted with one
+    ``bulk_create`` and the lead statuses set with one UPDATE, so either
+    every lead is converted or none is. Raises ``QuotaExceeded`` if the
+    clients do not fit the plan. Leads that are already won are rejected,
+    so repeating a conversion cannot create a second client for a lead.
+    Returns ``{lead id: client id}``.
+    """
+    lead_ids = set(lead_ids)
+    with transaction.atomic():
+        leads = list(
+            Lead.objects.select_for_update()
+            .filter(team_id=team_id, pk__in=lead_ids)
+            .order_by('pk')
+            .values('pk', 'status', *CLIENT_FIELDS)
+        )
+        missing = lead_ids - {lead['pk'] for lead in leads}
+        if missing:
+            raise ValidationError(
+                {'lead_ids': 'Leads not found: %s' % ', '.join(map(str, sorted(missing)))}, code='not_found'
+            )
+        won = [lead['pk'] for lead in leads if lead['status'] == Lead.WON]
+        if won:
+            raise ValidationError(
+                {'lead_ids': 'Leads already converted: %s' % ', '.join(map(str, won))}, code='converted'
+            )
+
+        team = Team.objects.only('plan_id').get(pk=team_id)
+        with reserve(team, Client, len(leads)):
+            clients = bulk_create(Client, [
+                Client(team_id=team_id, created_by=user, **{name: lead[name] for name in CLIENT_FIELDS})
+                for lead in leads
+            ])
+        bulk_update(Lead, [lead['pk'] for lead in leads], {'status': Lead.WON})
+    return {lead['pk']: client.pk for lead, client in zip(leads, clients)}
@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 14:51
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_note_created_at(apps, schema_editor):
+    # Notes written before created_at existed have NULLs, which keyset
+    # pagination on (created_at, id) would silently skip.
+    Note = apps.get_model('client', 'Note')
+    Note.objects.filter(created_at__isnull=True).update(created_at=F('modified_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0003_auto_20250513_1047'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_note_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['team', 'modified_at', 'id'], name='client_team_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['team', 'client', 'created_at', 'id'], name='note_team_client_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['team', 'created_at', 'id'], name='note_team_created_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0005_note_team_created_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['team', 'client', 'modified_at'], name='note_team_client_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['team', 'modified_at'], name='note_team_modified_idx'),
+        ),
+    ]
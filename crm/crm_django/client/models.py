@@ -1,11 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from crm_django.tracking import TrackLoadedValuesMixin
 from team.models import Team
 
 
 
 # Create your models here.
-class Client(models.Model):
+class Client(TrackLoadedValuesMixin, models.Model):
     team = models.ForeignKey(Team, related_name='clients', on_delete=models.CASCADE)
     company = models.CharField(max_length=255)
     contact_person = models.CharField(max_length=255)
@@ -15,9 +16,15 @@ class Client(models.Model):
     created_by = models.ForeignKey(User,related_name='clients', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination of a team's clients (crm_django.pagination)
+            models.Index(fields=['team', 'modified_at', 'id'], name='client_team_modified_idx'),
+        ]
     
     
-class Note(models.Model):
+class Note(TrackLoadedValuesMixin, models.Model):
     team = models.ForeignKey(Team, related_name='notes', on_delete=models.CASCADE)
     client = models.ForeignKey(Client, related_name='notes', on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
@@ -25,5 +32,16 @@ class Note(models.Model):
     created_by = models.ForeignKey(User, related_name='notes', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True,null=True)
     modified_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination of a client's notes (crm_django.pagination)
+            models.Index(fields=['team', 'client', 'created_at', 'id'], name='note_team_client_created_idx'),
+            # recent notes across a team's clients (NoteViewSet.recent)
+            models.Index(fields=['team', 'created_at', 'id'], name='note_team_created_idx'),
+            # max(modified_at) of the list and recent validators (crm_django.conditional)
+            models.Index(fields=['team', 'client', 'modified_at'], name='note_team_client_modified_idx'),
+            models.Index(fields=['team', 'modified_at'], name='note_team_modified_idx'),
+        ]
     
     
\ No newline at end of file
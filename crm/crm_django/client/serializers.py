@@ -7,7 +7,34 @@ class NoteSerializer(serializers.ModelSerializer):
         fields = '__all__'
         
 
+class NoteTimelineSerializer(serializers.ModelSerializer):
+    """
+    A note without its body, for timelines: ``excerpt`` is the start of the
+    body and ``truncated`` says whether there is more. Needs the
+    ``excerpt`` and ``body_length`` annotations (NoteViewSet.timeline).
+    """
+    excerpt = serializers.CharField(read_only=True, allow_null=True)
+    truncated = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Note
+        exclude = ['body']
+
+    def get_truncated(self, obj):
+        return obj.body_length is not None and obj.body_length > len(obj.excerpt)
+
+
 class ClientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Client
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class LeadConversionSerializer(serializers.Serializer):
+    MAX_LEADS = 1000
+
+    lead_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=MAX_LEADS,
+    )
@@ -1,3 +1,142 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from crm_django.testing import QueryCountTestCase
+from crm_django.values import ValuesSerializer
+from lead.models import Lead
+from team.context import invalidate_team_cache
+from team.models import Plan, Team
+from .models import Client, Note
+from .serializers import ClientSerializer
+
+
+class ClientValuesSerializerTests(TestCase):
+    def test_output_is_byte_identical(self):
+        user = User.objects.create_user('owner@example.com', password='secret')
+        team = Team.objects.create(name='Team', created_by=user)
+        Client.objects.create(team=team, company='Ünïcode', contact_person='P', email='c@example.com', phone='1', website='w', created_by=user)
+        Client.objects.create(team=team, company='Bare', contact_person='P', email='b@example.com', phone='1', created_by=user)
+        clients = Client.objects.order_by('id')
+
+        fast = ValuesSerializer(ClientSerializer)
+        data = fast.to_representation(fast.values(clients))
+        self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(ClientSerializer(clients, many=True).data))
+
+
+class ClientQueryCountTests(QueryCountTestCase):
+    def test_client_list(self):
+        self.assertConstantQueries('/api/v1/clients/?page_size=100', self.make_clients)
+
+    def test_client_export(self):
+        self.assertConstantQueries('/api/v1/clients/export/?output=csv', self.make_clients)
+
+    def test_note_list(self):
+        self.make_clients(1)
+        client = Client.objects.get()
+        self.assertConstantQueries(
+            '/api/v1/notes/?client_id=%d&page_size=100' % client.pk,
+            lambda count: self.make_notes(client, count),
+        )
+
+    def test_recent_notes(self):
+        self.make_clients(2)
+        first, second = Client.objects.order_by('id')
+        self.assertConstantQueries(
+            '/api/v1/notes/recent/?page_size=100',
+            lambda count: (self.make_notes(first, count // 2), self.make_notes(second, count - count // 2)),
+        )
+
+
+class NoteTimelineTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_clients(2)
+        self.first, self.second = Client.objects.order_by('id')
+        for i in range(3):
+            for client in (self.first, self.second):
+                Note.objects.create(team=self.team, client=client, name='%s %d' % (client.company, i), body='x' * 250, created_by=self.user)
+        Note.objects.create(team=self.team, client=self.first, name='Short', body='short', created_by=self.user)
+
+    def test_list_has_excerpts(self):
+        response = self.client.get('/api/v1/notes/?client_id=%d' % self.first.pk)
+        notes = response.json()['results']
+        self.assertEqual([note['name'] for note in notes], ['Short', 'Company 0 2', 'Company 0 1', 'Company 0 0'])
+        self.assertNotIn('body', notes[0])
+        self.assertEqual((notes[0]['excerpt'], notes[0]['truncated']), ('short', False))
+        self.assertEqual((len(notes[1]['excerpt']), notes[1]['truncated']), (200, True))
+
+        full = self.client.get('/api/v1/notes/%d/' % notes[1]['id']).json()
+        self.assertEqual(full['body'], 'x' * 250)
+
+    def test_recent_walks_every_client(self):
+        names, url = [], '/api/v1/notes/recent/?page_size=3'
+        while url:
+            page = self.client.get(url).json()
+            names += [note['name'] for note in page['results']]
+            url = page['next']
+        self.assertEqual(names, list(Note.objects.order_by('-created_at', '-id').values_list('name', flat=True)))
+        self.assertEqual(len(names), 7)
+
+
+class LeadConversionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.other = Team.objects.create(name='Other', created_by=cls.user)
+        cls.leads = [
+            Lead.objects.create(
+                team=cls.team, company='Company %d' % i, contact_person='Person', email='lead%d@example.com' % i,
+                phone='555', created_by=cls.user,
+            ).pk
+            for i in range(3)
+        ]
+        cls.foreign = Lead.objects.create(
+            team=cls.other, company='Foreign', contact_person='Person', email='foreign@example.com',
+            phone='555', created_by=cls.user,
+        ).pk
+
+    def setUp(self):
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def convert(self, lead_ids):
+        return self.client.post('/api/v1/convert-leads-to-clients/', {'lead_ids': lead_ids}, format='json')
+
+    def convert_one(self, lead_id):
+        return self.client.post('/api/v1/convert-lead-to-client/', {'lead_id': lead_id}, format='json')
+
+    def test_converting_twice_creates_one_client_per_lead(self):
+        response = self.convert(self.leads[:2])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['converted']), set(self.leads[:2]))
+
+        response = self.convert(self.leads)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already converted', str(response.data['lead_ids']))
+        self.assertEqual(self.convert_one(self.leads[0]).status_code, 400)
+
+        self.assertEqual(Client.objects.filter(team=self.team).count(), 2)
+        self.assertEqual(Lead.objects.filter(team=self.team, status=Lead.WON).count(), 2)
+
+    def test_convert_one(self):
+        response = self.convert_one(self.leads[0])
+        self.assertEqual(response.status_code, 200)
+        client = Client.objects.get(pk=response.data['client_id'])
+        self.assertEqual((client.team_id, client.email), (self.team.pk, 'lead0@example.com'))
+
+    def test_errors(self):
+        self.assertEqual(self.convert_one(self.foreign).status_code, 404)
+        self.assertEqual(self.convert_one('abc').status_code, 400)
+        self.assertEqual(self.convert([self.leads[0], self.foreign]).status_code, 400)
+
+        Team.objects.filter(pk=self.team.pk).update(plan=Plan.objects.create(name='Tiny', max_clients=1))
+        self.assertEqual(self.convert_one(self.leads[0]).status_code, 200)
+        response = self.convert_one(self.leads[1])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['detail'].code, 'quota_exceeded')
+        self.assertEqual(Client.objects.count(), 1)
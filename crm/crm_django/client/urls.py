@@ -1,13 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ClientViewSet , NoteViewSet , convert_lead_to_client , delete_client
+from crm_django.asyncviews import async_routes
+from .views import ClientViewSet , NoteViewSet , convert_lead_to_client , convert_leads_to_clients , delete_client
 
 router = DefaultRouter()
 router.register(r'clients', ClientViewSet, basename='clients')
 router.register(r'notes', NoteViewSet, basename='notes')
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(async_routes(router.urls, 'clients-list', 'clients-detail', 'notes-list'))),
     path('convert-lead-to-client/', convert_lead_to_client, name='convert-lead-to-client'),
+    path('convert-leads-to-clients/', convert_leads_to_clients, name='convert-leads-to-clients'),
     path('client/delete_client/<int:client_id>/', delete_client, name='delete_client'),
     
     
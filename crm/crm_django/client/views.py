@@ -1,52 +1,120 @@
 from django.shortcuts import render
 from django.contrib.auth.models import User
-from rest_framework import viewsets , filters
+from django.db.models.functions import Length, Substr
+from rest_framework import viewsets
+from rest_framework.decorators import action
 from .models import Client , Note
-from .serializers import ClientSerializer , NoteSerializer
-from team.models import Team
+from .serializers import ClientSerializer , NoteSerializer, NoteTimelineSerializer, LeadConversionSerializer
+from .conversion import convert_leads
+from team.context import TeamContextMixin, get_request_team_id
+from team.quotas import reserve
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.http import Http404
-from lead.models import Lead
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from crm_django.pagination import KeysetPagination, PageNumberOrKeysetPagination
+from crm_django.streaming import ExportMixin
+from crm_django.conditional import ConditionalGetMixin
+from crm_django.cache import CachedListMixin
+from crm_django.values import ValuesListMixin
+from search.filters import FullTextSearchFilter
 
 
 
 
-class ClientPagination(PageNumberPagination):
+class ClientPagination(PageNumberOrKeysetPagination):
     page_size = 10
+    ordering = ('-modified_at', '-id')
 
-class ClientViewSet(viewsets.ModelViewSet):
+
+class NotePagination(PageNumberOrKeysetPagination):
+    page_size = 20
+    ordering = ('-created_at', '-id')
+
+
+class ClientViewSet(TeamContextMixin, ConditionalGetMixin, CachedListMixin, ValuesListMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     
     pagination_class = ClientPagination
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'contact_person']
+    filter_backends = [FullTextSearchFilter]
+    search_fields = ['company', 'contact_person']
+    export_fields = ['id', 'company', 'contact_person', 'email', 'phone', 'website', 'created_by', 'created_at', 'modified_at']
+    export_ordering = ClientPagination.ordering
     
     def perform_create(self, serializer):
-        team = Team.objects.filter(members_in = [self.request.user]).first()
-        serializer.save(team=team, created_by=self.request.user)
+        team = self.get_team()
+        if team is None:
+            raise ValidationError({'error': 'You are not a member of a team.'})
+        # plan limit, see team.quotas
+        with reserve(team, Client):
+            serializer.save(team_id=team.pk, created_by=self.request.user)
         
     def get_queryset(self):
-        team = Team.objects.filter(members_in = [self.request.user]).first()
-        return self.queryset.filter(team=team)
+        return self.queryset.filter(team_id=self.get_team_id())
     
     
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(TeamContextMixin, ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
+    """
+    Notes of the client in ``?client_id=``.
+
+    Lists are timelines: the body is not read, only an ``excerpt`` of its
+    first ``excerpt_length`` characters; ``notes/<id>/`` has the full note.
+    ``notes/recent/`` is the team's notes across all clients, newest first.
+    """
     queryset = Note.objects.all()
     serializer_class = NoteSerializer
+    pagination_class = NotePagination
+    export_fields = ['id', 'client', 'name', 'body', 'created_by', 'created_at', 'modified_at']
+    export_ordering = NotePagination.ordering
+    excerpt_length = 200
     
     def get_queryset(self):
-        team = Team.objects.filter(members_in = [self.request.user]).first()
+        notes = self.queryset.filter(team_id=self.get_team_id())
+        if self.action == 'recent':
+            return notes
         client_id = self.request.GET.get('client_id')
-        return self.queryset.filter(team=team, client_id=client_id)
+        # a single note can be found without its client; a list needs one
+        if client_id is not None or self.action == 'list':
+            notes = notes.filter(client_id=client_id)
+        return notes
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'recent'):
+            return NoteTimelineSerializer
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        # not in get_queryset: the validators aggregate over that, and
+        # annotations would turn their aggregate into a subquery
+        queryset = super().filter_queryset(queryset)
+        if self.action in ('list', 'recent'):
+            queryset = self.timeline(queryset)
+        return queryset
+
+    def timeline(self, queryset):
+        return queryset.defer('body').annotate(
+            excerpt=Substr('body', 1, self.excerpt_length),
+            body_length=Length('body'),
+        )
+
+    @action(detail=False, methods=['get'])
+    def recent(self, request):
+        """
+        The team's latest notes across clients, as a timeline, with keyset
+        pagination (``next`` cursors) on ``(created_at, id)``.
+        """
+        return self.conditional(request, self.get_list_validators(), self.recent_page)
+
+    def recent_page(self, request):
+        paginator = KeysetPagination(ordering=NotePagination.ordering, page_size=NotePagination.page_size)
+        page = paginator.paginate_queryset(self.filter_queryset(self.get_queryset()), request, self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
     
     def perform_create(self, serializer):
-        team = Team.objects.filter(members_in = [self.request.user]).first()
         client_id = self.request.GET.get('client_id')
-        serializer.save(team=team, created_by=self.request.user, client_id=client_id)
+        serializer.save(team_id=self.get_team_id(), created_by=self.request.user, client_id=client_id)
         
         
     
@@ -57,34 +125,36 @@ class NoteViewSet(viewsets.ModelViewSet):
 
 @api_view(['POST'])
 def convert_lead_to_client(request):
-    team = Team.objects.filter(members_in = [request.user]).first()
-    lead_id = request.data.get('lead_id')
     try:
-        lead = Lead.objects.filter( team=team).get(pk = lead_id)
-       
-        
-    except Lead.DoesNotExist:
-        raise Http404
-    
-    client = Client.objects.create(
-        team=team,
-        name=lead.company,
-        contact_person=lead.contact_person,
-        email=lead.email,
-        phone=lead.phone,
-        
-        
-        
-    )
-    return Response()
+        lead_id = int(request.data.get('lead_id'))
+    except (TypeError, ValueError):
+        raise ValidationError({'lead_id': 'A valid integer is required.'})
+    try:
+        converted = convert_leads(get_request_team_id(request), request.user, [lead_id])
+    except ValidationError as e:
+        if e.get_codes() == {'lead_ids': 'not_found'}:
+            raise Http404
+        raise
+    return Response({'client_id': converted[lead_id]})
 
 
-    
+@api_view(['POST'])
+def convert_leads_to_clients(request):
+    """
+    Convert many leads to clients in one transaction.
+
+    Body: ``{"lead_ids": [...]}``. Every lead must belong to the team, or
+    nothing is converted. Returns ``{"converted": {lead id: client id}}``.
+    """
+    serializer = LeadConversionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    converted = convert_leads(get_request_team_id(request), request.user, serializer.validated_data['lead_ids'])
+    return Response({'converted': converted})
+
 
 @api_view(['POST'])
 def delete_client(request , client_id):
-    team = Team.objects.filter(members_in = [request.user]).first()
-    client = Client.objects.filter(pk=client_id)
+    client = Client.objects.filter(pk=client_id, team_id=get_request_team_id(request))
     client.delete()
     return Response({'message': 'Client deleted successfully'})
 # Create your views here.
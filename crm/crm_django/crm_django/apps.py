@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CrmDjangoConfig(AppConfig):
+    name = 'crm_django'
+
+    def ready(self):
+        from . import authentication, cache  # noqa: F401
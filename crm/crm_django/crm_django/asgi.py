@@ -2,6 +2,8 @@
 ASGI config for crm_django project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Set ASYNC_VIEWS=True when serving it, so the hot read routes use the async
+views in crm_django.asyncviews.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
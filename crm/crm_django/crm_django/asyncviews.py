@@ -0,0 +1,127 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.urls import URLPattern
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from team.context import get_team_id_for_user, peek_team_id
+from .authentication import CachedTokenAuthentication, hydrate, token_cache
+
+
+def database_sync_to_async(func):
+    """
+    ``sync_to_async`` for code that uses the database, run on the shared
+    thread pool instead of Django's single thread for sync code, so requests
+    wait for the database side by side. Connections are checked and closed
+    around the call as the request_started/finished signals do for a sync
+    request; with ``CONN_MAX_AGE`` each pool thread keeps its own.
+    """
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(inner, thread_sensitive=False)
+
+
+def token_key(request):
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != CachedTokenAuthentication.keyword.lower().encode():
+        return None
+    try:
+        return auth[1].decode()
+    except UnicodeError:
+        return None
+
+
+async def aauthenticate(request):
+    """
+    The ``(user, token)`` of the request's token, or None when it has none
+    or the token is not valid; the view then answers as usual.
+
+    A token cached in this process is resolved in the event loop, others by
+    ``CachedTokenAuthentication`` on the thread pool, which caches them.
+    """
+    key = token_key(request)
+    if key is None:
+        return None
+    cached = token_cache.get_local(key)
+    if cached is not None:
+        return hydrate(key, cached)
+    try:
+        return await database_sync_to_async(CachedTokenAuthentication().authenticate_credentials)(key)
+    except AuthenticationFailed:
+        return None
+
+
+async def aget_team_id_for_user(user):
+    found, team_id = peek_team_id(user)
+    if found:
+        return team_id
+    return await database_sync_to_async(get_team_id_for_user)(user)
+
+
+def render_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if isinstance(response, SimpleTemplateResponse):
+        # rendered here, or Django would render it on its single sync thread
+        response.render()
+        plain = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            plain[header] = value
+        plain.cookies = response.cookies
+        return plain
+    return response
+
+
+def async_view(view):
+    """
+    An async version of a DRF view.
+
+    Authentication and team resolution happen in the event loop when the
+    token and the user's team are cached in this process, which is the
+    common case; the view (with its queries and rendering) then runs on the
+    thread pool through ``database_sync_to_async``, finding both already
+    resolved. A slow client only holds the event loop's attention while its
+    bytes are sent, not a worker thread.
+
+    The middleware around the view is not made async by this. Django 3.2's
+    own middlewares (security, sessions, CORS, common, CSRF, auth, messages,
+    clickjacking) are ``MiddlewareMixin`` ones, and under ASGI each of their
+    ``process_request``/``process_response`` hooks is a
+    ``sync_to_async(thread_sensitive=True)`` call. That is 14 hops per
+    request onto the one thread all sync code shares, about 2.5 ms measured
+    against 0.3 ms of actual work, and concurrent requests queue for that
+    thread. The project's own middlewares are async-capable and do not hop.
+    """
+    run = database_sync_to_async(render_view)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        credentials = await aauthenticate(request)
+        if credentials is not None:
+            request.team_id = await aget_team_id_for_user(credentials[0])
+        return await run(view, request, *args, **kwargs)
+    return wrapper
+
+
+def async_routes(patterns, *names):
+    """
+    ``patterns`` with the views of the URL ``names`` replaced by their
+    ``async_view`` versions when ``ASYNC_VIEWS`` is set. Only worth it under
+    an ASGI server: under WSGI every async view gets an event loop of its own.
+    """
+    if not getattr(settings, 'ASYNC_VIEWS', False):
+        return patterns
+    return [
+        URLPattern(pattern.pattern, async_view(pattern.callback), pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in names else pattern
+        for pattern in patterns
+    ]
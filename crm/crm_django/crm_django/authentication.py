@@ -0,0 +1,167 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .replicas import use_primary
+
+
+# User fields kept in the token cache: what authentication, permissions and
+# the payloads read from request.user. Never the password hash.
+CACHED_USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+class TokenCache:
+    """
+    Token key -> cached ``(user fields, token created)`` with an in-process
+    LRU in front of an optional shared Django cache.
+
+    Entries expire after ``TOKEN_CACHE_TIMEOUT`` seconds. ``invalidate()``
+    drops a key from this process and from the shared cache; other processes
+    drop their local copy when it expires, so the timeout bounds how long a
+    revoked token can still be accepted by another worker.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'TOKEN_CACHE_TIMEOUT', 60)
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'TOKEN_CACHE_MAX_SIZE', 10000)
+
+    @property
+    def shared(self):
+        alias = getattr(settings, 'TOKEN_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def shared_key(key):
+        # never put the raw token into cache keys (or file names)
+        return 'auth-token:%s' % hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        value = self.get_local(key)
+        if value is not None:
+            return value
+
+        now = time.monotonic()
+        shared = self.shared
+        if shared is not None:
+            value = shared.get(self.shared_key(key))
+            if value is not None:
+                self.store_local(key, value, now)
+                return value
+        return None
+
+    def get_local(self, key):
+        """Look in this process only; never blocks on the shared cache."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    return entry[1]
+                del self.entries[key]
+        return None
+
+    def set(self, key, value):
+        self.store_local(key, value, time.monotonic())
+        shared = self.shared
+        if shared is not None:
+            shared.set(self.shared_key(key), value, self.timeout)
+
+    def store_local(self, key, value, now):
+        with self.lock:
+            self.entries[key] = (now + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        shared = self.shared
+        if shared is not None and keys:
+            shared.delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def cached_user_fields():
+    # in model order, as Model.from_db() expects
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.attname in CACHED_USER_FIELDS]
+
+
+def dehydrate(user, token):
+    return tuple(getattr(user, name) for name in cached_user_fields()), token.created
+
+
+def hydrate(key, cached):
+    """
+    Fresh ``(user, token)`` instances from a cache entry. Fields that were not
+    cached are deferred, so reading them queries the row and ``save()`` only
+    writes the loaded fields.
+    """
+    values, created = cached
+    user = get_user_model().from_db(None, cached_user_fields(), values)
+    token = Token.from_db(None, ['key', 'user_id', 'created'], [key, user.pk, created])
+    # not ``token.user = user``: on an instance without a database that asks
+    # the router where to write, and ReplicaRouter takes that as a write
+    Token.user.field.set_cached_value(token, user)
+    return user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in ``TokenAuthentication`` that caches the token -> user lookup.
+
+    A cached token authenticates without touching the database. Only the
+    fields in ``CACHED_USER_FIELDS`` are cached, and each request gets its
+    own instances. Token deletion (including djoser logout) and deactivating
+    or changing a user invalidate the cache, see the receivers below.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return hydrate(key, cached)
+        # a token created moments ago may not have reached the replicas
+        with use_primary():
+            user, token = super().authenticate_credentials(key)
+        token_cache.set(key, dehydrate(user, token))
+        return user, token
+
+
+def token_deleted(sender, instance, **kwargs):
+    # covers djoser logout, which deletes the user's tokens
+    token_cache.invalidate(instance.key)
+
+
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # cached tokens carry a copy of the user's fields, including is_active
+    if created or update_fields == frozenset(['last_login']):
+        return
+    token_cache.invalidate(*Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+post_delete.connect(token_deleted, sender=Token, dispatch_uid='token_cache_token_delete')
+post_save.connect(user_changed, sender=get_user_model(), dispatch_uid='token_cache_user_save')
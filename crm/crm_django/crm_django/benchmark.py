@@ -0,0 +1,356 @@
+import http.client
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from urllib.parse import urlencode, urlsplit
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.http.request import validate_host
+from django.test import Client as TestClient
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from client.models import Client
+from lead.models import Lead
+from lead.views import LeadPagination
+from team.models import Team
+from .metrics import QueryCounter
+
+
+class Tenant:
+    """A team to send requests as: its owner's token and a sample of its rows."""
+
+    def __init__(self, team_id, token, lead_pages, lead_ids, client_ids, terms):
+        self.team_id = team_id
+        self.token = token
+        self.lead_pages = lead_pages
+        self.lead_ids = lead_ids
+        self.client_ids = client_ids
+        self.terms = terms
+
+
+def load_tenants(count, rng, sample=200):
+    """Pick up to ``count`` random teams that have leads."""
+    team_ids = list(Team.objects.filter(lead_count__gt=0).order_by('pk').values_list('pk', flat=True))
+    if not team_ids:
+        raise ValueError('No team has leads; run generate_synthetic_data first.')
+    tenants = []
+    for team in Team.objects.filter(pk__in=rng.sample(team_ids, min(count, len(team_ids)))).order_by('pk'):
+        token, _ = Token.objects.get_or_create(user_id=team.created_by_id)
+        companies = list(Lead.objects.filter(team=team).order_by('pk').values_list('company', flat=True)[:sample])
+        tenants.append(Tenant(
+            team.pk, token.key, -(-team.lead_count // LeadPagination.page_size),
+            list(Lead.objects.filter(team=team).order_by('pk').values_list('pk', flat=True)[:sample]),
+            list(Client.objects.filter(team=team).order_by('pk').values_list('pk', flat=True)[:sample]),
+            sorted({word for company in companies for word in company.split()[:1]}),
+        ))
+    return tenants
+
+
+def with_query(url, **params):
+    return '%s?%s' % (url, urlencode(params)) if params else url
+
+
+# Scenario name (the URL name it drives) -> (tenant, rng) -> (method, path, JSON body or None).
+# Builders return None when the tenant has nothing to request.
+SCENARIOS = {
+    'leads-list': lambda tenant, rng: (
+        'GET', with_query(reverse('leads-list'), page=rng.randint(1, min(tenant.lead_pages, 3))), None,
+    ),
+    'leads-detail': lambda tenant, rng: (
+        'GET', reverse('leads-detail', args=[rng.choice(tenant.lead_ids)]), None,
+    ) if tenant.lead_ids else None,
+    'clients-list': lambda tenant, rng: ('GET', reverse('clients-list'), None),
+    'clients-detail': lambda tenant, rng: (
+        'GET', reverse('clients-detail', args=[rng.choice(tenant.client_ids)]), None,
+    ) if tenant.client_ids else None,
+    'leads-search': lambda tenant, rng: (
+        'GET', with_query(reverse('leads-list'), search=rng.choice(tenant.terms)), None,
+    ) if tenant.terms else None,
+    'search': lambda tenant, rng: (
+        'GET', with_query(reverse('search'), q=rng.choice(tenant.terms)), None,
+    ) if tenant.terms else None,
+    'get-my-team': lambda tenant, rng: ('GET', reverse('get-my-team'), None),
+    'notes-list': lambda tenant, rng: (
+        'GET', with_query(reverse('notes-list'), client_id=rng.choice(tenant.client_ids)), None,
+    ) if tenant.client_ids else None,
+    # writes: every request creates a client
+    'convert-lead-to-client': lambda tenant, rng: (
+        'POST', reverse('convert-lead-to-client'), {'lead_id': rng.choice(tenant.lead_ids)},
+    ) if tenant.lead_ids else None,
+}
+
+
+class InProcessSender:
+    """Sends requests through the full Django stack in this process and counts their queries."""
+
+    def __init__(self):
+        host = 'localhost'
+        if not validate_host(host, settings.ALLOWED_HOSTS):
+            host = next((name for name in settings.ALLOWED_HOSTS if name and name[0] not in '.*'), host)
+        self.client = TestClient(raise_request_exception=False, HTTP_HOST=host)
+
+    def send(self, method, path, body, token):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.client.generic(
+                method, path, json.dumps(body) if body is not None else '',
+                content_type='application/json', HTTP_AUTHORIZATION='Token ' + token,
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return response.status_code, counter.count
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPSender:
+    """Sends requests to a running server over one keep-alive connection; queries are not known."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=60)
+        self.prefix = parts.path.rstrip('/')
+
+    def send(self, method, path, body, token):
+        headers = {'Authorization': 'Token ' + token, 'Content-Type': 'application/json'}
+        self.connection.request(method, self.prefix + path, json.dumps(body) if body is not None else None, headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status, None
+
+    def close(self):
+        self.connection.close()
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize(samples, elapsed):
+    durations = sorted(duration for duration, _, _ in samples)
+    queries = sorted(count for _, count, _ in samples if count is not None)
+    errors = sum(1 for _, _, status in samples if status >= 400)
+    result = {
+        'requests': len(samples),
+        'errors': errors,
+        'rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(durations) / len(durations), 2) if durations else None,
+    }
+    for name, fraction in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99), ('max_ms', 1.0)):
+        value = percentile(durations, fraction)
+        result[name] = round(value, 2) if value is not None else None
+    result['queries_mean'] = round(sum(queries) / len(queries), 2) if queries else None
+    result['queries_p95'] = percentile(queries, 0.95)
+    result['queries_max'] = queries[-1] if queries else None
+    return result
+
+
+class Benchmark:
+    """
+    Drive URL routes with ``concurrency`` clients, each sending its share of
+    ``requests`` per scenario as a random tenant, and report latency
+    percentiles and queries per request.
+
+    Requests go through the Django stack in this process (one thread and
+    one database connection per client), or to ``base_url`` over HTTP when
+    given. Runs are reproducible from ``seed``.
+    """
+
+    def __init__(self, tenants, concurrency=4, requests=200, warmup=10, seed=0, base_url=None):
+        self.tenants = tenants
+        self.concurrency = concurrency
+        self.requests = requests
+        self.warmup = warmup
+        self.seed = seed
+        self.base_url = base_url
+
+    def make_sender(self):
+        return HTTPSender(self.base_url) if self.base_url else InProcessSender()
+
+    def run(self, scenarios):
+        return {name: self.run_scenario(name) for name in scenarios}
+
+    def run_scenario(self, name):
+        build = SCENARIOS[name]
+        samples = []
+        lock = threading.Lock()
+
+        def worker(index, count, in_thread):
+            rng = random.Random('%s-%s-%d' % (self.seed, name, index))
+            sender = self.make_sender()
+            local = []
+            try:
+                for n in range(self.warmup + count):
+                    tenant = rng.choice(self.tenants)
+                    request = build(tenant, rng)
+                    if request is None:
+                        continue
+                    method, path, body = request
+                    start = time.perf_counter()
+                    status, queries = sender.send(method, path, body, tenant.token)
+                    duration = (time.perf_counter() - start) * 1000
+                    if n >= self.warmup:
+                        local.append((duration, queries, status))
+            finally:
+                # threads own their database connections; the calling thread keeps its own
+                if in_thread or self.base_url:
+                    sender.close()
+            with lock:
+                samples.extend(local)
+
+        shares = [self.requests // self.concurrency + (1 if i < self.requests % self.concurrency else 0)
+                  for i in range(self.concurrency)]
+        start = time.perf_counter()
+        if self.concurrency == 1:
+            worker(0, shares[0], False)
+        else:
+            threads = [threading.Thread(target=worker, args=(i, share, True)) for i, share in enumerate(shares)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return summarize(samples, time.perf_counter() - start)
+
+    def metadata(self):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': timezone.now().isoformat(),
+            'mode': 'http' if self.base_url else 'in-process',
+            'base_url': self.base_url,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'concurrency': self.concurrency,
+            'requests': self.requests,
+            'warmup': self.warmup,
+            'seed': self.seed,
+            'tenants': len(self.tenants),
+            'rows': {
+                'teams': Team.objects.count(),
+                'leads': Lead.objects.count(),
+                'clients': Client.objects.count(),
+            },
+        }
+
+
+# Server name -> (required modules, gunicorn arguments, environment)
+SERVERS = {
+    'wsgi': (('gunicorn',), ['crm_django.wsgi:application', '--worker-class', 'gthread'], {'ASYNC_VIEWS': 'False'}),
+    'asgi': (
+        ('gunicorn', 'uvicorn_worker'), ['crm_django.asgi:application', '--worker-class', 'uvicorn_worker.UvicornWorker'],
+        {'ASYNC_VIEWS': 'True'},
+    ),
+}
+
+
+def missing_modules(server):
+    return [name for name in SERVERS[server][0] if importlib.util.find_spec(name) is None]
+
+
+class Server:
+    """
+    A gunicorn process serving this project on ``port``, for benchmarking
+    with ``Benchmark(base_url=server.url)``. Use as a context manager; it is
+    ready when entered and stopped on exit.
+    """
+
+    def __init__(self, name, port, workers=2, threads=8, timeout=30):
+        self.name = name
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.timeout = timeout
+        self.url = 'http://127.0.0.1:%d' % port
+        self.process = None
+        self.log = None
+
+    def command(self):
+        _, arguments, _ = SERVERS[self.name]
+        return [
+            sys.executable, '-m', 'gunicorn', *arguments, '--bind', '127.0.0.1:%d' % self.port,
+            '--workers', str(self.workers), '--threads', str(self.threads),
+        ]
+
+    def environment(self):
+        hosts = os.environ.get('ALLOWED_HOSTS', '')
+        return {**os.environ, **SERVERS[self.name][2], 'ALLOWED_HOSTS': hosts + ',127.0.0.1' if hosts else '127.0.0.1'}
+
+    def __enter__(self):
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            self.command(), cwd=settings.BASE_DIR, env=self.environment(),
+            stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        try:
+            self.wait_ready()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def wait_ready(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self.process.poll() is not None:
+                self.log.seek(0)
+                raise RuntimeError('%s server exited:\n%s' % (self.name, self.log.read().decode(errors='replace')[-2000:]))
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                connection.request('GET', '/api/v1/')
+                connection.getresponse().read()
+                connection.close()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError('%s server did not start within %d seconds' % (self.name, self.timeout))
+                time.sleep(0.2)
+
+    def __exit__(self, *exc_info):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.log.close()
+
+
+def compare(baseline, results):
+    """Lines comparing the latency percentiles of two result documents."""
+    lines = []
+    for name, result in results['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_mean'):
+            if old.get(key) and result.get(key) is not None:
+                changes.append('%s %+.1f%%' % (key, (result[key] - old[key]) * 100 / old[key]))
+        lines.append('%-24s %s' % (name, '  '.join(changes)))
+    return lines
@@ -0,0 +1,144 @@
+from django.db import connections, router, transaction
+from django.db.models import AutoField
+from django.utils import timezone
+
+from .signals import post_bulk_create, post_bulk_update, pre_bulk_update
+
+
+def bulk_create(model, objs, batch_size=1000):
+    """
+    ``bulk_create()`` that always sets primary keys and sends ``post_bulk_create``.
+
+    Receivers (search index, counters, ...) rely on the primary keys. Where
+    the database cannot return them from a multi-row INSERT they are
+    recovered inside the same transaction:
+
+    * SQLite holds its write lock for the whole transaction, so the ids just
+      inserted are the highest ones in the table. The rows are written with
+      ``insert_rows()``, which costs about half of Django's insert compiler.
+    * MySQL gives each multi-row INSERT a consecutive range of ids, starting
+      at ``LAST_INSERT_ID()``, so the rows are inserted one batch per
+      statement.
+    * Other databases insert the rows one at a time.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    using = router.db_for_write(model)
+    connection = connections[using]
+    manager = model._default_manager.using(using)
+    with transaction.atomic(using=using):
+        if connection.features.can_return_rows_from_bulk_insert:
+            manager.bulk_create(objs, batch_size=batch_size)
+        elif connection.vendor == 'sqlite':
+            _insert_rows_sqlite(manager, objs, batch_size)
+        elif connection.vendor == 'mysql':
+            _insert_batches_mysql(manager, objs, batch_size)
+        else:
+            _insert_each(manager, objs)
+        post_bulk_create.send(sender=model, instances=objs, using=using)
+    return objs
+
+
+def _insert_rows_sqlite(manager, objs, batch_size):
+    fields = [field for field in manager.model._meta.concrete_fields if not isinstance(field, AutoField)]
+    insert_rows(
+        manager.model, [field.name for field in fields],
+        ([field.pre_save(obj, True) for field in fields] for obj in objs), batch_size,
+    )
+    pks = manager.order_by('-pk').values_list('pk', flat=True)[:len(objs)]
+    for obj, pk in zip(objs, reversed(list(pks))):
+        obj.pk = pk
+        obj._state.adding = False
+        obj._state.db = manager.db
+
+
+def _insert_batches_mysql(manager, objs, batch_size):
+    with connections[manager.db].cursor() as cursor:
+        cursor.execute('SELECT @@auto_increment_increment')
+        step, = cursor.fetchone()
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            # MySQL has no bound parameter limit, so this is one INSERT
+            manager.bulk_create(batch, batch_size=len(batch))
+            cursor.execute('SELECT LAST_INSERT_ID()')
+            first, = cursor.fetchone()
+            for index, obj in enumerate(batch):
+                obj.pk = first + index * step
+
+
+def _insert_each(manager, objs):
+    opts = manager.model._meta
+    fields = [field for field in opts.concrete_fields if not isinstance(field, AutoField)]
+    for obj in objs:
+        # what Model.save() does for a new row, without the signals
+        row, = manager._insert([obj], fields=fields, returning_fields=opts.db_returning_fields, using=manager.db)
+        for value, field in zip(row, opts.db_returning_fields):
+            setattr(obj, field.attname, value)
+        obj._state.adding = False
+        obj._state.db = manager.db
+
+
+def insert_rows(model, field_names, rows, batch_size=1000):
+    """
+    Insert ``rows``, sequences of values for ``field_names``, with
+    ``executemany()``: no model instances, no primary keys, no signals.
+
+    For rows written in bulk, where building and compiling a model instance
+    for every row costs more than the INSERT itself. Values that repeat down
+    a column (a shared timestamp, the team) are only converted for the
+    database once per batch.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in field_names]
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+
+    def prepare(index, value, prepared):
+        try:
+            return prepared[index][value]
+        except KeyError:
+            result = prepared[index][value] = fields[index].get_db_prep_save(value, connection)
+            return result
+        except TypeError:
+            # unhashable, e.g. a JSON document
+            return fields[index].get_db_prep_save(value, connection)
+
+    rows = list(rows)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            prepared = [{} for _ in fields]
+            cursor.executemany(sql, [
+                [prepare(index, value, prepared) for index, value in enumerate(row)]
+                for row in rows[start:start + batch_size]
+            ])
+
+
+def bulk_update(model, pks, changes):
+    """
+    Apply ``changes`` to the rows in ``pks`` with one UPDATE statement.
+
+    ``auto_now`` fields (e.g. ``modified_at``) are bumped as ``save()`` would,
+    and ``pre_bulk_update``/``post_bulk_update`` are sent around the UPDATE
+    in the same transaction. Returns the number of rows updated.
+    """
+    pks = list(pks)
+    if not pks:
+        return 0
+    changes = dict(changes)
+    now = timezone.now()
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now', False):
+            changes.setdefault(field.name, now)
+
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        pre_bulk_update.send(sender=model, pks=pks, changes=changes, using=using)
+        updated = model._default_manager.using(using).filter(pk__in=pks).update(**changes)
+        post_bulk_update.send(sender=model, pks=pks, changes=changes, using=using)
+    return updated
@@ -0,0 +1,160 @@
+import hashlib
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+from .replicas import use_primary
+from .signals import post_bulk_create, post_bulk_update
+
+# Models whose writes change a team's cached list responses, as lazy senders
+VERSIONED_MODELS = ('lead.Lead', 'client.Client', 'client.Note')
+
+
+def data_version_key(team_id):
+    return 'team:%s:data-version' % team_id
+
+
+def get_data_version(team_id):
+    """
+    The team's current data version, an opaque token.
+
+    A missing version (first use, or evicted) is replaced with a fresh
+    random one, so entries written under an older version are never reused.
+    """
+    key = data_version_key(team_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(*team_ids):
+    """
+    Invalidate every cached response of the given teams with one write each.
+
+    Entries keyed by the old version are never read again and simply expire.
+    """
+    for team_id in set(team_ids):
+        if team_id is not None:
+            cache.set(data_version_key(team_id), uuid.uuid4().hex, None)
+
+
+def bump_data_version_on_commit(*team_ids, using=None):
+    # Bumping before commit would let a concurrent request cache the old rows
+    # under the new version.
+    transaction.on_commit(lambda: bump_data_version(*team_ids), using=using)
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters for this process, per view."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def record(self, view_name, hit):
+        with self.lock:
+            (self.hits if hit else self.misses)[view_name] += 1
+
+    def snapshot(self):
+        with self.lock:
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+            return {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else None,
+                'views': {
+                    name: {'hits': self.hits[name], 'misses': self.misses[name]}
+                    for name in sorted(set(self.hits) | set(self.misses))
+                },
+            }
+
+    def reset(self):
+        with self.lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+response_cache_stats = CacheStats()
+
+
+def response_cache_key(request, team_id, view_name):
+    """
+    Key for one team's view of a list endpoint.
+
+    Query parameters are normalized (sorted, repeated values kept) so that
+    equivalent URLs share an entry; the host is included because pagination
+    links in the payload are absolute.
+    """
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    digest = hashlib.md5(repr((request.get_host(), params)).encode()).hexdigest()
+    return 'response:%s:%s:%s:%s' % (team_id, get_data_version(team_id), view_name, digest)
+
+
+class CachedListMixin:
+    """
+    Serve ``list`` from the cache, keyed by team, data version and query.
+
+    Writes to a team's leads, clients or notes bump its data version (see the
+    receivers below), which retires all of its cached pages at once without
+    scanning keys. The response data is cached, not the rendered bytes, so
+    every renderer can use the same entry. ``X-Cache`` reports HIT or MISS.
+    """
+    response_cache_timeout = None
+
+    def get_response_cache_timeout(self):
+        if self.response_cache_timeout is not None:
+            return self.response_cache_timeout
+        return settings.RESPONSE_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        team_id = self.get_team_id()
+        timeout = self.get_response_cache_timeout()
+        if team_id is None or not timeout:
+            return super().list(request, *args, **kwargs)
+
+        view_name = self.basename or type(self).__name__
+        key = response_cache_key(request, team_id, view_name)
+        data = cache.get(key)
+        response_cache_stats.record(view_name, hit=data is not None)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        # the data version is bumped on the primary; a lagging replica could
+        # leave an older page cached under the new version
+        with use_primary():
+            response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+def team_data_changed(sender, instance, using=None, **kwargs):
+    bump_data_version_on_commit(instance.team_id, using=using)
+
+
+def team_data_bulk_created(sender, instances, using=None, **kwargs):
+    bump_data_version_on_commit(*{instance.team_id for instance in instances}, using=using)
+
+
+def team_data_bulk_updated(sender, pks, using=None, **kwargs):
+    team_ids = sender._default_manager.using(using).filter(pk__in=pks).values_list('team_id', flat=True).distinct()
+    bump_data_version_on_commit(*team_ids, using=using)
+
+
+for label in VERSIONED_MODELS:
+    post_save.connect(team_data_changed, sender=label, dispatch_uid='team_data_save_%s' % label)
+    post_delete.connect(team_data_changed, sender=label, dispatch_uid='team_data_delete_%s' % label)
+    post_bulk_create.connect(team_data_bulk_created, sender=label, dispatch_uid='team_data_bulk_create_%s' % label)
+    post_bulk_update.connect(team_data_bulk_updated, sender=label, dispatch_uid='team_data_bulk_update_%s' % label)
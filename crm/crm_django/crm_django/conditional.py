@@ -0,0 +1,101 @@
+import hashlib
+from calendar import timegm
+
+from django.core.exceptions import ValidationError
+from django.db.models import Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .cache import get_data_version
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def scope_validators(queryset, field='modified_at', version=None):
+    """
+    ``(etag, last_modified)`` for every row in ``queryset``, from one
+    ``max(field)``, which an index on the scope's filter and ``field``
+    answers without reading the rows.
+
+    ``max(field)`` moves on every insert and update. Deletes, and changes
+    outside the rows such as a renamed assignee embedded in the payload,
+    move the team's data ``version`` instead, which goes into the ETag only.
+    ``last_modified`` is a Unix timestamp, or None for an empty scope.
+    """
+    last_modified = queryset.order_by().aggregate(last_modified=Max(field))['last_modified']
+    etag = make_etag(queryset.model._meta.label, last_modified and last_modified.isoformat(), version)
+    return etag, last_modified and timegm(last_modified.utctimetuple())
+
+
+def not_modified_response(request, etag, last_modified):
+    """A 304 (or 412) response if the request's validators still match, else None."""
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Attach the validators to a 200 or 304 response.
+
+    Responses are private (they depend on the caller's team) and must be
+    revalidated on every use, which is what turns polling into 304s.
+    """
+    if response.status_code not in (200, 304):
+        return response
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for ``list`` and ``retrieve``.
+
+    Validators come from ``max(modified_at)`` of the view's team-scoped
+    ``get_queryset()`` (or of the single object for ``retrieve``), so an
+    unchanged resource is answered with a 304 after one index lookup, before
+    anything is paginated or serialized. The ETag also carries the team's
+    data version (crm_django.cache), which moves on deletes and when related
+    rows shown in the payload change, e.g. an assignee is renamed.
+
+    The list validators cover the whole scope rather than the filtered page:
+    any write in the team invalidates every cached page, which is coarse but
+    never stale. ``Last-Modified`` alone cannot see deletes of the newest
+    row or changes to related rows, so clients should prefer
+    ``If-None-Match``, which takes precedence.
+    """
+    last_modified_field = 'modified_at'
+
+    def get_validator_version(self):
+        team_id = self.get_team_id()
+        return None if team_id is None else get_data_version(team_id)
+
+    def get_list_validators(self):
+        return scope_validators(self.get_queryset(), self.last_modified_field, self.get_validator_version())
+
+    def get_object_validators(self):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.get_queryset().filter(**{self.lookup_field: self.kwargs[lookup]})
+            return scope_validators(queryset, self.last_modified_field, self.get_validator_version())
+        except (TypeError, ValueError, ValidationError):
+            # what get_object_or_404() answers for a malformed lookup
+            raise Http404
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, self.get_list_validators(), super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, self.get_object_validators(), super().retrieve, *args, **kwargs)
+
+    def conditional(self, request, validators, handler, *args, **kwargs):
+        etag, last_modified = validators
+        response = not_modified_response(request, etag, last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
@@ -0,0 +1,56 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm_django.benchmark import SCENARIOS, Benchmark, compare, load_tenants
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark API routes with concurrent clients and print p50/p95/p99 latency and queries per '
+        'request as JSON. Uses the teams in the database (see generate_synthetic_data); '
+        'convert-lead-to-client creates clients.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', choices=sorted(SCENARIOS),
+            help='Route to benchmark; repeat for several. Defaults to all of them.',
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per client first.')
+        parser.add_argument('--tenants', type=int, default=50, help='Number of teams to send requests as.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--base-url', help='Benchmark a running server (e.g. http://localhost:8000) instead.')
+        parser.add_argument('--output', help='Also write the results to this file.')
+        parser.add_argument('--compare', help='Results file of an earlier run to compare against.')
+
+    def handle(self, *args, **options):
+        try:
+            tenants = load_tenants(options['tenants'], random.Random(options['seed']))
+        except ValueError as e:
+            raise CommandError(e)
+
+        benchmark = Benchmark(
+            tenants, concurrency=options['concurrency'], requests=options['requests'],
+            warmup=options['warmup'], seed=options['seed'], base_url=options['base_url'],
+        )
+        scenarios = options['scenario'] or list(SCENARIOS)
+        results = {'meta': benchmark.metadata(), 'results': {}}
+        for name in scenarios:
+            result = results['results'][name] = benchmark.run_scenario(name)
+            self.stderr.write('%-24s p50 %8s ms  p95 %8s ms  p99 %8s ms  queries %5s  errors %d' % (
+                name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['queries_mean'], result['errors'],
+            ))
+
+        document = json.dumps(results, indent=2)
+        self.stdout.write(document)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(document + '\n')
+        if options['compare']:
+            with open(options['compare']) as f:
+                for line in compare(json.load(f), results):
+                    self.stderr.write(line)
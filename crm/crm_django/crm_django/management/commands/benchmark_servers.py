@@ -0,0 +1,78 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm_django.benchmark import SCENARIOS, SERVERS, Benchmark, Server, load_tenants, missing_modules
+
+HOT_READS = ['leads-list', 'leads-detail', 'clients-list', 'clients-detail', 'notes-list', 'get-my-team']
+
+
+class Command(BaseCommand):
+    help = (
+        'Start the project under gunicorn as a WSGI app (gthread workers, sync views) and as an ASGI app '
+        '(uvicorn workers, ASYNC_VIEWS) and benchmark both at increasing concurrency over HTTP. '
+        'Prints JSON; servers whose packages are not installed are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', action='append', choices=sorted(SERVERS), help='Defaults to both.')
+        parser.add_argument(
+            '--scenario', action='append', choices=sorted(SCENARIOS),
+            help='Route to benchmark; repeat for several. Defaults to the hot read routes.',
+        )
+        parser.add_argument(
+            '--concurrency', action='append', type=int,
+            help='Number of concurrent clients; repeat for several. Defaults to 1, 8, 32 and 64.',
+        )
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per scenario and level.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per client first.')
+        parser.add_argument('--tenants', type=int, default=50, help='Number of teams to send requests as.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Threads per WSGI worker; ASGI workers use the default executor for database work.',
+        )
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', help='Also write the results to this file.')
+
+    def handle(self, *args, **options):
+        try:
+            tenants = load_tenants(options['tenants'], random.Random(options['seed']))
+        except ValueError as e:
+            raise CommandError(e)
+
+        scenarios = options['scenario'] or HOT_READS
+        levels = sorted(options['concurrency'] or [1, 8, 32, 64])
+        results = {'meta': None, 'results': {}}
+        for name in options['server'] or sorted(SERVERS, reverse=True):
+            missing = missing_modules(name)
+            if missing:
+                self.stderr.write('%s: skipped, %s not installed' % (name, ' and '.join(missing)))
+                continue
+            server = Server(name, options['port'], workers=options['workers'], threads=options['threads'])
+            try:
+                with server:
+                    for concurrency in levels:
+                        benchmark = Benchmark(
+                            tenants, concurrency=concurrency, requests=options['requests'],
+                            warmup=options['warmup'], seed=options['seed'], base_url=server.url,
+                        )
+                        if results['meta'] is None:
+                            results['meta'] = dict(benchmark.metadata(), concurrency=levels, workers=options['workers'])
+                        for scenario in scenarios:
+                            result = benchmark.run_scenario(scenario)
+                            results['results'].setdefault(name, {}).setdefault(scenario, {})[concurrency] = result
+                            self.stderr.write('%-5s %-16s c=%-4d rps %8s  p50 %8s ms  p95 %8s ms  errors %d' % (
+                                name, scenario, concurrency, result['rps'], result['p50_ms'], result['p95_ms'],
+                                result['errors'],
+                            ))
+            except RuntimeError as e:
+                raise CommandError(e)
+
+        document = json.dumps(results, indent=2)
+        self.stdout.write(document)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(document + '\n')
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm_django.synthetic import SyntheticData
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate deterministic synthetic tenants for benchmarks, with skewed team sizes. '
+        'Production-like sizes are e.g. --teams 10000 --leads 1000000 --clients 200000 --notes 2000000.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=100)
+        parser.add_argument('--members', type=int, default=3, help='Average members per team, owner included.')
+        parser.add_argument('--leads', type=int, default=10000)
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument('--notes', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated data first.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write('Deleted %d rows.' % SyntheticData.clear())
+
+        start = time.perf_counter()
+        generator = SyntheticData(seed=options['seed'], batch_size=options['batch_size'], log=self.stdout.write)
+        counts = generator.generate(
+            teams=options['teams'], leads=options['leads'], clients=options['clients'],
+            notes=options['notes'], members=options['members'],
+        )
+        self.stdout.write(self.style.SUCCESS('Generated %s in %.1f s.' % (
+            ', '.join('%d %s' % (count, name) for name, count in counts.items()), time.perf_counter() - start,
+        )))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm_django import slowqueries
+
+
+class Command(BaseCommand):
+    help = (
+        'Show the slowest SQL fingerprints recorded by the running server processes '
+        '(needs SLOW_QUERY_DIR or METRICS_MULTIPROC_DIR), or clear them with --reset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Number of fingerprints to show.')
+        parser.add_argument('--reset', action='store_true', help='Forget everything recorded so far.')
+
+    def handle(self, *args, **options):
+        if not slowqueries.shared_directory():
+            raise CommandError(
+                'Slow queries are kept in each server process. Set SLOW_QUERY_DIR (or METRICS_MULTIPROC_DIR) '
+                'to share them with this command, or use the api/v1/slow-queries/ endpoint as an admin.'
+            )
+        if options['reset']:
+            slowqueries.clear_shared()
+            self.stdout.write(self.style.SUCCESS('Slow query statistics cleared.'))
+            return
+
+        entries = slowqueries.collect(options['limit'])
+        if not entries:
+            self.stdout.write('No slow queries recorded.')
+            return
+        for entry in entries:
+            self.stdout.write('%8.1f ms total  %5d x  max %.1f ms  %s (team %s)' % (
+                entry['total_ms'], entry['count'], entry['max_ms'], entry['endpoint'], entry['team_id'],
+            ))
+            self.stdout.write('    %s' % entry['fingerprint'])
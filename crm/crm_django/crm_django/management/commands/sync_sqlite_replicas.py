@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite primary database over the DATABASE_REPLICAS files, once or every --interval '
+        'seconds, to try read replicas locally. The interval plays the part of replication lag.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep copying, waiting this many seconds in between.')
+
+    def handle(self, *args, **options):
+        aliases = [DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS]
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('DATABASE_REPLICAS is not set.')
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError('Only SQLite databases can be copied; replicate PostgreSQL with its own tools.')
+
+        primary = str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+        try:
+            while True:
+                start = time.perf_counter()
+                with sqlite3.connect(primary) as source:
+                    for alias in settings.DATABASE_REPLICAS:
+                        with sqlite3.connect(str(connections[alias].settings_dict['NAME'])) as target:
+                            # an online backup: readers of the replica see the old or the new copy
+                            source.backup(target)
+                self.stdout.write('Copied to %d replicas in %.2f s.' % (
+                    len(settings.DATABASE_REPLICAS), time.perf_counter() - start,
+                ))
+                if options['interval'] is None:
+                    return
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,375 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; snapshots are then folded without a lock
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+UNRESOLVED = '<unresolved>'
+
+
+def _observe(buckets, bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            buckets[i] += 1
+            return
+    buckets[-1] += 1
+
+
+class Registry:
+    """
+    Totals per ``(view, method)``: request count, latency buckets and sum,
+    query-count buckets, query total and database seconds, plus a count per
+    ``(view, method, status)``. Bucket counts are stored per bucket and made
+    cumulative when exported.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.statuses = {}
+        self.last_flush = 0.0
+
+    def record(self, view, method, status, duration, queries, db_time):
+        with self.lock:
+            stats = self.endpoints.get((view, method))
+            if stats is None:
+                stats = self.endpoints[view, method] = {
+                    'count': 0,
+                    'duration_sum': 0.0,
+                    'duration_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                    'queries_sum': 0,
+                    'queries_buckets': [0] * (len(QUERY_BUCKETS) + 1),
+                    'db_time_sum': 0.0,
+                }
+            stats['count'] += 1
+            stats['duration_sum'] += duration
+            _observe(stats['duration_buckets'], LATENCY_BUCKETS, duration)
+            stats['queries_sum'] += queries
+            _observe(stats['queries_buckets'], QUERY_BUCKETS, queries)
+            stats['db_time_sum'] += db_time
+            key = (view, method, str(status))
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'endpoints': [[view, method, dict(stats, duration_buckets=list(stats['duration_buckets']), queries_buckets=list(stats['queries_buckets']))]
+                              for (view, method), stats in self.endpoints.items()],
+                'statuses': [[view, method, status, count] for (view, method, status), count in self.statuses.items()],
+            }
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+            self.statuses.clear()
+
+    # multi-process support
+
+    def maybe_flush(self):
+        directory = getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if now - self.last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            return
+        self.last_flush = now
+        self.flush(directory)
+
+    def flush(self, directory):
+        write_snapshot(directory, 'metrics', self.snapshot())
+
+
+registry = Registry()
+
+
+def _write_json(directory, name, data):
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.%s-' % name)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, os.path.join(directory, name))
+
+
+def write_snapshot(directory, prefix, data):
+    """Atomically replace this process's ``<prefix>-<pid>.json`` in ``directory``."""
+    _write_json(directory, '%s-%d.json' % (prefix, os.getpid()), data)
+
+
+def read_snapshots(directory, prefix):
+    """Every snapshot written by ``write_snapshot``, plus ``<prefix>-dead.json``."""
+    snapshots = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix + '-') and name.endswith('.json'):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # a worker replacing its file; it is counted on the next scrape
+    return snapshots
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, owned by another user
+    return True
+
+
+@contextmanager
+def snapshot_lock(directory, prefix):
+    """Serialize readers that fold snapshots, across processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, '.%s.lock' % prefix), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def fold_dead_snapshots(directory, prefix, combine):
+    """
+    Merge the snapshots of processes that have exited into
+    ``<prefix>-dead.json`` with ``combine(snapshots)`` and remove them, so
+    recycled workers do not leave a file behind each while their counts
+    stay in the totals. Call under ``snapshot_lock``.
+    """
+    dead_name = '%s-dead.json' % prefix
+    for name in os.listdir(directory):
+        pid = name[len(prefix) + 1:-len('.json')]
+        if not (name.startswith(prefix + '-') and name.endswith('.json') and pid.isdigit()):
+            continue
+        if int(pid) == os.getpid() or process_exists(int(pid)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        try:
+            with open(os.path.join(directory, dead_name)) as f:
+                snapshot = combine([json.load(f), snapshot])
+        except FileNotFoundError:
+            pass
+        _write_json(directory, dead_name, snapshot)
+        os.remove(path)
+
+
+def merge(snapshots):
+    """Sum snapshots from several processes into one."""
+    endpoints, statuses = {}, {}
+    for snapshot in snapshots:
+        for view, method, stats in snapshot['endpoints']:
+            total = endpoints.get((view, method))
+            if total is None:
+                endpoints[view, method] = dict(stats, duration_buckets=list(stats['duration_buckets']), queries_buckets=list(stats['queries_buckets']))
+                continue
+            for name in ('count', 'duration_sum', 'queries_sum', 'db_time_sum'):
+                total[name] += stats[name]
+            for name in ('duration_buckets', 'queries_buckets'):
+                total[name] = [a + b for a, b in zip(total[name], stats[name])]
+        for view, method, status, count in snapshot['statuses']:
+            statuses[view, method, status] = statuses.get((view, method, status), 0) + count
+    return endpoints, statuses
+
+
+def merge_snapshots(snapshots):
+    """``merge()``, in the snapshot format."""
+    endpoints, statuses = merge(snapshots)
+    return {
+        'endpoints': [[view, method, stats] for (view, method), stats in endpoints.items()],
+        'statuses': [[view, method, status, count] for (view, method, status), count in statuses.items()],
+    }
+
+
+def collect():
+    """Totals of this process, or of every process sharing METRICS_MULTIPROC_DIR."""
+    directory = getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+    if not directory:
+        return merge([registry.snapshot()])
+    registry.flush(directory)
+    with snapshot_lock(directory, 'metrics'):
+        fold_dead_snapshots(directory, 'metrics', merge_snapshots)
+        return merge(read_snapshots(directory, 'metrics'))
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels.items())
+
+
+def _bounds(bounds):
+    return [repr(float(bound)) for bound in bounds] + ['+Inf']
+
+
+def render():
+    """The collected metrics in the Prometheus text exposition format (0.0.4)."""
+    endpoints, statuses = collect()
+    lines = []
+
+    def histogram(name, help_text, bounds, buckets_key, sum_key):
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s histogram' % name)
+        for (view, method), stats in sorted(endpoints.items()):
+            cumulative = 0
+            for bound, count in zip(_bounds(bounds), stats[buckets_key]):
+                cumulative += count
+                lines.append('%s_bucket{%s} %d' % (name, _labels(view=view, method=method, le=bound), cumulative))
+            labels = _labels(view=view, method=method)
+            lines.append('%s_sum{%s} %r' % (name, labels, float(stats[sum_key])))
+            lines.append('%s_count{%s} %d' % (name, labels, stats['count']))
+
+    histogram('crm_http_request_duration_seconds', 'Request latency by URL name.', LATENCY_BUCKETS, 'duration_buckets', 'duration_sum')
+    histogram('crm_db_queries_per_request', 'Database queries per request by URL name.', QUERY_BUCKETS, 'queries_buckets', 'queries_sum')
+
+    lines.append('# HELP crm_db_query_duration_seconds_total Time spent in database queries by URL name.')
+    lines.append('# TYPE crm_db_query_duration_seconds_total counter')
+    for (view, method), stats in sorted(endpoints.items()):
+        lines.append('crm_db_query_duration_seconds_total{%s} %r' % (_labels(view=view, method=method), float(stats['db_time_sum'])))
+
+    lines.append('# HELP crm_http_responses_total Responses by URL name and status code.')
+    lines.append('# TYPE crm_http_responses_total counter')
+    for (view, method, status), count in sorted(statuses.items()):
+        lines.append('crm_http_responses_total{%s} %d' % (_labels(view=view, method=method, status=status), count))
+    return '\n'.join(lines) + '\n'
+
+
+# Execute wrappers watching the queries of the current request, see observe_queries()
+_query_observers = contextvars.ContextVar('query_observers', default=())
+
+
+def observed_execute(execute, sql, params, many, context):
+    observers = _query_observers.get()
+    for observer in reversed(observers):
+        execute = functools.partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install_observers(connection, **kwargs):
+    if observed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, observed_execute)
+
+
+def enable_query_observers():
+    """
+    Put ``observed_execute`` on every database connection, current and
+    future, of every thread.
+    """
+    connection_created.connect(install_observers, dispatch_uid='crm_django.metrics.install_observers')
+    for connection in connections.all():
+        install_observers(connection)
+
+
+@contextmanager
+def observe_queries(observer):
+    """
+    Pass the queries run inside the block through ``observer``, an execute
+    wrapper as for ``connection.execute_wrapper``.
+
+    Unlike ``connection.execute_wrapper``, which only sees the connection of
+    the calling thread, the observer is kept in a context variable and so
+    follows the request into the threads ``sync_to_async`` runs its database
+    work in under ASGI. Needs ``enable_query_observers()``.
+    """
+    token = _query_observers.set(_query_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        _query_observers.reset(token)
+
+
+class QueryCounter:
+    """``connection.execute_wrapper`` that counts queries and their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - start
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status codes, query counts and database time per resolved
+    URL name (``leads-list``, ``get-my-team``, ...) and HTTP method.
+
+    Enabled by ``METRICS_ENABLED``. Recording is a few additions under a lock;
+    nothing is formatted until ``/metrics`` is scraped. With several worker
+    processes set ``METRICS_MULTIPROC_DIR`` to a directory they share: each
+    process writes its totals there at most every ``METRICS_FLUSH_INTERVAL``
+    seconds and the ``/metrics`` view sums all of the files, folding those of
+    exited processes into one. Works in sync and async (ASGI) middleware
+    chains.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        enable_query_observers()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(counter):
+            response = self.get_response(request)
+        self.record(request, response, start, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(counter):
+            response = await self.get_response(request)
+        self.record(request, response, start, counter)
+        return response
+
+    def record(self, request, response, start, counter):
+        # streamed bodies are produced after this point and are not included
+        registry.record(
+            view_name(request), request.method, response.status_code,
+            time.perf_counter() - start, counter.count, counter.time,
+        )
+        registry.maybe_flush()
@@ -0,0 +1,172 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over an ``(ordering field, id)`` pair.
+
+    Each page is fetched with ``WHERE field <= :value AND (field < :value OR
+    id < :id) ORDER BY field, id LIMIT n`` against a composite index that
+    starts with the team, so page 5,000 costs the same as page 1 and no
+    ``COUNT(*)`` is ever run. Both ordering terms must share a direction.
+    """
+    page_size = 10
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-modified_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None, page_size=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        if page_size is not None:
+            self.page_size = page_size
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        field_name, descending = self._parse_ordering(self.ordering[0])
+        tie_name, _ = self._parse_ordering(self.ordering[1])
+        self.field = queryset.model._meta.get_field(field_name)
+        self.tie_name = tie_name
+
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor.get('r'))
+        # walking backwards flips both the comparison and the sort direction
+        forwards_descending = descending != self.reverse
+
+        if cursor:
+            queryset = queryset.filter(self._seek(cursor['v'], cursor['id'], forwards_descending))
+
+        order = '-' if forwards_descending else ''
+        queryset = queryset.order_by(order + field_name, order + tie_name)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.page = results
+        if self.reverse:
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        # rows are model instances, or dicts when the page was read with values()
+        if isinstance(row, dict):
+            value, tie = row[self.field.name], row[self.tie_name]
+        else:
+            value, tie = getattr(row, self.field.attname), getattr(row, self.tie_name)
+        position = {
+            'v': value.isoformat() if hasattr(value, 'isoformat') else value,
+            'id': tie,
+        }
+        if reverse:
+            position['r'] = 1
+        token = urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(token.encode()).decode())
+            position['v'] = self.field.to_python(position['v'])
+            position['id'] = int(position['id'])
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def _seek(self, value, tie, descending):
+        field, tie_name = self.field.name, self.tie_name
+        if descending:
+            return Q(**{field + '__lte': value}) & (Q(**{field + '__lt': value}) | Q(**{tie_name + '__lt': tie}))
+        return Q(**{field + '__gte': value}) & (Q(**{field + '__gt': value}) | Q(**{tie_name + '__gt': tie}))
+
+    @staticmethod
+    def _parse_ordering(term):
+        return term.lstrip('-'), term.startswith('-')
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, keyset pagination when ``?cursor=`` is sent.
+
+    Existing clients keep ``?page=N`` (with its ``count``); clients that send
+    ``cursor`` (empty for the first page) get ``next``/``previous`` cursors
+    instead, which stay constant-cost however deep they scroll.
+
+    In keyset mode an ``?ordering=`` on one of ``keyset_fields`` is honoured;
+    any other ordering falls back to ``ordering``, since keyset pages need a
+    non-null, indexed sort key.
+    """
+    page_size = 10
+    ordering = ('-modified_at', '-id')
+    keyset_fields = ()
+    keyset_class = KeysetPagination
+
+    def get_keyset_ordering(self, queryset):
+        requested = queryset.query.order_by
+        if requested and requested[0].lstrip('-') in self.keyset_fields:
+            direction = '-' if requested[0].startswith('-') else ''
+            return (requested[0], direction + 'id')
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            ordering = self.get_keyset_ordering(queryset)
+            self.keyset = self.keyset_class(ordering=ordering, page_size=self.page_size)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        if not queryset.ordered:
+            queryset = queryset.order_by(*self.ordering)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
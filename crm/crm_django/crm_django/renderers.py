@@ -0,0 +1,47 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` that encodes with orjson when it is installed.
+
+    Strings, integers, containers and everything orjson does not encode
+    natively (datetimes, Decimal, lazy strings, ...; the latter go through
+    DRF's encoder) come out byte-for-byte as ``JSONRenderer`` writes them with
+    the default settings: compact, UTF-8, U+2028/U+2029 escaped. Floats parse
+    to the same values but are formatted by orjson, which writes very large
+    and very small ones differently (``1e16`` and ``0.00001`` rather than
+    ``1e+16`` and ``1e-05``) and renders NaN and infinity as ``null`` where
+    ``JSONRenderer`` raises. Indented output (the browsable API), non-default
+    JSON settings and a missing orjson all fall back to ``JSONRenderer``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or not (api_settings.COMPACT_JSON and api_settings.UNICODE_JSON and api_settings.STRICT_JSON)
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=JSONEncoder().default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except TypeError:
+            # e.g. integers beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # same escaping as JSONRenderer, so the output is valid JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,147 @@
+import asyncio
+import contextvars
+import hashlib
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# The routing state of the current request, see ReplicaMiddleware. None
+# (outside requests, and inside use_primary()) reads from the primary.
+_routing = contextvars.ContextVar('replica_routing', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+class RoutingState:
+    """Where one request reads from, and whether it has written."""
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """
+    Send the reads of safe requests to a replica in ``DATABASE_REPLICAS``
+    and everything else to the primary.
+
+    Only requests that went through ``ReplicaMiddleware`` read from a
+    replica, one picked per request. A request that writes reads from the
+    primary from then on, as do reads inside a transaction on the primary,
+    so a request sees its own writes; management commands and workers never
+    leave the primary. Replicas are never migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside the block, for lookups whose results are
+    cached (a stale read would be kept for the whole cache timeout).
+    """
+    token = _routing.set(None)
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def pin_cache():
+    return caches[getattr(settings, 'REPLICA_PIN_CACHE_ALIAS', None) or 'default']
+
+
+def pin_key(request):
+    """The caller's token or session, hashed; None for anonymous callers."""
+    credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credentials:
+        return None
+    return 'replica-pin:%s' % hashlib.sha256(credentials.encode()).hexdigest()
+
+
+class ReplicaMiddleware:
+    """
+    Route the reads of GET, HEAD and OPTIONS requests to a replica (see
+    ``ReplicaRouter``).
+
+    After a request writes, the same caller (by token or session) keeps
+    reading from the primary for ``REPLICA_LAG_TOLERANCE`` seconds, the
+    replication lag we accept, so it reads its own writes on the next
+    requests as well. Disabled without ``DATABASE_REPLICAS``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.lag_tolerance = getattr(settings, 'REPLICA_LAG_TOLERANCE', 5)
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key, state = self.start(request)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        self.finish(key, state)
+        return response
+
+    async def __acall__(self, request):
+        key, state = self.start(request)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        self.finish(key, state)
+        return response
+
+    def start(self, request):
+        key = pin_key(request) if self.lag_tolerance else None
+        if request.method not in SAFE_METHODS or (key is not None and pin_cache().get(key)):
+            return key, RoutingState()
+        return key, RoutingState(random.choice(replicas()))
+
+    def finish(self, key, state):
+        if state.wrote and key is not None:
+            pin_cache().set(key, True, self.lag_tolerance)
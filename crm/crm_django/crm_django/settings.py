@@ -51,15 +51,23 @@ INSTALLED_APPS = [
     'lead',
     'team',
     'client',
+    'search',
+    'activity',
+    'crm_django',
 ]
 
 MIDDLEWARE = [
+    # first, so its timings include every other middleware
+    'crm_django.metrics.MetricsMiddleware',
+    'crm_django.slowqueries.SlowQueryMiddleware',
+    'crm_django.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'activity.recording.ActivityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,6 +80,21 @@ STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
 STRIPE_PRICE_ID_SMALL_TEAM = os.environ.get('STRIPE_PRICE_ID_SMALL_TEAM')
 STRIPE_PRICE_ID_BIG_TEAM = os.environ.get('STRIPE_PRICE_ID_BIG_TEAM')
 STRIPE_WEBHOOK_KEY = os.environ.get('STRIPE_WEBHOOK_KEY')
+# Point the Stripe client somewhere else, e.g. a local stripe-mock for tests
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE') or None
+# Seconds Stripe products and subscriptions stay cached (team.billing), and the
+# cache alias to keep them in
+STRIPE_CACHE_TIMEOUT = int(os.environ.get('STRIPE_CACHE_TIMEOUT', '300'))
+STRIPE_CACHE_ALIAS = os.environ.get('STRIPE_CACHE_ALIAS') or None
+# Webhook events are retried by process_stripe_events this many times before being marked failed
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.environ.get('STRIPE_EVENT_MAX_ATTEMPTS', '5'))
+# Seconds before the first retry of a failed event; doubled for each further attempt
+STRIPE_EVENT_RETRY_DELAY = float(os.environ.get('STRIPE_EVENT_RETRY_DELAY', '30'))
+
+# Seconds a user's team id stays in the process-level team cache (team.context)
+TEAM_CACHE_TIMEOUT = int(os.environ.get('TEAM_CACHE_TIMEOUT', '300'))
+# Seconds before another process sees a changed plan (team.plans)
+PLAN_CACHE_TIMEOUT = int(os.environ.get('PLAN_CACHE_TIMEOUT', '300'))
 
 FRONTEND_WEBSITE_SUCCESS_URL = os.environ.get('FRONTEND_WEBSITE_SUCCESS_URL')
 FRONTEND_WEBSITE_CANCEL_URL = os.environ.get('FRONTEND_WEBSITE_CANCEL_URL')
@@ -104,6 +127,58 @@ DATABASES = {
     }
 }
 
+# Read replicas (crm_django.replicas): comma-separated database names, SQLite
+# files like DATABASE_NAME or, for PostgreSQL, [host[:port]/]name. GET, HEAD
+# and OPTIONS requests read from one of them; writes go to `default`. After a
+# write the caller reads from the primary for REPLICA_LAG_TOLERANCE seconds;
+# with several processes set REPLICA_PIN_CACHE_ALIAS to a shared cache.
+# Locally, `manage.py sync_sqlite_replicas` copies the primary file over.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    options = {'NAME': BASE_DIR / replica}
+    if 'sqlite' not in DATABASES['default']['ENGINE']:
+        address, _, name = replica.rpartition('/')
+        host, _, port = address.partition(':')
+        options = {'NAME': name, 'HOST': host, 'PORT': port}
+    DATABASES['replica%d' % index] = dict(DATABASES['default'], TEST={'MIRROR': 'default'}, **options)
+    DATABASE_REPLICAS.append('replica%d' % index)
+
+DATABASE_ROUTERS = ['crm_django.replicas.ReplicaRouter']
+REPLICA_LAG_TOLERANCE = float(os.environ.get('REPLICA_LAG_TOLERANCE', '5'))
+REPLICA_PIN_CACHE_ALIAS = os.environ.get('REPLICA_PIN_CACHE_ALIAS') or None
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Local memory by default; set CACHE_BACKEND/CACHE_LOCATION to share the
+# response cache between processes (e.g. the file-based backend).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '10000'))},
+    }
+}
+
+# Seconds a cached list response is kept (crm_django.cache); 0 disables it
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', '300'))
+
+# Token -> user cache (crm_django.authentication). The timeout also bounds how
+# long another process may accept a revoked token. Set TOKEN_CACHE_ALIAS to a
+# CACHES alias to share entries (and revocations) between processes.
+TOKEN_CACHE_TIMEOUT = int(os.environ.get('TOKEN_CACHE_TIMEOUT', '60'))
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', '10000'))
+TOKEN_CACHE_ALIAS = os.environ.get('TOKEN_CACHE_ALIAS') or None
+
+
+# Request metrics (crm_django.metrics), served in Prometheus format at /metrics.
+# Set METRICS_MULTIPROC_DIR to a directory shared by all worker processes to
+# aggregate across them, and METRICS_TOKEN to require a bearer token.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False') == 'True'
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -134,10 +209,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'crm_django.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
+    ],
+    # encodes with orjson (in requirements.txt; falls back to JSONRenderer
+    # without it), same bytes as JSONRenderer except for float formatting
+    'DEFAULT_RENDERER_CLASSES': [
+        'crm_django.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ]
 }
 
@@ -160,6 +241,10 @@ DJOSER = {
 }
 
 # Logging configuration
+# LOG_LEVEL applies to everything; set DB_LOG_LEVEL=DEBUG to log every SQL query
+# (costly: each query is formatted and written out).
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -170,22 +255,38 @@ LOGGING = {
     },
     'root': {
         'handlers': ['console'],
-        'level': 'DEBUG',
+        'level': LOG_LEVEL,
     },
     'loggers': {
         'django': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': False,
         },
         'django.db.backends': {
-            'level': 'DEBUG',
+            'level': os.environ.get('DB_LOG_LEVEL', 'INFO'),
             'handlers': ['console'],
             'propagate': False,
         },
     },
 }
 
+# Slow query log (crm_django.slowqueries). Queries slower than the threshold are
+# counted per SQL fingerprint; SLOW_QUERY_SAMPLE_RATE of them are also logged.
+# An empty threshold turns it off.
+SLOW_QUERY_THRESHOLD_MS = os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200')
+SLOW_QUERY_THRESHOLD_MS = float(SLOW_QUERY_THRESHOLD_MS) if SLOW_QUERY_THRESHOLD_MS else None
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', '1'))
+SLOW_QUERY_TOP_N = int(os.environ.get('SLOW_QUERY_TOP_N', '20'))
+SLOW_QUERY_DIR = os.environ.get('SLOW_QUERY_DIR') or None
+
+# Serve the hot read routes (lead/client list and detail, notes, get-my-team)
+# with async views (crm_django.asyncviews). Only for ASGI servers such as
+# `gunicorn -k uvicorn_worker.UvicornWorker crm_django.asgi:application`.
+# Django's own middlewares still run one by one on a single thread per
+# process under ASGI; see async_view.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
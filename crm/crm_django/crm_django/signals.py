@@ -0,0 +1,15 @@
+from django.db.models.signals import ModelSignal
+
+# Model signals, so receivers can name their sender lazily as 'app_label.Model'.
+
+# Sent after rows are inserted with bulk_create(), which skips post_save.
+# Arguments: sender (the model class), instances (list with primary keys set).
+post_bulk_create = ModelSignal(use_caching=True)
+
+# Sent around a single-statement UPDATE of many rows, which skips
+# pre_save/post_save. Arguments: sender (the model class), pks (list of
+# primary keys being updated), changes (dict of field name -> new value).
+# pre_bulk_update runs inside the same transaction, before the UPDATE, so
+# receivers can still read the old values.
+pre_bulk_update = ModelSignal(use_caching=True)
+post_bulk_update = ModelSignal(use_caching=True)
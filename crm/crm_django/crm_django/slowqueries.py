@@ -0,0 +1,274 @@
+import asyncio
+import functools
+import logging
+import os
+import random
+import re
+import threading
+import time
+import traceback
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import (
+    enable_query_observers, fold_dead_snapshots, observe_queries, read_snapshots, snapshot_lock, view_name,
+    write_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w".])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_LIST = re.compile(r'\(\?(?:, \?)+\)')
+_ROWS = re.compile(r'(\((?:\?|\.\.\.)\))(?:, \((?:\?|\.\.\.)\))+')
+_SPACE = re.compile(r'\s+')
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    ``sql`` with literals and parameters replaced by ``?`` and lists of them
+    collapsed, so the same statement groups together however many ids or
+    rows it was run with.
+    """
+    sql = _SPACE.sub(' ', sql.strip())
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _LIST.sub('(...)', sql)
+    return _ROWS.sub(r'\1, ...', sql)
+
+
+def stack_summary(limit=5):
+    """The innermost ``limit`` frames of project code, as ``file:line in function``."""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename
+        and not frame.filename.endswith(('slowqueries.py', 'metrics.py'))
+    ]
+    return [
+        '%s:%d in %s' % (os.path.relpath(frame.filename, base_dir), frame.lineno, frame.name)
+        for frame in frames[-limit:]
+    ]
+
+
+class SlowQueryStats:
+    """
+    Per-fingerprint count, total and worst duration of slow queries in this
+    process, with the endpoint and team of the worst one.
+
+    Only the ``SLOW_QUERY_TOP_N`` fingerprints with the highest total time
+    are kept once the table grows past a few times that size.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.last_flush = 0.0
+        self.reset_at = 0.0
+
+    @property
+    def size(self):
+        return getattr(settings, 'SLOW_QUERY_TOP_N', 20)
+
+    def record(self, fingerprint, duration, endpoint, team_id, sql):
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            if entry is None:
+                entry = self.entries[fingerprint] = {
+                    'fingerprint': fingerprint, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                }
+                if len(self.entries) > 4 * self.size:
+                    self.prune()
+            entry['count'] += 1
+            entry['total_ms'] += duration
+            if duration >= entry['max_ms']:
+                entry.update(max_ms=duration, endpoint=endpoint, team_id=team_id, sql=sql)
+
+    def prune(self):
+        for entry in sorted(self.entries.values(), key=lambda entry: entry['total_ms'])[:-self.size]:
+            del self.entries[entry['fingerprint']]
+
+    def top(self):
+        with self.lock:
+            return top(self.entries.values(), self.size)
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+
+    def maybe_flush(self):
+        directory = shared_directory()
+        if not directory:
+            return
+        now = time.monotonic()
+        if now - self.last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            return
+        self.last_flush = now
+        self.flush(directory)
+
+    def flush(self, directory):
+        # honour a reset requested by another process (see clear_shared)
+        try:
+            reset_at = os.stat(os.path.join(directory, RESET_MARKER)).st_mtime
+        except OSError:
+            reset_at = 0.0
+        if reset_at > self.reset_at:
+            self.reset_at = reset_at
+            self.reset()
+        write_snapshot(directory, 'slowqueries', self.top())
+
+
+RESET_MARKER = 'slowqueries.reset'
+
+slow_query_stats = SlowQueryStats()
+
+
+def top(entries, size):
+    return [dict(entry) for entry in sorted(entries, key=lambda entry: -entry['total_ms'])[:size]]
+
+
+def shared_directory():
+    return getattr(settings, 'SLOW_QUERY_DIR', None) or getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+
+
+def collect(size=None):
+    """
+    The worst fingerprints of this process, or of every process sharing
+    ``SLOW_QUERY_DIR`` (``METRICS_MULTIPROC_DIR`` by default).
+    """
+    size = size or slow_query_stats.size
+    directory = shared_directory()
+    if not directory:
+        return slow_query_stats.top()[:size]
+    slow_query_stats.flush(directory)
+    with snapshot_lock(directory, 'slowqueries'):
+        fold_dead_snapshots(directory, 'slowqueries', merge_dead)
+        snapshots = read_snapshots(directory, 'slowqueries')
+    return top(merge(snapshots).values(), size)
+
+
+def merge(snapshots):
+    """Fingerprint -> entry summed over several processes' snapshots."""
+    merged = {}
+    for snapshot in snapshots:
+        for entry in snapshot:
+            total = merged.get(entry['fingerprint'])
+            if total is None:
+                merged[entry['fingerprint']] = dict(entry)
+                continue
+            total['count'] += entry['count']
+            total['total_ms'] += entry['total_ms']
+            if entry['max_ms'] > total['max_ms']:
+                total.update({key: entry[key] for key in ('max_ms', 'endpoint', 'team_id', 'sql')})
+    return merged
+
+
+def merge_dead(snapshots):
+    # exited processes are kept with the same headroom as a live table
+    return top(merge(snapshots).values(), 4 * slow_query_stats.size)
+
+
+def clear_shared():
+    """
+    Remove every process's snapshot from the shared directory and ask the
+    processes to reset their own statistics on their next flush.
+    """
+    directory = shared_directory()
+    if not directory:
+        return
+    with open(os.path.join(directory, RESET_MARKER), 'w'):
+        pass
+    for name in os.listdir(directory):
+        if name.startswith('slowqueries-') and name.endswith('.json'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+class SlowQueryRecorder:
+    """``connection.execute_wrapper`` that keeps queries slower than the threshold."""
+
+    def __init__(self, threshold, sample_rate):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if duration >= self.threshold:
+                sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+                self.queries.append((sql, duration, stack_summary() if sampled else None))
+
+
+class SlowQueryMiddleware:
+    """
+    Log queries slower than ``SLOW_QUERY_THRESHOLD_MS`` and count them per
+    SQL fingerprint.
+
+    Every slow query is counted in ``slow_query_stats``; a
+    ``SLOW_QUERY_SAMPLE_RATE`` fraction of them is also logged (with a stack
+    summary) on the ``crm_django.slowqueries`` logger. The endpoint and team
+    id are filled in once the response is ready; the team id is the one the
+    view resolved and left on ``request.team_id``, so reporting never queries
+    (requests that resolve no team are reported without one). Disabled when
+    the threshold is unset.
+    See the ``slow_queries`` management command and ``api/v1/slow-queries/``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+        if self.threshold is None:
+            raise MiddlewareNotUsed
+        self.sample_rate = getattr(settings, 'SLOW_QUERY_SAMPLE_RATE', 1.0)
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        enable_query_observers()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        recorder = SlowQueryRecorder(self.threshold, self.sample_rate)
+        with observe_queries(recorder):
+            response = self.get_response(request)
+        if recorder.queries:
+            self.report(request, recorder.queries)
+        return response
+
+    async def __acall__(self, request):
+        recorder = SlowQueryRecorder(self.threshold, self.sample_rate)
+        with observe_queries(recorder):
+            response = await self.get_response(request)
+        if recorder.queries:
+            self.report(request, recorder.queries)
+        return response
+
+    def report(self, request, queries):
+        endpoint = '%s %s' % (request.method, view_name(request))
+        team_id = getattr(request, 'team_id', None)
+        for sql, duration, stack in queries:
+            sql_fingerprint = fingerprint(sql)
+            slow_query_stats.record(sql_fingerprint, duration, endpoint, team_id, sql)
+            if stack is not None:
+                logger.warning(
+                    'Slow query (%.1f ms) on %s, team %s: %s\n  %s',
+                    duration, endpoint, team_id, sql_fingerprint, '\n  '.join(stack),
+                    extra={
+                        'duration_ms': duration, 'endpoint': endpoint, 'team_id': team_id,
+                        'fingerprint': sql_fingerprint, 'stack': stack,
+                    },
+                )
+        slow_query_stats.maybe_flush()
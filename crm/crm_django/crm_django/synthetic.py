@@ -0,0 +1,220 @@
+import random
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.authtoken.models import Token
+
+from activity.models import Activity
+from client.models import Client, Note
+from lead.models import Lead, LeadPipelineSummary
+from search.indexing import unindex_teams
+from team.models import Team
+from .bulk import bulk_create
+
+# Synthetic users are recognisable by this e-mail domain (see SyntheticData.clear)
+DOMAIN = 'synthetic.example.com'
+
+WORDS = (
+    'Acme', 'Apex', 'Atlas', 'Beacon', 'Blue', 'Bright', 'Cedar', 'Cloud', 'Coastal', 'Crown',
+    'Delta', 'Eagle', 'Echo', 'Falcon', 'First', 'Global', 'Golden', 'Green', 'Harbor', 'Horizon',
+    'Iron', 'Keystone', 'Lake', 'Liberty', 'Maple', 'Metro', 'North', 'Nova', 'Oak', 'Orbit',
+    'Pacific', 'Peak', 'Pioneer', 'Prime', 'Quantum', 'Red', 'River', 'Silver', 'Summit', 'Vertex',
+)
+SUFFIXES = ('Labs', 'Systems', 'Logistics', 'Foods', 'Health', 'Media', 'Partners', 'Capital', 'Works', 'Retail')
+FIRST_NAMES = (
+    'Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Jamie', 'Riley', 'Avery', 'Quinn',
+    'Priya', 'Wei', 'Amara', 'Lucas', 'Sofia', 'Mateo', 'Aisha', 'Noah', 'Yuki', 'Omar',
+)
+LAST_NAMES = (
+    'Smith', 'Garcia', 'Chen', 'Patel', 'Kim', 'Nguyen', 'Müller', 'Rossi', 'Silva', 'Okafor',
+    'Johnson', 'Brown', 'Khan', 'Novak', 'Dubois', 'Hansen', 'Ivanova', 'Sato', 'Cohen', 'Lopez',
+)
+
+# Relative frequencies of lead statuses and priorities
+STATUS_WEIGHTS = {Lead.NEW: 40, Lead.CONTACTED: 25, Lead.CONTACT_IN_PROGRESS: 15, Lead.LOST: 10, Lead.WON: 10}
+PRIORITY_WEIGHTS = {Lead.LOW: 30, Lead.MEDIUM: 50, Lead.HIGH: 20}
+
+
+def skewed_counts(total, buckets, rng, exponent=1.1):
+    """
+    Split ``total`` over ``buckets`` with Zipf-like weights in shuffled order,
+    so a few tenants are large and most are small, as in production.
+    """
+    if not buckets:
+        return []
+    weights = [1 / (rank + 1) ** exponent for rank in range(buckets)]
+    rng.shuffle(weights)
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    # rounding lost fewer than ``buckets`` rows; give them to the largest
+    for i in sorted(range(buckets), key=lambda i: -weights[i])[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class SyntheticData:
+    """
+    Deterministic synthetic tenants for benchmarks.
+
+    The same seed and sizes produce the same users, teams, leads, clients
+    and notes (primary keys aside). Everything is written with
+    ``crm_django.bulk.bulk_create`` in batches of ``batch_size``, one
+    transaction per batch, so the receivers keeping pipeline summaries,
+    search index and team counters up to date run as they do in production.
+    """
+
+    def __init__(self, seed=0, batch_size=5000, log=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+
+    def generate(self, teams, leads, clients, notes, members=3):
+        member_ids = self.create_teams(teams, members)
+        self.create_leads(leads, member_ids)
+        client_teams = self.create_clients(clients, member_ids)
+        self.create_notes(notes, client_teams, member_ids)
+        return {'teams': teams, 'users': sum(map(len, member_ids.values())), 'leads': leads, 'clients': clients, 'notes': notes}
+
+    @classmethod
+    def clear(cls, using=DEFAULT_DB_ALIAS):
+        """
+        Delete every synthetic user, and with them their teams and data.
+        Returns the number of rows deleted.
+
+        Each table is emptied of the synthetic teams' rows with one DELETE,
+        not through the ORM collector, which would load every row (and send
+        its signals) and is unusable at millions of leads. The derived rows
+        (pipeline summaries, search documents, activity) are deleted with
+        their teams, so the other teams' ones stay valid as they are.
+        """
+        users = User.objects.using(using).filter(username__endswith='@' + DOMAIN)
+        teams = Team.objects.using(using).filter(created_by__in=users.values('pk'))
+        by_team = (Activity, Note, Client, Lead, LeadPipelineSummary, Team.members.through)
+        deleted = 0
+        with transaction.atomic(using=using):
+            unindex_teams(teams.values_list('pk', flat=True), using)
+            # _raw_delete() is the collector's own fast path: a single DELETE
+            for model in by_team:
+                deleted += model._base_manager.using(using).filter(team__in=teams.values('pk'))._raw_delete(using)
+            deleted += teams._raw_delete(using)
+            deleted += Token.objects.using(using).filter(user__in=users.values('pk'))._raw_delete(using)
+            deleted += users._raw_delete(using)
+        return deleted
+
+    def insert(self, model, objs):
+        created = []
+        for start in range(0, len(objs), self.batch_size):
+            created += bulk_create(model, objs[start:start + self.batch_size], batch_size=self.batch_size)
+        return created
+
+    def insert_stream(self, model, objs, label):
+        batch, total = [], 0
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                bulk_create(model, batch, batch_size=self.batch_size)
+                total += len(batch)
+                batch = []
+                self.log('%s: %d' % (label, total))
+        if batch or not total:
+            bulk_create(model, batch, batch_size=self.batch_size)
+            self.log('%s: %d' % (label, total + len(batch)))
+
+    def person(self):
+        return '%s %s' % (self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES))
+
+    def company(self):
+        return '%s %s %s' % (self.rng.choice(WORDS), self.rng.choice(WORDS), self.rng.choice(SUFFIXES))
+
+    def contact(self, n):
+        company = self.company()
+        slug = company.split()[0].lower()
+        return {
+            'company': company,
+            'contact_person': self.person(),
+            'email': 'contact%d@%s.example.com' % (n, slug),
+            'phone': '+1-555-%04d' % self.rng.randrange(10000),
+            'website': 'https://%s.example.com' % slug if self.rng.random() < 0.7 else None,
+        }
+
+    def create_teams(self, teams, members):
+        """Owners, extra members (skewed) and teams. Returns team id -> member ids, owner first."""
+        extra = skewed_counts(teams * max(members - 1, 0), teams, self.rng)
+        users = []
+        for team_index in range(teams):
+            for member_index in range(1 + extra[team_index]):
+                first, last = self.person().split(' ', 1)
+                users.append(User(
+                    username='s%d-t%d-m%d@%s' % (self.seed, team_index, member_index, DOMAIN),
+                    first_name=first, last_name=last, password=UNUSABLE_PASSWORD_PREFIX,
+                ))
+        users = self.insert(User, users)
+        self.log('users: %d' % len(users))
+
+        owners, team_members = [], []
+        position = 0
+        for team_index in range(teams):
+            size = 1 + extra[team_index]
+            team_members.append([user.pk for user in users[position:position + size]])
+            owners.append(users[position])
+            position += size
+        created = self.insert(Team, [
+            Team(name='%s %d' % (self.company(), team_index), created_by=owner)
+            for team_index, owner in enumerate(owners)
+        ])
+        self.log('teams: %d' % len(created))
+
+        Membership = Team.members.through
+        self.insert_stream(Membership, (
+            Membership(team_id=team.pk, user_id=user_id)
+            for team, user_ids in zip(created, team_members) for user_id in user_ids
+        ), 'memberships')
+        return {team.pk: user_ids for team, user_ids in zip(created, team_members)}
+
+    def create_leads(self, total, member_ids):
+        statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+        priorities, priority_weights = zip(*PRIORITY_WEIGHTS.items())
+        team_ids = sorted(member_ids)
+
+        def leads():
+            n = 0
+            for team_id, count in zip(team_ids, skewed_counts(total, len(team_ids), self.rng)):
+                users = member_ids[team_id]
+                for _ in range(count):
+                    n += 1
+                    yield Lead(
+                        team_id=team_id, created_by_id=users[0],
+                        assigned_to_id=self.rng.choice(users) if self.rng.random() < 0.7 else None,
+                        status=self.rng.choices(statuses, status_weights)[0],
+                        priority=self.rng.choices(priorities, priority_weights)[0],
+                        confidence=self.rng.randrange(0, 101, 5),
+                        estimated_value=int(self.rng.lognormvariate(8, 1.2)),
+                        **self.contact(n)
+                    )
+        self.insert_stream(Lead, leads(), 'leads')
+
+    def create_clients(self, total, member_ids):
+        """Returns ``[(client id, team id)]``."""
+        team_ids = sorted(member_ids)
+        clients = []
+        n = 0
+        for team_id, count in zip(team_ids, skewed_counts(total, len(team_ids), self.rng)):
+            for _ in range(count):
+                n += 1
+                clients.append(Client(team_id=team_id, created_by_id=self.rng.choice(member_ids[team_id]), **self.contact(n)))
+        clients = self.insert(Client, clients)
+        self.log('clients: %d' % len(clients))
+        return [(client.pk, client.team_id) for client in clients]
+
+    def create_notes(self, total, client_teams, member_ids):
+        def notes():
+            for (client_id, team_id), count in zip(client_teams, skewed_counts(total, len(client_teams), self.rng)):
+                for index in range(count):
+                    yield Note(
+                        team_id=team_id, client_id=client_id, created_by_id=self.rng.choice(member_ids[team_id]),
+                        name='Note %d' % (index + 1),
+                        body=' '.join(self.rng.choice(WORDS).lower() for _ in range(self.rng.randrange(5, 80))),
+                    )
+        self.insert_stream(Note, notes(), 'notes')
@@ -0,0 +1,93 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from client.models import Client, Note
+from crm_django.authentication import token_cache
+from crm_django.bulk import bulk_create
+from lead.models import Lead
+from team.context import invalidate_team_cache
+from team.models import Team
+
+
+class QueryCountTestCase(TestCase):
+    """
+    Base class for query-count regression tests.
+
+    ``assertConstantQueries`` requests an endpoint with 1, 10 and 1,000 rows
+    and fails if the number of queries changes with the row count, which is
+    what an N+1 looks like. Caches are cleared before every request so each
+    one does the full amount of work.
+    """
+    ROW_COUNTS = (1, 10, 1000)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def count_queries(self, url):
+        cache.clear()
+        token_cache.clear()
+        invalidate_team_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, getattr(response, 'content', b''))
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url, add_rows):
+        """``add_rows(n)`` must add n more rows to whatever ``url`` lists."""
+        counts = {}
+        total = 0
+        for rows in self.ROW_COUNTS:
+            add_rows(rows - total)
+            total = rows
+            counts[rows] = self.count_queries(url)
+        self.assertEqual(len(set(counts.values())), 1, 'Query count depends on row count for %s: %s' % (url, counts))
+
+    def make_leads(self, count, **kwargs):
+        start = Lead.objects.count()
+        kwargs.setdefault('assigned_to', self.user)
+        bulk_create(Lead, [
+            Lead(
+                team=self.team, company='Company %d' % i, contact_person='Person %d' % i,
+                email='lead%d@example.com' % i, phone='555', created_by=self.user, **kwargs
+            )
+            for i in range(start, start + count)
+        ])
+
+    def make_clients(self, count):
+        start = Client.objects.count()
+        bulk_create(Client, [
+            Client(
+                team=self.team, company='Company %d' % i, contact_person='Person %d' % i,
+                email='client%d@example.com' % i, phone='555', created_by=self.user,
+            )
+            for i in range(start, start + count)
+        ])
+
+    def make_notes(self, client, count):
+        bulk_create(Note, [
+            Note(team=self.team, client=client, name='Note %d' % i, body='Body', created_by=self.user)
+            for i in range(count)
+        ])
+
+    def make_members(self, count):
+        start = User.objects.count()
+        users = User.objects.bulk_create([
+            User(username='member%d@example.com' % i, first_name='Member', last_name=str(i))
+            for i in range(start, start + count)
+        ])
+        self.team.members.add(*User.objects.filter(username__in=[user.username for user in users]))
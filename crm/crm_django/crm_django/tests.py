@@ -0,0 +1,737 @@
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from base64 import urlsafe_b64encode
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from unittest import skipIf
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from client.models import Client, Note
+from activity.models import Activity
+from lead.models import Lead, LeadPipelineSummary
+from lead.pipeline import verify
+from lead.views import LeadViewSet
+from team.context import invalidate_team_cache, peek_team_id
+from team.models import Team
+from team.quotas import reconcile
+from team.views import get_my_team
+from . import bulk, metrics, slowqueries
+from .asyncviews import async_view
+from .benchmark import SCENARIOS, Benchmark, load_tenants
+from .authentication import CachedTokenAuthentication, token_cache
+from .metrics import enable_query_observers, observe_queries
+from .renderers import ORJSONRenderer, orjson
+from .replicas import ReplicaMiddleware, ReplicaRouter, pin_cache, pin_key, use_primary
+from .synthetic import SyntheticData
+from .views import metrics as metrics_view
+from .cache import get_data_version, response_cache_stats
+
+
+class BulkCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+
+    def leads(self, count):
+        return [
+            Lead(team=self.team, company='C%d' % i, contact_person='P', email='c%d@example.com' % i, phone='5', created_by=self.user)
+            for i in range(count)
+        ]
+
+    def test_primary_keys_are_set(self):
+        Lead.objects.create(team=self.team, company='First', contact_person='P', email='f@example.com', phone='5', created_by=self.user)
+        leads = bulk.bulk_create(Lead, self.leads(150), batch_size=40)
+        self.assertEqual([lead.company for lead in leads], [Lead.objects.get(pk=lead.pk).company for lead in leads])
+        self.assertEqual(leads[-1].created_at, Lead.objects.get(pk=leads[-1].pk).created_at)
+        self.assertFalse(leads[0]._state.adding)
+
+    def test_one_row_at_a_time_fallback(self):
+        leads = self.leads(3)
+        bulk._insert_each(Lead.objects.using('default'), leads)
+        self.assertEqual([lead.company for lead in leads], [Lead.objects.get(pk=lead.pk).company for lead in leads])
+        self.assertFalse(leads[0]._state.adding)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', is_staff=True)
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        for i in range(3):
+            Lead.objects.create(
+                team=cls.team, company='C%d' % i, contact_person='P', email='c%d@example.com' % i,
+                phone='5', created_by=cls.user, status=Lead.WON if i else Lead.NEW,
+            )
+        cls.client_row = Client.objects.create(
+            team=cls.team, company='Client', contact_person='P', email='client@example.com', phone='5', created_by=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        invalidate_team_cache()
+        response_cache_stats.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertRetired(self, write):
+        version = get_data_version(self.team.pk)
+        self.assertEqual(self.get('/api/v1/leads/')['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        self.assertNotEqual(get_data_version(self.team.pk), version)
+        self.assertEqual(self.get('/api/v1/leads/')['X-Cache'], 'MISS')
+
+    def test_hit_then_miss_after_a_write(self):
+        self.assertEqual(self.get('/api/v1/leads/')['X-Cache'], 'MISS')
+        response = self.get('/api/v1/leads/')
+        self.assertEqual((response['X-Cache'], response.data['count']), ('HIT', 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/v1/leads/', {'company': 'New', 'contact_person': 'P', 'email': 'n@example.com', 'phone': '5'})
+        response = self.get('/api/v1/leads/')
+        self.assertEqual((response['X-Cache'], response.data['count']), ('MISS', 4))
+
+    def test_lead_client_and_note_writes_bump_the_version(self):
+        self.get('/api/v1/leads/')
+        lead = Lead.objects.filter(team=self.team).first()
+        self.assertRetired(lead.save)
+        self.assertRetired(lambda: bulk.bulk_update(Lead, [lead.pk], {'status': Lead.LOST}))
+        self.assertRetired(lambda: Client.objects.create(
+            team=self.team, company='Other', contact_person='P', email='o@example.com', phone='5', created_by=self.user,
+        ))
+        self.assertRetired(lambda: Note.objects.create(team=self.team, client=self.client_row, name='N', created_by=self.user))
+        self.assertRetired(self.user.save)
+
+    def test_other_teams_are_not_retired(self):
+        other = Team.objects.create(name='Other', created_by=self.user)
+        self.get('/api/v1/leads/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Lead.objects.create(team=other, company='X', contact_person='P', email='x@example.com', phone='5', created_by=self.user)
+        self.assertEqual(self.get('/api/v1/leads/')['X-Cache'], 'HIT')
+
+    def test_query_parameters_are_normalized(self):
+        self.assertEqual(self.get('/api/v1/leads/?status=won&ordering=company')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('/api/v1/leads/?ordering=company&status=won')['X-Cache'], 'HIT')
+        # a different value, or a repeated one, is a different page
+        self.assertEqual(self.get('/api/v1/leads/?ordering=-company&status=won')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('/api/v1/leads/?ordering=company&status=won&status=new')['X-Cache'], 'MISS')
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+            with override_settings(CACHES={'default': backend}):
+                self.assertEqual(self.get('/api/v1/leads/')['X-Cache'], 'MISS')
+                response = self.get('/api/v1/leads/')
+                self.assertEqual((response['X-Cache'], response.data['count']), ('HIT', 3))
+                self.assertRetired(lambda: Lead.objects.filter(team=self.team).first().save())
+
+    def test_stats(self):
+        self.get('/api/v1/leads/')
+        self.get('/api/v1/leads/')
+        self.get('/api/v1/clients/')
+        stats = self.get('/api/v1/cache/stats/').data
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3)
+        self.assertEqual(stats['views']['leads'], {'hits': 1, 'misses': 1})
+        self.assertEqual(stats['views']['clients'], {'hits': 0, 'misses': 1})
+
+        self.assertEqual(self.client.delete('/api/v1/cache/stats/').data['hits'], 0)
+        self.assertEqual(self.get('/api/v1/cache/stats/').data['views'], {})
+
+        self.client.force_authenticate(User.objects.create_user('member@example.com'))
+        self.assertEqual(self.client.get('/api/v1/cache/stats/').status_code, 403)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        other = Team.objects.create(name='Other', created_by=cls.user)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for team in (cls.team, other):
+            for i in range(13):
+                lead = Lead.objects.create(
+                    team=team, company='L%d' % i, contact_person='P', email='l%d@example.com' % i, phone='5', created_by=cls.user,
+                )
+                client = Client.objects.create(
+                    team=team, company='C%d' % i, contact_person='P', email='c%d@example.com' % i, phone='5', created_by=cls.user,
+                )
+                # runs of four equal timestamps, so pages of three end inside a tie
+                moment = start + timedelta(minutes=i // 4)
+                Lead.objects.filter(pk=lead.pk).update(modified_at=moment, created_at=moment)
+                Client.objects.filter(pk=client.pk).update(modified_at=moment)
+
+    def setUp(self):
+        cache.clear()
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def expected(self, model, ordering=('-modified_at', '-id')):
+        return list(model.objects.filter(team=self.team).order_by(*ordering).values_list('id', flat=True))
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def walk(self, url):
+        pages = [self.get(url)]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        return pages
+
+    def ids(self, page):
+        return [row['id'] for row in page['results']]
+
+    def test_walk_has_no_duplicates_or_gaps(self):
+        for url, model in (('/api/v1/leads/', Lead), ('/api/v1/clients/', Client)):
+            pages = self.walk(url + '?cursor=&page_size=3')
+            self.assertEqual([len(page['results']) for page in pages], [3, 3, 3, 3, 1])
+            self.assertEqual(sum(map(self.ids, pages), []), self.expected(model))
+
+    def test_walk_in_a_requested_order(self):
+        pages = self.walk('/api/v1/leads/?cursor=&page_size=3&ordering=created_at')
+        self.assertEqual(sum(map(self.ids, pages), []), self.expected(Lead, ('created_at', 'id')))
+
+    def test_walk_when_every_row_ties(self):
+        Lead.objects.update(modified_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        Client.objects.update(modified_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        for url, model in (('/api/v1/leads/', Lead), ('/api/v1/clients/', Client)):
+            pages = self.walk(url + '?cursor=&page_size=3')
+            self.assertEqual(sum(map(self.ids, pages), []), self.expected(model))
+
+    def test_rows_written_during_a_walk(self):
+        expected = self.expected(Lead)
+        first = self.get('/api/v1/leads/?cursor=&page_size=3')
+        # a lead saved after the first page moves ahead of the cursor; the
+        # rest of the walk neither repeats a row nor skips one
+        Lead.objects.get(pk=expected[7]).save()
+        pages = self.walk(first['next'])
+        self.assertEqual(self.ids(first) + sum(map(self.ids, pages), []), [pk for pk in expected if pk != expected[7]])
+
+    def test_previous_links_return_the_earlier_pages(self):
+        for url in ('/api/v1/leads/', '/api/v1/clients/'):
+            pages = self.walk(url + '?cursor=&page_size=3')
+            self.assertIsNone(pages[0]['previous'])
+            self.assertIsNone(pages[-1]['next'])
+            page = pages[-1]
+            for earlier in reversed(pages[:-1]):
+                page = self.get(page['previous'])
+                self.assertEqual(self.ids(page), self.ids(earlier))
+            self.assertIsNone(page['previous'])
+            # and forwards again from a page reached backwards
+            self.assertEqual(self.ids(self.get(page['next'])), self.ids(pages[1]))
+
+    def test_invalid_cursor_is_not_found(self):
+        def encode(position):
+            return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+        cursors = [
+            'garbage', '!!!', encode([1, 2]), urlsafe_b64encode(b'not json').decode(),
+            encode({'v': 'yesterday', 'id': 1}), encode({'v': '2024-01-01T00:00:00+00:00', 'id': 'x'}),
+            encode({'v': '2024-01-01T00:00:00+00:00'}),
+        ]
+        for url in ('/api/v1/leads/', '/api/v1/clients/'):
+            for cursor in cursors:
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404, cursor)
+                self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+
+@override_settings(TOKEN_CACHE_ALIAS='default')
+class TokenCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret', first_name='Ann')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        invalidate_team_cache()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def assertAuthenticated(self, status_code=200):
+        self.assertEqual(self.client.get('/api/v1/leads/').status_code, status_code)
+
+    def test_warm_cache_authenticates_without_queries(self):
+        self.assertAuthenticated()
+        with self.assertNumQueries(0):
+            user, token = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual((user.pk, user.first_name, user.is_active), (self.user.pk, 'Ann', True))
+        self.assertEqual((token.key, token.user), (self.token.key, user))
+
+        # another process: only the shared cache is warm
+        token_cache.clear()
+        with self.assertNumQueries(0):
+            CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def test_cache_holds_no_password_or_shared_instances(self):
+        self.assertAuthenticated()
+        entry = cache.get(token_cache.shared_key(self.token.key))
+        self.assertNotIn(self.user.password, repr(entry))
+        self.assertNotIn(self.token.key, repr(entry))
+
+        first, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        second, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertIsNot(first, second)
+        # uncached fields are loaded on demand, and saving writes only loaded ones
+        self.assertTrue(first.check_password('secret'))
+        second.first_name = 'Anne'
+        second.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Anne')
+        self.assertTrue(self.user.check_password('secret'))
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_cached_token_is_not_a_write(self):
+        self.assertAuthenticated()
+        request = RequestFactory().get('/api/v1/leads/', HTTP_AUTHORIZATION='Token ' + self.token.key)
+        ReplicaMiddleware(lambda request: CachedTokenAuthentication().authenticate(request))(request)
+        # a write would keep the caller on the primary for the lag tolerance
+        self.assertIsNone(pin_cache().get(pin_key(request)))
+
+    def test_logout(self):
+        self.assertAuthenticated()
+        self.assertEqual(self.client.post('/api/v1/token/logout/').status_code, 204)
+        self.assertAuthenticated(401)
+
+    def test_token_delete(self):
+        self.assertAuthenticated()
+        Token.objects.filter(pk=self.token.pk).first().delete()
+        self.assertAuthenticated(401)
+
+    def test_deactivated_user(self):
+        self.assertAuthenticated()
+        self.user.is_active = False
+        self.user.save()
+        self.assertAuthenticated(401)
+
+
+@skipIf(orjson is None, 'orjson is not installed')
+class ORJSONRendererTests(SimpleTestCase):
+    def assertSameBytes(self, data):
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_same_bytes_as_json_renderer(self):
+        self.assertSameBytes({
+            'created_at': datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc),
+            'naive': datetime(2024, 1, 2, 3, 4, 5),
+            'date': date(2024, 1, 2),
+            'time': time(3, 4, 5, 678901),
+            'decimal': Decimal('12.50'),
+            'text': 'caf\u00e9 \u2028',
+            'numbers': [0, -1, 2 ** 63 - 1, 0.1, 123.456],
+            1: None,
+        })
+
+    def test_floats_parse_to_the_same_values(self):
+        data = {'large': 1e16, 'small': 1e-5}
+        rendered = ORJSONRenderer().render(data)
+        self.assertEqual(json.loads(rendered), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(rendered, b'{"large":1e16,"small":0.00001}')
+
+    def test_falls_back_for_integers_beyond_64_bits(self):
+        self.assertSameBytes({'big': 2 ** 64})
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        invalidate_team_cache()
+
+    def test_registry(self):
+        registry = metrics.Registry()
+        registry.record('leads-list', 'GET', 200, 0.02, 3, 0.004)
+        registry.record('leads-list', 'GET', 500, 20.0, 300, 1.5)
+        (view, method, stats), = registry.snapshot()['endpoints']
+        self.assertEqual((view, method, stats['count'], stats['queries_sum']), ('leads-list', 'GET', 2, 303))
+        # one observation in the 0.025 bucket and one past the last bound
+        self.assertEqual(stats['duration_buckets'][metrics.LATENCY_BUCKETS.index(0.025)], 1)
+        self.assertEqual(stats['duration_buckets'][-1], 1)
+        self.assertEqual(sorted(registry.snapshot()['statuses']), [['leads-list', 'GET', '200', 1], ['leads-list', 'GET', '500', 1]])
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_middleware_records_each_request(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.get('/api/v1/leads/')
+        client.get('/api/v1/leads/')
+        client.get('/no-such-page/')
+        endpoints, statuses = metrics.collect()
+        self.assertEqual(endpoints['leads-list', 'GET']['count'], 2)
+        self.assertGreater(endpoints['leads-list', 'GET']['queries_sum'], 0)
+        self.assertEqual(statuses['leads-list', 'GET', '200'], 2)
+        self.assertEqual(statuses[metrics.UNRESOLVED, 'GET', '404'], 1)
+
+        text = metrics.render()
+        self.assertIn('crm_http_request_duration_seconds_count{view="leads-list",method="GET"} 2', text)
+        self.assertIn('crm_http_request_duration_seconds_bucket{view="leads-list",method="GET",le="+Inf"} 2', text)
+        self.assertIn('crm_http_responses_total{view="<unresolved>",method="GET",status="404"} 1', text)
+
+    def test_token_gate(self):
+        factory = RequestFactory()
+        self.assertEqual(metrics_view(factory.get('/metrics')).status_code, 200)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(metrics_view(factory.get('/metrics')).status_code, 403)
+            self.assertEqual(metrics_view(factory.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong')).status_code, 403)
+            response = metrics_view(factory.get('/metrics', HTTP_AUTHORIZATION='Bearer secret'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_exited_processes_are_folded(self):
+        registry = metrics.Registry()
+        registry.record('leads-list', 'GET', 200, 0.02, 3, 0.004)
+        snapshot = registry.snapshot()
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            for pid in (exited_pid(), exited_pid()):
+                with open(os.path.join(directory, 'metrics-%d.json' % pid), 'w') as f:
+                    json.dump(snapshot, f)
+            metrics.registry.record('leads-list', 'GET', 200, 0.02, 3, 0.004)
+
+            for _ in range(2):
+                endpoints, statuses = metrics.collect()
+                self.assertEqual(endpoints['leads-list', 'GET']['count'], 3)
+                self.assertEqual(statuses['leads-list', 'GET', '200'], 3)
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if not name.startswith('.')),
+                ['metrics-%d.json' % os.getpid(), 'metrics-dead.json'],
+            )
+
+
+class SlowQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.admin = User.objects.create_user('admin@example.com', is_staff=True)
+
+    def setUp(self):
+        slowqueries.slow_query_stats.reset()
+        self.addCleanup(slowqueries.slow_query_stats.reset)
+        invalidate_team_cache()
+
+    def test_fingerprint(self):
+        cases = [
+            ("SELECT * FROM lead_lead WHERE id = 12 AND email = 'a''b@x.com'",
+             'SELECT * FROM lead_lead WHERE id = ? AND email = ?'),
+            ('SELECT  *\n FROM "lead_lead" WHERE "id" IN (1, 2, 3)',
+             'SELECT * FROM "lead_lead" WHERE "id" IN (...)'),
+            ('SELECT * FROM lead_lead WHERE id IN (%s, %s) AND confidence >= -2.5',
+             'SELECT * FROM lead_lead WHERE id IN (...) AND confidence >= ?'),
+            ('INSERT INTO t ("a", "b") VALUES (%s, %s), (%s, %s), (%s, %s)',
+             'INSERT INTO t ("a", "b") VALUES (...), ...'),
+            ('SELECT "t1"."col2" FROM "t1"', 'SELECT "t1"."col2" FROM "t1"'),
+        ]
+        for sql, expected in cases:
+            with self.subTest(sql=sql):
+                self.assertEqual(slowqueries.fingerprint(sql), expected)
+
+    def test_top_fingerprints_by_total_time(self):
+        stats = slowqueries.slow_query_stats
+        with override_settings(SLOW_QUERY_TOP_N=2):
+            for fingerprint, durations in (('a', [100, 100, 100]), ('b', [250]), ('c', [50, 400]), ('d', [10])):
+                for duration in durations:
+                    stats.record(fingerprint, duration, 'GET leads-list', 1, fingerprint + ' sql')
+            top = slowqueries.collect()
+        self.assertEqual([(entry['fingerprint'], entry['count'], entry['total_ms']) for entry in top], [('c', 2, 450), ('a', 3, 300)])
+        self.assertEqual(top[0]['max_ms'], 400)
+
+    def test_table_is_pruned_to_the_top(self):
+        stats = slowqueries.slow_query_stats
+        with override_settings(SLOW_QUERY_TOP_N=2):
+            for i in range(20):
+                stats.record('q%d' % i, i, 'GET leads-list', 1, 'sql')
+        self.assertLessEqual(len(stats.entries), 4 * 2 + 1)
+        self.assertEqual(stats.top()[0]['fingerprint'], 'q19')
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=0)
+    def test_middleware_reports_endpoint_and_team(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/v1/leads/').status_code, 200)
+        entries = slowqueries.collect(size=100)
+        lead_query = [entry for entry in entries if 'FROM "lead_lead"' in entry['fingerprint']][0]
+        self.assertEqual((lead_query['endpoint'], lead_query['team_id']), ('GET leads-list', self.team.pk))
+
+    def test_endpoint_is_admin_only(self):
+        slowqueries.slow_query_stats.record('SELECT ?', 300.0, 'GET leads-list', self.team.pk, 'SELECT 1')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/v1/slow-queries/').status_code, 403)
+
+        client.force_authenticate(self.admin)
+        response = client.get('/api/v1/slow-queries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['fingerprint'] for entry in response.data], ['SELECT ?'])
+        self.assertEqual(client.delete('/api/v1/slow-queries/').data, [])
+
+
+class SyntheticDataTests(TestCase):
+    def generate(self, seed):
+        SyntheticData(seed=seed, batch_size=50).generate(teams=5, leads=120, clients=30, notes=90)
+        return list(Lead.objects.order_by('pk').values_list('company', 'status', 'estimated_value'))
+
+    def search_documents(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT team_id, COUNT(*) FROM search_document GROUP BY team_id')
+            return dict(cursor.fetchall())
+
+    def test_deterministic_and_skewed(self):
+        first = self.generate(seed=1)
+        SyntheticData.clear()
+        self.assertFalse(Lead.objects.exists())
+        self.assertEqual(self.generate(seed=1), first)
+
+        sizes = sorted(Team.objects.values_list('lead_count', flat=True))
+        self.assertEqual(sum(sizes), 120)
+        self.assertGreater(sizes[-1], 3 * sizes[0])
+
+    def test_clear_leaves_other_teams_intact(self):
+        user = User.objects.create_user('owner@example.com')
+        team = Team.objects.create(name='Real', created_by=user)
+        team.members.add(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            lead = Lead.objects.create(
+                team=team, company='Real Co', contact_person='P', email='r@example.com', phone='5', created_by=user,
+            )
+        self.generate(seed=3)
+        self.assertGreater(len(self.search_documents()), 1)
+
+        # one statement per table, however many rows
+        with self.assertNumQueries(13):
+            deleted = SyntheticData.clear()
+        self.assertGreater(deleted, 120 + 30 + 90)
+
+        self.assertEqual(list(User.objects.all()), [user])
+        self.assertEqual(list(Team.objects.all()), [team])
+        self.assertEqual(list(Lead.objects.all()), [lead])
+        self.assertFalse(Client.objects.exists() or Note.objects.exists())
+        self.assertEqual(set(Activity.objects.values_list('team_id', flat=True)), {team.pk})
+        self.assertEqual(set(LeadPipelineSummary.objects.values_list('team_id', flat=True)), {team.pk})
+        self.assertEqual(self.search_documents(), {team.pk: 1})
+        self.assertEqual(verify(Lead, LeadPipelineSummary), {})
+        self.assertEqual(reconcile(dry_run=True), [])
+
+    def test_command(self):
+        call_command('generate_synthetic_data', teams=2, leads=10, clients=4, notes=6, stdout=io.StringIO())
+        self.assertEqual(Lead.objects.count(), 10)
+        call_command('generate_synthetic_data', teams=2, leads=5, clients=0, notes=0, clear=True, stdout=io.StringIO())
+        self.assertEqual((Team.objects.count(), Lead.objects.count()), (2, 5))
+
+    def test_benchmark_reports_every_scenario(self):
+        self.generate(seed=2)
+        tenants = load_tenants(3, random.Random(0))
+        results = Benchmark(tenants, concurrency=1, requests=4, warmup=1).run(SCENARIOS)
+        self.assertEqual(set(results), set(SCENARIOS))
+        for name, result in results.items():
+            self.assertEqual((result['requests'], result['errors']), (4, 0), name)
+            self.assertGreater(result['queries_mean'], 0, name)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_LAG_TOLERANCE=5)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+
+    def route(self, method, token='abc', write=False):
+        """Where Lead reads go in a request: (before writing, after writing if ``write``)."""
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Lead))
+            with use_primary():
+                reads.append(self.router.db_for_read(Lead))
+            if write:
+                self.assertEqual(self.router.db_for_write(Lead), 'default')
+                reads.append(self.router.db_for_read(Lead))
+            return None
+
+        request = RequestFactory().generic(method, '/api/v1/leads/', HTTP_AUTHORIZATION='Token ' + token)
+        ReplicaMiddleware(view)(request)
+        return reads
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.route('GET'), ['replica1', 'default'])
+        self.assertEqual(self.route('POST'), ['default', 'default'])
+        self.assertEqual(self.router.db_for_read(Lead), 'default')
+
+    def test_reads_own_writes(self):
+        self.assertEqual(self.route('GET', write=True), ['replica1', 'default', 'default'])
+        # the same caller stays on the primary for the lag tolerance, others do not
+        self.assertEqual(self.route('GET'), ['default', 'default'])
+        self.assertEqual(self.route('GET', token='other'), ['replica1', 'default'])
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica1', 'lead'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'lead'))
+
+
+# cached list pages are built from the primary, see CachedListMixin
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_LAG_TOLERANCE=5, RESPONSE_CACHE_TIMEOUT=0)
+class ReplicaReadTests(TransactionTestCase):
+    """
+    Requests against a real second SQLite database. Not a TestCase: inside
+    its transaction every read would go to the primary. The replica is added
+    once the test databases exist and is a copy of the primary, so it is not
+    in ``databases`` (which would have the runner create and flush it).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica1'] = dict(
+            connections['default'].settings_dict, NAME=os.path.join(cls.directory.name, 'replica.sqlite3'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.settings['replica1']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        invalidate_team_cache()
+        self.owner = User.objects.create_user('owner@example.com')
+        self.member = User.objects.create_user('member@example.com')
+        self.team = Team.objects.create(name='Team', created_by=self.owner)
+        self.team.members.add(self.owner, self.member)
+        self.owner_token = Token.objects.create(user=self.owner)
+        self.member_token = Token.objects.create(user=self.member)
+        self.lead = Lead.objects.create(
+            team=self.team, company='Acme', contact_person='P', email='a@example.com', phone='5',
+            created_by=self.owner,
+        )
+        self.replicate()
+        # a write the replica has not caught up with
+        Lead.objects.filter(pk=self.lead.pk).update(company='Acme Inc')
+
+    def replicate(self):
+        for alias in ('default', 'replica1'):
+            connections[alias].ensure_connection()
+        connections['default'].connection.backup(connections['replica1'].connection)
+
+    def client_for(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        return client
+
+    def companies(self, client):
+        response = client.get('/api/v1/leads/')
+        self.assertEqual(response.status_code, 200)
+        return sorted(lead['company'] for lead in response.data['results'])
+
+    def test_get_reads_the_replica(self):
+        owner = self.client_for(self.owner_token)
+        self.assertEqual(self.companies(owner), ['Acme'])
+        # again, now authenticated from the token cache
+        self.assertEqual(owner.get('/api/v1/leads/%d/' % self.lead.pk).data['company'], 'Acme')
+
+    def test_get_after_a_post_reads_the_primary(self):
+        owner = self.client_for(self.owner_token)
+        self.assertEqual(self.companies(owner), ['Acme'])
+        response = owner.post('/api/v1/leads/', {'company': 'New', 'contact_person': 'P', 'email': 'n@example.com', 'phone': '5'})
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.companies(owner), ['Acme Inc', 'New'])
+        self.assertEqual(owner.get('/api/v1/leads/%d/' % self.lead.pk).data['company'], 'Acme Inc')
+        # other callers still read the replica
+        self.assertEqual(self.companies(self.client_for(self.member_token)), ['Acme'])
+
+
+class AsyncViewTests(TransactionTestCase):
+    # the views run their queries on other threads, which must see the rows
+    def setUp(self):
+        invalidate_team_cache()
+        token_cache.clear()
+        self.user = User.objects.create_user('owner', password='x')
+        self.team = Team.objects.create(name='Acme', created_by=self.user)
+        self.team.members.add(self.user)
+        for n in range(3):
+            Lead.objects.create(team=self.team, created_by=self.user, company='Company %d' % n, contact_person='Ann')
+        self.token = Token.objects.create(user=self.user).key
+
+    def call(self, view, path, token=None):
+        headers = {'Authorization': 'Token ' + token} if token else {}
+        return async_to_sync(view)(AsyncRequestFactory().get(path, **headers))
+
+    def test_same_response_as_sync_view(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for view, path in ((LeadViewSet.as_view({'get': 'list'}), '/api/v1/leads/'), (get_my_team, '/api/v1/team/get-my-team/')):
+            expected = client.get(path)
+            response = self.call(async_view(view), path, self.token)
+            self.assertEqual(response.status_code, expected.status_code, path)
+            self.assertEqual(response.content, expected.content, path)
+            self.assertEqual(response['Content-Type'], expected['Content-Type'], path)
+
+    def test_resolves_token_and_team_once(self):
+        view = async_view(LeadViewSet.as_view({'get': 'list'}))
+        self.call(view, '/api/v1/leads/', self.token)
+        self.assertIsNotNone(token_cache.get_local(self.token))
+        self.assertEqual(peek_team_id(self.user), (True, self.team.pk))
+
+        # both cached now: only the list queries run, observed on the pool thread
+        enable_query_observers()
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with observe_queries(record):
+            self.assertEqual(self.call(view, '/api/v1/leads/', self.token).status_code, 200)
+        self.assertTrue(statements)
+        self.assertFalse([sql for sql in statements if 'authtoken_token' in sql or 'team_team_members' in sql])
+
+    def test_rejects_unauthenticated(self):
+        view = async_view(LeadViewSet.as_view({'get': 'list'}))
+        self.assertEqual(self.call(view, '/api/v1/leads/').status_code, 401)
+        self.assertEqual(self.call(view, '/api/v1/leads/', 'not-a-token').status_code, 401)
@@ -0,0 +1,20 @@
+class TrackLoadedValuesMixin:
+    """
+    Model mixin that remembers the column values a row was loaded (or last
+    saved) with, so signal receivers can see what a save() changed without
+    re-reading the row.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_loaded_values(self):
+        """Column values as of load/last save, keyed by attname; {} for new instances."""
+        return getattr(self, '_loaded_values', {})
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
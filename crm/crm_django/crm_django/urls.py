@@ -13,9 +13,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path , include
 
+from .views import cache_stats, metrics, slow_queries
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('djoser.urls')),
@@ -23,4 +26,11 @@ urlpatterns = [
     path('api/v1/', include('lead.urls')),
     path('api/v1/', include('team.urls')),
     path('api/v1/', include('client.urls')),
+    path('api/v1/', include('search.urls')),
+    path('api/v1/', include('activity.urls')),
+    path('api/v1/cache/stats/', cache_stats, name='cache-stats'),
+    path('api/v1/slow-queries/', slow_queries, name='slow-queries'),
 ]
+
+if settings.METRICS_ENABLED:
+    urlpatterns.append(path('metrics', metrics, name='metrics'))
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Fields whose to_representation() returns database values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+def generic_converter(field):
+    return lambda value, tz: field.to_representation(value)
+
+
+def datetime_converter(field):
+    """
+    DRF's ISO 8601 ``DateTimeField`` output, with the current timezone
+    resolved once per call to ``to_representation`` instead of per value.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601 or hasattr(field, 'timezone'):
+        return generic_converter(field)
+
+    def convert(value, tz):
+        if tz is None or value.utcoffset() is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path for a ``ModelSerializer``: builds the same
+    representation straight from ``queryset.values()`` rows.
+
+    The serializer's fields are compiled once into ``(key, values() lookup,
+    converter)`` steps; serializing a row is then a loop over plain dicts,
+    with no model instances and no per-field DRF dispatch. Nested (non-many)
+    model serializers become joined lookups. Fields that cannot be computed
+    from column values (method fields, many=True relations) are rejected at
+    compile time, so a serializer change cannot silently diverge.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.lookups = []
+        self.plan = self.compile(serializer_class(), prefix='')
+
+    def compile(self, serializer, prefix):
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, (serializers.SerializerMethodField, serializers.ListSerializer, serializers.ManyRelatedField)):
+                raise ImproperlyConfigured('%s.%s cannot be read from values()' % (type(serializer).__name__, name))
+            lookup = prefix + field.source.replace('.', '__')
+            self.add_lookup(lookup)
+            if isinstance(field, serializers.ModelSerializer):
+                # the foreign key column doubles as the "no related object" check
+                plan.append((name, lookup, None, self.compile(field, lookup + '__')))
+            elif isinstance(field, serializers.DateTimeField):
+                plan.append((name, lookup, datetime_converter(field), None))
+            elif isinstance(field, PASSTHROUGH_FIELDS):
+                plan.append((name, lookup, None, None))
+            else:
+                plan.append((name, lookup, generic_converter(field), None))
+        return plan
+
+    def add_lookup(self, lookup):
+        if lookup not in self.lookups:
+            self.lookups.append(lookup)
+
+    def values(self, queryset):
+        """``queryset.values()`` with exactly the columns the representation needs."""
+        return queryset.values(*self.lookups)
+
+    def to_representation(self, rows):
+        build = self.build_row
+        plan = self.plan
+        current_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        return [build(plan, row, current_timezone) for row in rows]
+
+    def build_row(self, plan, row, current_timezone):
+        data = {}
+        for name, lookup, convert, nested in plan:
+            value = row[lookup]
+            if value is None:
+                data[name] = None
+            elif nested is not None:
+                data[name] = self.build_row(nested, row, current_timezone)
+            elif convert is None:
+                data[name] = value
+            else:
+                data[name] = convert(value, current_timezone)
+        return data
+
+
+class ValuesListMixin:
+    """
+    Serve ``list`` through a ``ValuesSerializer`` built from
+    ``values_serializer_class`` (the viewset's serializer by default).
+
+    Filtering and pagination are unchanged; only the rows fetched for the
+    page are ``.values()`` dicts instead of model instances.
+    """
+    values_serializer_class = None
+    _values_serializers = {}
+
+    def get_values_serializer(self):
+        serializer_class = self.values_serializer_class or self.get_serializer_class()
+        serializer = self._values_serializers.get(serializer_class)
+        if serializer is None:
+            serializer = self._values_serializers[serializer_class] = ValuesSerializer(serializer_class)
+        return serializer
+
+    def list(self, request, *args, **kwargs):
+        values_serializer = self.get_values_serializer()
+        queryset = values_serializer.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.to_representation(page))
+        return Response(values_serializer.to_representation(queryset))
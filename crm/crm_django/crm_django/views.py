@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import metrics as request_metrics
+from . import slowqueries
+from .cache import response_cache_stats
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Response cache hit/miss counters of this process; DELETE resets them."""
+    if request.method == 'DELETE':
+        response_cache_stats.reset()
+    return Response(response_cache_stats.snapshot())
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def slow_queries(request):
+    """
+    The worst slow-query fingerprints by total time (see
+    crm_django.slowqueries); DELETE resets them.
+    """
+    if request.method == 'DELETE':
+        slowqueries.slow_query_stats.reset()
+        slowqueries.clear_shared()
+    return Response(slowqueries.collect())
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, routed only when METRICS_ENABLED is set.
+
+    If METRICS_TOKEN is set the scraper must send it as a bearer token.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+        return HttpResponseForbidden()
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
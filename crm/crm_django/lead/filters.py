@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Lead
+
+
+class LeadFilterBackend(BaseFilterBackend):
+    """
+    Server-side filters for the lead list.
+
+    Supported query parameters (each backed by a ``team_id``-leading index):
+
+        status, priority        exact value, or a comma separated list
+        assigned_to             user id, or ``none`` for unassigned leads
+        confidence, estimated_value
+                                exact value, plus ``__gte`` / ``__lte`` ranges
+        created_at, modified_at ``__gte`` / ``__lte`` ranges (ISO 8601)
+    """
+    choice_params = {
+        'status': dict(Lead.CHOICES_STATUS),
+        'priority': dict(Lead.CHOICES_PRIORITY),
+    }
+    range_params = {
+        'confidence': ('exact', 'gte', 'lte'),
+        'estimated_value': ('exact', 'gte', 'lte'),
+        'created_at': ('gte', 'lte'),
+        'modified_at': ('gte', 'lte'),
+    }
+
+    def get_filters(self, params):
+        """Translate query parameters (or any mapping of them) into ORM lookups."""
+        filters = {}
+
+        for name, choices in self.choice_params.items():
+            value = params.get(name)
+            if not value:
+                continue
+            values = value.split(',')
+            invalid = [v for v in values if v not in choices]
+            if invalid:
+                raise ValidationError({name: 'Invalid choice: %s' % ', '.join(invalid)})
+            if len(values) == 1:
+                filters[name] = values[0]
+            else:
+                filters[name + '__in'] = values
+
+        assigned_to = params.get('assigned_to')
+        if assigned_to:
+            if assigned_to.lower() in ('none', 'null'):
+                filters['assigned_to__isnull'] = True
+            else:
+                filters['assigned_to_id'] = self.clean('assigned_to', 'assigned_to', assigned_to)
+
+        for name, lookups in self.range_params.items():
+            for lookup in lookups:
+                param = name if lookup == 'exact' else '%s__%s' % (name, lookup)
+                value = params.get(param)
+                if value:
+                    filters[param] = self.clean(param, name, value)
+
+        return filters
+
+    def clean(self, param, field_name, value):
+        field = Lead._meta.get_field(field_name)
+        try:
+            if field.is_relation:
+                value = field.target_field.to_python(value)
+            else:
+                value = field.to_python(value)
+        except DjangoValidationError as e:
+            raise ValidationError({param: e.messages})
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    def filter_queryset(self, request, queryset, view):
+        filters = self.get_filters(request.query_params)
+        if filters:
+            queryset = queryset.filter(**filters)
+        return queryset
@@ -0,0 +1,167 @@
+import codecs
+import csv
+import json
+
+from rest_framework.exceptions import ValidationError
+
+from crm_django.bulk import bulk_create
+from team.quotas import QuotaExceeded, get_limit, reserve
+from .models import Lead
+from .serializers import LeadSerializer
+
+
+def iter_lines(stream, chunk_size=64 * 1024):
+    """
+    Decode a binary stream (request body or uploaded file) line by line.
+
+    Reads fixed-size chunks rather than calling ``readline()``: Django's
+    request stream buffers the whole remaining body on ``readline()``.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    for row in reader:
+        # DictReader puts surplus cells under the None key
+        row.pop(None, None)
+        yield reader.line_num, {key: value for key, value in row.items() if value != ''}
+
+
+def read_ndjson(lines):
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValidationError({'non_field_errors': ['Invalid JSON: %s' % e]})
+            continue
+        if not isinstance(row, dict):
+            row = ValidationError({'non_field_errors': ['Expected a JSON object.']})
+        yield line_number, row
+
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+}
+
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonlines': 'ndjson',
+}
+
+
+class LeadImporter:
+    """
+    Validate and insert a stream of lead rows for one team.
+
+    Rows are validated with ``LeadSerializer`` and written with
+    ``bulk_create`` in chunks of ``chunk_size``, one transaction per chunk.
+    Only the current chunk and the error report are held in memory, and the
+    report is capped at ``max_errors`` entries. Each chunk reserves its rows
+    against the plan's lead limit (team.quotas).
+
+    A row whose email is already used by one of the team's leads, including
+    the rows imported before it, is reported and skipped, so uploading the
+    same list twice does not duplicate it.
+    """
+    chunk_size = 1000
+    max_errors = 1000
+
+    def __init__(self, team, user):
+        self.team = team
+        self.user = user
+        self.serializer = LeadSerializer()
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.remaining = self.get_remaining_quota()
+
+    def get_remaining_quota(self):
+        limit = get_limit(self.team, Lead)
+        if limit is None:
+            return None
+        return max(limit - self.team.lead_count, 0)
+
+    def add_error(self, line_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': line_number, 'errors': errors})
+
+    def run(self, rows):
+        chunk = []
+        for line_number, row in rows:
+            if isinstance(row, ValidationError):
+                self.add_error(line_number, row.detail)
+                continue
+            try:
+                data = self.serializer.run_validation(row)
+            except ValidationError as e:
+                self.add_error(line_number, e.detail)
+                continue
+            chunk.append((line_number, Lead(team=self.team, created_by=self.user, **data)))
+            if len(chunk) >= self.chunk_size:
+                self.flush(chunk)
+                chunk = []
+        self.flush(chunk)
+        return self.report()
+
+    def flush(self, chunk):
+        chunk = self.drop_duplicates(chunk)
+        if self.remaining is not None:
+            chunk, over = chunk[:self.remaining], chunk[self.remaining:]
+            self.remaining -= len(chunk)
+            self.reject(over)
+        if not chunk:
+            return
+        try:
+            with reserve(self.team, Lead, len(chunk)):
+                bulk_create(Lead, [lead for _, lead in chunk], batch_size=self.chunk_size)
+        except QuotaExceeded:
+            # leads created elsewhere since the import started
+            self.reject(chunk)
+            return
+        self.created += len(chunk)
+
+    def reject(self, chunk):
+        for line_number, _ in chunk:
+            self.add_error(line_number, {'non_field_errors': ['Plan lead limit reached.']})
+
+    def drop_duplicates(self, chunk):
+        if not chunk:
+            return chunk
+        emails = {lead.email for _, lead in chunk}
+        seen = set(Lead.objects.filter(team=self.team, email__in=emails).values_list('email', flat=True))
+        unique = []
+        for line_number, lead in chunk:
+            if lead.email in seen:
+                self.add_error(line_number, {'email': ['A lead with this email already exists.']})
+                continue
+            seen.add(lead.email)
+            unique.append((line_number, lead))
+        return unique
+
+    def report(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
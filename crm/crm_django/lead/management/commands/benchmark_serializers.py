@@ -0,0 +1,78 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from crm_django.renderers import ORJSONRenderer, orjson
+from crm_django.values import ValuesSerializer
+from lead.models import Lead
+from lead.serializers import LeadSerializer
+from team.models import Team
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare LeadSerializer with the values() fast path (and the orjson renderer) '
+        'on N leads. The leads are created in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs is reported.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            leads = self.create_leads(options['rows'])
+            results = self.run(leads, options['repeat'])
+            transaction.set_rollback(True)
+
+        baseline = results[0][1]
+        self.stdout.write('%d rows, best of %d runs' % (options['rows'], options['repeat']))
+        for name, seconds in results:
+            self.stdout.write('  %-40s %8.1f ms  %5.1fx' % (name, seconds * 1000, baseline / seconds))
+
+    def create_leads(self, rows):
+        user = User.objects.create_user('benchmark-%d@example.com' % time.time_ns(), first_name='Bench', last_name='Mark')
+        team = Team.objects.create(name='Benchmark', created_by=user)
+        statuses = [choice for choice, _ in Lead.CHOICES_STATUS]
+        Lead.objects.bulk_create([
+            Lead(
+                team=team, company='Company %d' % i, contact_person='Person %d' % i,
+                email='lead%d@example.com' % i, phone='555-%04d' % i, website='https://example.com',
+                confidence=i % 100, estimated_value=i * 10, status=statuses[i % len(statuses)],
+                assigned_to=user if i % 2 else None, created_by=user,
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+        return Lead.objects.filter(team=team).order_by('-modified_at', '-id')
+
+    def run(self, leads, repeat):
+        fast = ValuesSerializer(LeadSerializer)
+        cases = [
+            ('LeadSerializer + JSONRenderer', lambda: JSONRenderer().render(
+                LeadSerializer(leads.select_related('assigned_to'), many=True).data)),
+            ('ValuesSerializer + JSONRenderer', lambda: JSONRenderer().render(
+                fast.to_representation(fast.values(leads)))),
+        ]
+        if orjson is not None:
+            cases.append(('ValuesSerializer + ORJSONRenderer', lambda: ORJSONRenderer().render(
+                fast.to_representation(fast.values(leads)))))
+        else:
+            self.stderr.write('orjson is not installed; skipping ORJSONRenderer.')
+
+        expected = cases[0][1]()
+        for name, case in cases[1:]:
+            if case() != expected:
+                self.stderr.write('%s output differs from LeadSerializer!' % name)
+
+        results = []
+        for name, case in cases:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                case()
+                timings.append(time.perf_counter() - start)
+            results.append((name, min(timings)))
+        return results
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lead.models import Lead, LeadPipelineSummary
+from lead.pipeline import SUM_FIELDS, rebuild, verify
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the lead pipeline summaries from the leads, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team', type=int, help='Only rebuild or verify this team id.')
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Compare the stored summaries with the leads without changing them; exits non-zero on drift.',
+        )
+
+    def handle(self, *args, **options):
+        team_id = options['team']
+        if not options['verify']:
+            total = rebuild(Lead, LeadPipelineSummary, team_id=team_id)
+            self.stdout.write(self.style.SUCCESS('Rebuilt %d pipeline buckets.' % total))
+            return
+
+        mismatches = verify(Lead, LeadPipelineSummary, team_id=team_id)
+        for (team, status, priority, assigned_to), (stored, expected) in sorted(mismatches.items(), key=str):
+            self.stdout.write('team=%s status=%s priority=%s assigned_to=%s: stored %s, expected %s' % (
+                team, status, priority, assigned_to,
+                self.describe(stored), self.describe(expected),
+            ))
+        if mismatches:
+            raise CommandError('%d pipeline buckets are out of date; run without --verify to rebuild.' % len(mismatches))
+        self.stdout.write(self.style.SUCCESS('Pipeline summaries are up to date.'))
+
+    @staticmethod
+    def describe(sums):
+        if sums is None:
+            return 'nothing'
+        return ', '.join('%s=%s' % item for item in zip(SUM_FIELDS, sums))
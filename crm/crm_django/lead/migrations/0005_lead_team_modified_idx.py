@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lead', '0004_lead_assigned_to'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['team', 'modified_at', 'id'], name='lead_team_modified_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lead', '0005_lead_team_modified_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['team', 'created_at', 'id'], name='lead_team_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['team', 'status', 'modified_at'], name='lead_team_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['team', 'priority', 'modified_at'], name='lead_team_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['team', 'assigned_to', 'modified_at'], name='lead_team_assignee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['team', 'confidence'], name='lead_team_confidence_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['team', 'estimated_value'], name='lead_team_value_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2 on 2026-10-18 15:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_summaries(apps, schema_editor):
+    from lead.pipeline import rebuild
+    rebuild(apps.get_model('lead', 'Lead'), apps.get_model('lead', 'LeadPipelineSummary'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('team', '0004_team_plan_end_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('lead', '0006_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadPipelineSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('new', 'New'), ('contacted', 'Contacted'), ('inprogress', 'In Progress'), ('lost', 'Lost'), ('won', 'Won')], max_length=255)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], max_length=255)),
+                ('lead_count', models.IntegerField(default=0)),
+                ('value_sum', models.BigIntegerField(default=0)),
+                ('confidence_sum', models.BigIntegerField(default=0)),
+                ('weighted_value_sum', models.BigIntegerField(default=0)),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pipeline_summaries', to='team.team')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='leadpipelinesummary',
+            constraint=models.UniqueConstraint(fields=('team', 'status', 'priority', 'assigned_to'), name='lead_pipeline_bucket_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='leadpipelinesummary',
+            constraint=models.UniqueConstraint(condition=models.Q(assigned_to__isnull=True), fields=('team', 'status', 'priority'), name='lead_pipeline_unassigned_uniq'),
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lead', '0007_pipeline_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['team', 'email'], name='lead_team_email_idx'),
+        ),
+    ]
@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
+from crm_django.tracking import TrackLoadedValuesMixin
 from team.models import Team
 
-class Lead(models.Model):
+class Lead(TrackLoadedValuesMixin, models.Model):
     """
     Represents a lead in the CRM system.
 
@@ -72,15 +73,57 @@ class Lead(models.Model):
     created_by = models.ForeignKey(User, related_name='leads', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
 
+    class Meta:
+        indexes = [
+            # keyset pagination of a team's leads (crm_django.pagination)
+            models.Index(fields=['team', 'modified_at', 'id'], name='lead_team_modified_idx'),
+            # server-side filtering and ordering (lead.filters)
+            models.Index(fields=['team', 'created_at', 'id'], name='lead_team_created_idx'),
+            models.Index(fields=['team', 'status', 'modified_at'], name='lead_team_status_idx'),
+            models.Index(fields=['team', 'priority', 'modified_at'], name='lead_team_priority_idx'),
+            models.Index(fields=['team', 'assigned_to', 'modified_at'], name='lead_team_assignee_idx'),
+            models.Index(fields=['team', 'confidence'], name='lead_team_confidence_idx'),
+            models.Index(fields=['team', 'estimated_value'], name='lead_team_value_idx'),
+            # duplicate checks of lead imports (lead.imports)
+            models.Index(fields=['team', 'email'], name='lead_team_email_idx'),
+        ]
+
+
+class LeadPipelineSummary(models.Model):
+    """
+    Per-team pipeline totals for one (status, priority, assignee) bucket.
+
+    Maintained incrementally by lead.pipeline from Lead save/delete signals
+    and the bulk create/update paths; rebuild_pipeline_summaries recomputes
+    and verifies them.
+
+    Attributes:
+        lead_count (int): Number of leads in the bucket.
+        value_sum (int): Sum of estimated_value (missing values count as 0).
+        confidence_sum (int): Sum of confidence (missing values count as 0).
+        weighted_value_sum (int): Sum of estimated_value * confidence; divide by
+            100 for the confidence-weighted pipeline value.
+    """
+    team = models.ForeignKey(Team, related_name='pipeline_summaries', on_delete=models.CASCADE)
+    status = models.CharField(max_length=255, choices=Lead.CHOICES_STATUS)
+    priority = models.CharField(max_length=255, choices=Lead.CHOICES_PRIORITY)
+    assigned_to = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE, blank=True, null=True)
+    lead_count = models.IntegerField(default=0)
+    value_sum = models.BigIntegerField(default=0)
+    confidence_sum = models.BigIntegerField(default=0)
+    weighted_value_sum = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['team', 'status', 'priority', 'assigned_to'],
+                name='lead_pipeline_bucket_uniq',
+            ),
+            # NULLs are distinct in unique constraints, so unassigned buckets need their own
+            models.UniqueConstraint(
+                fields=['team', 'status', 'priority'],
+                condition=models.Q(assigned_to__isnull=True),
+                name='lead_pipeline_unassigned_uniq',
+            ),
+        ]
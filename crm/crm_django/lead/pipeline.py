@@ -0,0 +1,200 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Count, F, Sum
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Lead, LeadPipelineSummary
+
+# Lead fields that pick the summary bucket, and the ones that feed its sums
+BUCKET_FIELDS = ('team_id', 'status', 'priority', 'assigned_to_id')
+VALUE_FIELDS = ('estimated_value', 'confidence')
+SUM_FIELDS = ('lead_count', 'value_sum', 'confidence_sum', 'weighted_value_sum')
+
+
+def summary_aggregates():
+    """Aggregates that compute a bucket's sums from Lead rows."""
+    value = Cast(Coalesce('estimated_value', 0), BigIntegerField())
+    confidence = Cast(Coalesce('confidence', 0), BigIntegerField())
+    return {
+        'lead_count': Count('id'),
+        'value_sum': Coalesce(Sum(value), 0),
+        'confidence_sum': Coalesce(Sum(confidence), 0),
+        'weighted_value_sum': Coalesce(Sum(value * confidence), 0),
+    }
+
+
+def bucket_key(values):
+    return tuple(values[name] for name in BUCKET_FIELDS)
+
+
+def lead_sums(values, sign=1):
+    value = values['estimated_value'] or 0
+    confidence = values['confidence'] or 0
+    return (sign, sign * value, sign * confidence, sign * value * confidence)
+
+
+class Deltas:
+    """Accumulates per-bucket changes so each bucket is written once."""
+
+    def __init__(self):
+        self.buckets = defaultdict(lambda: [0, 0, 0, 0])
+
+    def add(self, key, sums):
+        bucket = self.buckets[key]
+        for i, amount in enumerate(sums):
+            bucket[i] += amount
+
+    def add_lead(self, values, sign=1):
+        self.add(bucket_key(values), lead_sums(values, sign))
+
+    def apply(self, using=None):
+        for key, sums in self.buckets.items():
+            if any(sums):
+                apply_delta(key, sums, using)
+
+
+def apply_delta(key, sums, using=None):
+    """
+    Add ``sums`` to one bucket with a single ``UPDATE ... SET x = x + n``.
+
+    The row is only created when leads are being added to an empty bucket;
+    a concurrent creation of the same bucket shows up as an IntegrityError
+    and is retried as an update.
+    """
+    team_id, status, priority, assigned_to_id = key
+    manager = LeadPipelineSummary.objects.db_manager(using)
+    bucket = manager.filter(team_id=team_id, status=status, priority=priority, assigned_to_id=assigned_to_id)
+    changes = {name: F(name) + amount for name, amount in zip(SUM_FIELDS, sums)}
+    if bucket.update(**changes) or sums[0] <= 0:
+        return
+    try:
+        with transaction.atomic(using=manager.db):
+            manager.create(
+                team_id=team_id, status=status, priority=priority, assigned_to_id=assigned_to_id,
+                **dict(zip(SUM_FIELDS, sums))
+            )
+    except IntegrityError:
+        bucket.update(**changes)
+
+
+def bulk_update_deltas(queryset, changes):
+    """
+    Bucket changes for applying ``changes`` to every lead in ``queryset``.
+
+    Reads the affected leads grouped by their current bucket, so the cost is
+    one GROUP BY over the updated rows rather than one query per lead.
+    """
+    changes = {_attname(name): _raw(value) for name, value in changes.items()}
+    deltas = Deltas()
+    if not any(name in changes for name in BUCKET_FIELDS + VALUE_FIELDS):
+        return deltas
+
+    for row in queryset.values(*BUCKET_FIELDS).annotate(**summary_aggregates()).order_by():
+        old = [row[name] for name in SUM_FIELDS]
+        deltas.add(bucket_key(row), [-amount for amount in old])
+
+        count, value_sum, confidence_sum, weighted = old
+        value = changes.get('estimated_value')
+        confidence = changes.get('confidence')
+        if 'estimated_value' in changes:
+            value_sum = count * (value or 0)
+        if 'confidence' in changes:
+            confidence_sum = count * (confidence or 0)
+        if 'estimated_value' in changes and 'confidence' in changes:
+            weighted = count * (value or 0) * (confidence or 0)
+        elif 'estimated_value' in changes:
+            weighted = (value or 0) * row['confidence_sum']
+        elif 'confidence' in changes:
+            weighted = (confidence or 0) * row['value_sum']
+
+        new_key = tuple(changes.get(name, row[name]) for name in BUCKET_FIELDS)
+        deltas.add(new_key, (count, value_sum, confidence_sum, weighted))
+    return deltas
+
+
+def _attname(name):
+    return name + '_id' if name in ('team', 'assigned_to') else name
+
+
+def _raw(value):
+    return getattr(value, 'pk', value)
+
+
+def compute_summaries(lead_queryset):
+    """Recompute bucket sums from Lead rows: {bucket key: [lead_count, value_sum, ...]}."""
+    rows = lead_queryset.values(*BUCKET_FIELDS).annotate(**summary_aggregates()).order_by()
+    return {bucket_key(row): [row[name] for name in SUM_FIELDS] for row in rows}
+
+
+def stored_summaries(summary_queryset):
+    rows = summary_queryset.filter(lead_count__gt=0).values(*BUCKET_FIELDS, *SUM_FIELDS)
+    return {bucket_key(row): [row[name] for name in SUM_FIELDS] for row in rows}
+
+
+def rebuild(lead_model, summary_model, team_id=None):
+    """Replace the stored summaries with ones recomputed from the leads. Returns the bucket count."""
+    leads = lead_model._default_manager.all()
+    summaries = summary_model._default_manager.all()
+    if team_id is not None:
+        leads = leads.filter(team_id=team_id)
+        summaries = summaries.filter(team_id=team_id)
+    with transaction.atomic():
+        computed = compute_summaries(leads)
+        summaries.delete()
+        summary_model._default_manager.bulk_create([
+            summary_model(
+                team_id=key[0], status=key[1], priority=key[2], assigned_to_id=key[3],
+                **dict(zip(SUM_FIELDS, sums))
+            )
+            for key, sums in computed.items()
+        ], batch_size=1000)
+    return len(computed)
+
+
+def verify(lead_model, summary_model, team_id=None):
+    """Compare stored and recomputed summaries. Returns {bucket key: (stored, expected)} for mismatches."""
+    leads = lead_model._default_manager.all()
+    summaries = summary_model._default_manager.all()
+    if team_id is not None:
+        leads = leads.filter(team_id=team_id)
+        summaries = summaries.filter(team_id=team_id)
+    expected = compute_summaries(leads)
+    stored = stored_summaries(summaries)
+    return {
+        key: (stored.get(key), expected.get(key))
+        for key in set(expected) | set(stored)
+        if stored.get(key) != expected.get(key)
+    }
+
+
+def get_pipeline_analytics(team_id):
+    """
+    Pipeline totals for a team, grouped by status, priority and assignee.
+
+    Served entirely from LeadPipelineSummary, which holds at most one row per
+    (status, priority, assignee) combination. Every status and priority is
+    listed, in choice order, even when it has no leads.
+    """
+    by_status = {status: [0, 0, 0, 0] for status, _ in Lead.CHOICES_STATUS}
+    by_priority = {priority: [0, 0, 0, 0] for priority, _ in Lead.CHOICES_PRIORITY}
+    by_assignee = defaultdict(lambda: [0, 0, 0, 0])
+    total = [0, 0, 0, 0]
+    rows = stored_summaries(LeadPipelineSummary.objects.filter(team_id=team_id))
+    for (_, status, priority, assigned_to_id), sums in rows.items():
+        for bucket in (by_status[status], by_priority[priority], by_assignee[assigned_to_id], total):
+            for i, amount in enumerate(sums):
+                bucket[i] += amount
+
+    def entry(sums, **extra):
+        count, value_sum, _, weighted = sums
+        return dict(extra, count=count, estimated_value=value_sum, weighted_value=weighted / 100)
+
+    # unassigned leads last
+    assignees = sorted(by_assignee, key=lambda pk: (pk is None, pk))
+    return {
+        'total': entry(total),
+        'by_status': [entry(sums, status=key) for key, sums in by_status.items()],
+        'by_priority': [entry(sums, priority=key) for key, sums in by_priority.items()],
+        'by_assignee': [entry(by_assignee[key], assigned_to=key) for key in assignees],
+    }
@@ -6,4 +6,29 @@ class LeadSerializer(serializers.ModelSerializer):
     assigned_to = UserSerializer(read_only=True)
     class Meta:
         model = Lead
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ['team', 'created_by']
+
+
+class LeadPatchSerializer(serializers.Serializer):
+    assigned_to = serializers.IntegerField(required=False, allow_null=True)
+    status = serializers.ChoiceField(choices=Lead.CHOICES_STATUS, required=False)
+    priority = serializers.ChoiceField(choices=Lead.CHOICES_PRIORITY, required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError('Nothing to update.')
+        return data
+
+
+class LeadBulkUpdateSerializer(serializers.Serializer):
+    MAX_ROWS = 10000
+
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=MAX_ROWS)
+    filter = serializers.DictField(required=False)
+    patch = LeadPatchSerializer()
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError('Send either ids or filter.')
+        return data
@@ -0,0 +1,88 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from crm_django.signals import post_bulk_create, pre_bulk_update
+from .models import Lead
+from .pipeline import BUCKET_FIELDS, VALUE_FIELDS, Deltas, bulk_update_deltas, compute_summaries
+
+TRACKED_FIELDS = BUCKET_FIELDS + VALUE_FIELDS
+
+
+def lead_values(instance):
+    return {name: getattr(instance, name) for name in TRACKED_FIELDS}
+
+
+def previous_values(instance, using=None):
+    """The tracked values the row had before this save, or None for a new row."""
+    loaded = instance.get_loaded_values()
+    if all(name in loaded for name in TRACKED_FIELDS):
+        return {name: loaded[name] for name in TRACKED_FIELDS}
+    if instance.pk is None:
+        return None
+    # built by hand or loaded with only()/defer(): read the row being replaced
+    return Lead.objects.using(using).filter(pk=instance.pk).values(*TRACKED_FIELDS).first()
+
+
+def remember_pipeline_bucket(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        instance._pipeline_previous = previous_values(instance, using)
+
+
+def update_pipeline_on_save(sender, instance, created, raw=False, using=None, update_fields=None, **kwargs):
+    if raw:
+        return
+    deltas = Deltas()
+    new = lead_values(instance)
+    old = None if created else getattr(instance, '_pipeline_previous', None)
+    if old is not None:
+        if update_fields is not None:
+            saved = {Lead._meta.get_field(name).attname for name in update_fields}
+            new = {name: new[name] if name in saved else old[name] for name in TRACKED_FIELDS}
+        if old == new:
+            return
+        deltas.add_lead(old, sign=-1)
+    deltas.add_lead(new)
+    deltas.apply(using)
+
+
+def update_pipeline_on_delete(sender, instance, using=None, **kwargs):
+    deltas = Deltas()
+    deltas.add_lead(lead_values(instance), sign=-1)
+    deltas.apply(using)
+
+
+def update_pipeline_on_bulk_create(sender, instances, using=None, **kwargs):
+    deltas = Deltas()
+    for instance in instances:
+        deltas.add_lead(lead_values(instance))
+    deltas.apply(using)
+
+
+def update_pipeline_on_bulk_update(sender, pks, changes, using=None, **kwargs):
+    queryset = Lead.objects.using(using).filter(pk__in=pks)
+    bulk_update_deltas(queryset, changes).apply(using)
+
+
+def unassign_pipeline_on_user_delete(sender, instance, using=None, **kwargs):
+    # Lead.assigned_to is SET_NULL, which Django applies with an UPDATE and no
+    # Lead signals, so move the surviving leads to the unassigned buckets here.
+    # Leads the user created, or that belong to a team they created, are
+    # cascade-deleted and leave the user's buckets through post_delete.
+    leads = (
+        Lead.objects.using(using)
+        .filter(assigned_to=instance)
+        .exclude(created_by=instance)
+        .exclude(team__created_by=instance)
+    )
+    deltas = Deltas()
+    for (team_id, status, priority, assigned_to_id), sums in compute_summaries(leads).items():
+        deltas.add((team_id, status, priority, assigned_to_id), [-amount for amount in sums])
+        deltas.add((team_id, status, priority, None), sums)
+    deltas.apply(using)
+
+pre_save.connect(remember_pipeline_bucket, sender=Lead, dispatch_uid='lead_pipeline_pre_save')
+post_save.connect(update_pipeline_on_save, sender=Lead, dispatch_uid='lead_pipeline_save')
+post_delete.connect(update_pipeline_on_delete, sender=Lead, dispatch_uid='lead_pipeline_delete')
+post_bulk_create.connect(update_pipeline_on_bulk_create, sender=Lead, dispatch_uid='lead_pipeline_bulk_create')
+pre_bulk_update.connect(update_pipeline_on_bulk_update, sender=Lead, dispatch_uid='lead_pipeline_bulk_update')
+pre_delete.connect(unassign_pipeline_on_user_delete, sender=User, dispatch_uid='lead_pipeline_user_delete')
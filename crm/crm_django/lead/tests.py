@@ -1,3 +1,620 @@
+import json
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from crm_django import bulk, renderers
+from crm_django.bulk import bulk_create
+from crm_django.testing import QueryCountTestCase
+from crm_django.values import ValuesSerializer
+from team.context import invalidate_team_cache
+from team.models import Plan, Team
+from .imports import LeadImporter
+from .models import Lead, LeadPipelineSummary
+from .pipeline import get_pipeline_analytics, verify
+from .serializers import LeadBulkUpdateSerializer, LeadSerializer
+
+
+class LeadFilterIndexTests(TestCase):
+    """Every supported lead filter must be answered from an index, not a table scan."""
+
+    FILTERS = [
+        'status=won',
+        'status=new,lost',
+        'priority=high',
+        'assigned_to=%(user)s',
+        'assigned_to=none',
+        'confidence=50',
+        'confidence__gte=50',
+        'confidence__lte=50',
+        'estimated_value=1000',
+        'estimated_value__gte=1000',
+        'estimated_value__lte=1000',
+        'created_at__gte=2020-01-01T00:00:00Z',
+        'created_at__lte=2030-01-01T00:00:00Z',
+        'modified_at__gte=2020-01-01T00:00:00Z',
+        'modified_at__lte=2030-01-01T00:00:00Z',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.token = Token.objects.create(user=cls.user)
+        statuses = [choice for choice, _ in Lead.CHOICES_STATUS]
+        priorities = [choice for choice, _ in Lead.CHOICES_PRIORITY]
+        Lead.objects.bulk_create([
+            Lead(
+                team=cls.team,
+                company='Company %d' % i,
+                contact_person='Person %d' % i,
+                email='lead%d@example.com' % i,
+                phone='555-%04d' % i,
+                confidence=i % 100,
+                estimated_value=i * 10,
+                status=statuses[i % len(statuses)],
+                priority=priorities[i % len(priorities)],
+                assigned_to=cls.user if i % 2 else None,
+                created_by=cls.user,
+            )
+            for i in range(200)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        invalidate_team_cache()
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def lead_list_sql(self, query, keyset=True):
+        # keyset mode issues a single SELECT against lead_lead (no COUNT); in
+        # page-number mode the page's SELECT comes after the COUNT
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/leads/?' + ('cursor=&' if keyset else '') + query)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [q['sql'] for q in ctx.captured_queries if 'FROM "lead_lead"' in q['sql']][-1]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    @skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'EXPLAIN format is backend specific')
+    def test_filters_use_team_indexes(self):
+        for query in self.FILTERS:
+            query = query % {'user': self.user.pk}
+            with self.subTest(query=query):
+                plan = self.explain(self.lead_list_sql(query))
+                # the planner may prefer the ordering index for unselective
+                # ranges, but it must always be one of the team_id-leading ones
+                self.assertRegex(plan, r'lead_team_\w+_idx')
+                if connection.vendor == 'postgresql':
+                    self.assertNotIn('Seq Scan on lead_lead', plan)
+                else:
+                    self.assertNotRegex(plan, r'SCAN (TABLE )?lead_lead(?! USING)')
+
+    @skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'EXPLAIN format is backend specific')
+    def test_ordering_by_assignee_uses_index(self):
+        for query in ('ordering=assigned_to', 'ordering=-assigned_to'):
+            with self.subTest(query=query):
+                plan = self.explain(self.lead_list_sql(query, keyset=False))
+                self.assertIn('lead_team_assignee_idx', plan)
+                if connection.vendor == 'postgresql':
+                    self.assertNotIn('Sort', plan)
+                else:
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+        for ordering in ('assigned_to', '-assigned_to'):
+            response = self.client.get('/api/v1/leads/?ordering=' + ordering)
+            assignees = [lead['assigned_to'] and lead['assigned_to']['id'] for lead in response.json()['results']]
+            expected = Lead.objects.order_by(ordering).values_list('assigned_to', flat=True)[:len(assignees)]
+            self.assertEqual(assignees, list(expected))
+
+    def test_filters_narrow_results(self):
+        response = self.client.get('/api/v1/leads/?status=won&priority=high&page_size=100&cursor=')
+        results = response.json()['results']
+        self.assertTrue(results)
+        self.assertTrue(all(lead['status'] == 'won' and lead['priority'] == 'high' for lead in results))
+
+        response = self.client.get('/api/v1/leads/?confidence__gte=90&ordering=-estimated_value')
+        values = [lead['estimated_value'] for lead in response.json()['results']]
+        self.assertEqual(values, sorted(values, reverse=True))
+        self.assertEqual(response.json()['count'], Lead.objects.filter(confidence__gte=90).count())
+
+    def test_invalid_filter_value(self):
+        response = self.client.get('/api/v1/leads/?status=bogus')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/v1/leads/?confidence__gte=lots')
+        self.assertEqual(response.status_code, 400)
+
+
+class LeadValuesSerializerTests(TestCase):
+    """The values() fast path must render exactly what LeadSerializer renders."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret', first_name='Zoë', last_name='O\'Brien')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.token = Token.objects.create(user=cls.user)
+        Lead.objects.create(
+            team=cls.team, company='Ünïcode "quoted" \u2028 line', contact_person='Person',
+            email='lead@example.com', phone='555', website='https://example.com',
+            confidence=75, estimated_value=12000, status=Lead.WON, priority=Lead.HIGH,
+            assigned_to=cls.user, created_by=cls.user,
+        )
+        Lead.objects.create(
+            team=cls.team, company='Bare', contact_person='Person', email='bare@example.com',
+            phone='555', created_by=cls.user,
+        )
+
+    def leads(self):
+        return Lead.objects.filter(team=self.team).order_by('id')
+
+    def test_output_is_byte_identical(self):
+        expected = JSONRenderer().render(LeadSerializer(self.leads(), many=True).data)
+        fast = ValuesSerializer(LeadSerializer)
+        data = fast.to_representation(fast.values(self.leads()))
+        self.assertEqual(JSONRenderer().render(data), expected)
+
+    @skipUnless(renderers.orjson is not None, 'orjson is not installed')
+    def test_orjson_renderer_is_byte_identical(self):
+        data = LeadSerializer(self.leads(), many=True).data
+        self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_list_endpoint_matches_serializer(self):
+        invalidate_team_cache()
+        cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = client.get('/api/v1/leads/?ordering=created_at')
+        expected = LeadSerializer(self.leads(), many=True).data
+        self.assertEqual(json.loads(response.content)['results'], json.loads(JSONRenderer().render(expected)))
+
+
+class LeadQueryCountTests(QueryCountTestCase):
+    def test_list(self):
+        self.assertConstantQueries('/api/v1/leads/?page_size=100', self.make_leads)
+
+    def test_list_keyset(self):
+        self.assertConstantQueries('/api/v1/leads/?cursor=&page_size=100', self.make_leads)
+
+    def test_list_search(self):
+        self.assertConstantQueries('/api/v1/leads/?search=company&page_size=100', self.make_leads)
+
+    def test_export(self):
+        self.assertConstantQueries('/api/v1/leads/export/?output=ndjson', self.make_leads)
+
+    def test_analytics(self):
+        self.assertConstantQueries('/api/v1/leads/analytics/', self.make_leads)
+
+    def test_retrieve_assigned_lead(self):
+        self.make_leads(1, assigned_to=None)
+        self.make_leads(1)
+        unassigned, assigned = Lead.objects.order_by('id')
+        self.assertEqual(
+            self.count_queries('/api/v1/leads/%d/' % assigned.pk),
+            self.count_queries('/api/v1/leads/%d/' % unassigned.pk),
+        )
+
+
+class LeadImportTests(TestCase):
+    HEADER = 'company,contact_person,email,phone,confidence\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def csv(self, count, start=0):
+        return self.HEADER + ''.join('Company %d,Person,lead%d@example.com,555,%d\n' % (i, i, i % 100) for i in range(start, start + count))
+
+    def post(self, body, content_type='text/csv'):
+        return self.client.generic('POST', '/api/v1/leads/import/', body, content_type=content_type)
+
+    def test_csv_across_chunks(self):
+        LeadImporter.chunk_size = 100
+        self.addCleanup(setattr, LeadImporter, 'chunk_size', 1000)
+        response = self.post(self.csv(250))
+        self.assertEqual(response.data, {'created': 250, 'failed': 0, 'errors': [], 'errors_truncated': False})
+        self.assertEqual(Lead.objects.filter(team=self.team, created_by=self.user).count(), 250)
+        self.assertEqual(sorted(Lead.objects.values_list('confidence', flat=True))[-1], 99)
+
+    def test_partial_failures_are_reported_per_row(self):
+        body = self.HEADER + (
+            'Good,Person,good@example.com,555,1\n'
+            ',Person,nocompany@example.com,555,1\n'
+            'Bad email,Person,not-an-email,555,1\n'
+            'Bad number,Person,number@example.com,555,lots\n'
+            'Also good,Person,also@example.com,555,\n'
+        )
+        response = self.post(body)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4, 5])
+        self.assertEqual(set(response.data['errors'][0]['errors']), {'company'})
+        self.assertEqual(set(response.data['errors'][1]['errors']), {'email'})
+        self.assertEqual(set(response.data['errors'][2]['errors']), {'confidence'})
+        self.assertEqual(sorted(Lead.objects.values_list('company', flat=True)), ['Also good', 'Good'])
+
+    def test_ndjson(self):
+        body = '\n'.join([
+            json.dumps({'company': 'A', 'contact_person': 'P', 'email': 'a@example.com', 'phone': '1', 'status': 'won'}),
+            '{not json',
+            '[1, 2]',
+            '',
+            json.dumps({'company': 'B', 'contact_person': 'P', 'email': 'b@example.com', 'phone': '1', 'status': 'bogus'}),
+        ])
+        response = self.post(body, 'application/x-ndjson')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 3))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 5])
+        self.assertEqual(Lead.objects.get().status, Lead.WON)
+
+    def test_multipart_upload(self):
+        upload = SimpleUploadedFile('leads.csv', self.csv(3).encode(), content_type='text/csv')
+        response = self.client.post('/api/v1/leads/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.data['created'], 3)
+        response = self.client.post('/api/v1/leads/import/', {}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        response = self.post('company\nA\n', 'text/plain')
+        self.assertEqual(response.status_code, 415)
+
+    def test_duplicates_are_skipped(self):
+        self.post(self.csv(3))
+        body = self.csv(5) + 'Company 9,Person,lead4@example.com,555,1\n'
+        response = self.post(body)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 4))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4, 7])
+        self.assertEqual(response.data['errors'][0]['errors'], {'email': ['A lead with this email already exists.']})
+        self.assertEqual(Lead.objects.count(), 5)
+
+        # another team's leads are not duplicates
+        other = Team.objects.create(name='Other', created_by=self.user)
+        report = LeadImporter(other, self.user).run([(2, {'company': 'C', 'contact_person': 'P', 'email': 'lead0@example.com', 'phone': '1'})])
+        self.assertEqual(report['created'], 1)
+
+    def test_quota_stop(self):
+        plan = Plan.objects.create(name='Tiny', max_leads=4, max_clients=1)
+        Team.objects.filter(pk=self.team.pk).update(plan=plan)
+        self.team.refresh_from_db()
+        self.post(self.csv(1))
+
+        # duplicates do not use up the quota
+        response = self.post(self.csv(6))
+        self.assertEqual((response.data['created'], response.data['failed']), (3, 3))
+        self.assertEqual(
+            [error['errors'] for error in response.data['errors']][1:],
+            [{'non_field_errors': ['Plan lead limit reached.']}] * 2,
+        )
+        self.team.refresh_from_db()
+        self.assertEqual((self.team.lead_count, Lead.objects.count()), (4, 4))
+
+    def test_quota_taken_during_the_import(self):
+        plan = Plan.objects.create(name='Tiny', max_leads=4, max_clients=1)
+        Team.objects.filter(pk=self.team.pk).update(plan=plan)
+        self.team.refresh_from_db()
+        importer = LeadImporter(self.team, self.user)
+        # leads created by someone else after the import counted its quota
+        Team.objects.filter(pk=self.team.pk).update(lead_count=3)
+        report = importer.run([(i + 2, {'company': 'C', 'contact_person': 'P', 'email': 'c%d@example.com' % i, 'phone': '1'}) for i in range(2)])
+        self.assertEqual((report['created'], report['failed']), (0, 2))
+        self.assertFalse(Lead.objects.exists())
+
+    def test_error_report_is_capped(self):
+        LeadImporter.max_errors = 2
+        self.addCleanup(setattr, LeadImporter, 'max_errors', 1000)
+        response = self.post(self.HEADER + 'A,P,bad,5,1\n' * 5)
+        self.assertEqual((response.data['failed'], len(response.data['errors']), response.data['errors_truncated']), (5, 2, True))
+
+
+class LeadBulkUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret')
+        cls.member = User.objects.create_user('member@example.com', password='secret')
+        cls.outsider = User.objects.create_user('outsider@example.com', password='secret')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user, cls.member)
+        cls.other = Team.objects.create(name='Other', created_by=cls.outsider)
+        cls.other.members.add(cls.outsider)
+        cls.token = Token.objects.create(user=cls.user)
+        for team, creator in ((cls.team, cls.user), (cls.other, cls.outsider)):
+            bulk_create(Lead, [
+                Lead(
+                    team=team, company='Company %d' % i, contact_person='Person', email='lead%d@example.com' % i,
+                    phone='555', status=Lead.CONTACTED if i % 2 else Lead.NEW, created_by=creator,
+                )
+                for i in range(10)
+            ])
+
+    def setUp(self):
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def post(self, data):
+        return self.client.post('/api/v1/leads/bulk-update/', data, format='json')
+
+    def test_update_by_ids(self):
+        ids = list(Lead.objects.filter(team=self.team).values_list('pk', flat=True)[:3])
+        response = self.post({'ids': ids, 'patch': {'assigned_to': self.member.pk, 'priority': Lead.HIGH}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 3})
+        self.assertEqual(
+            set(Lead.objects.filter(assigned_to=self.member, priority=Lead.HIGH).values_list('pk', flat=True)),
+            set(ids),
+        )
+
+    def test_update_by_filter_stays_in_team(self):
+        response = self.post({'filter': {'status': [Lead.NEW]}, 'patch': {'status': Lead.LOST}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 5})
+        self.assertEqual(Lead.objects.filter(team=self.team, status=Lead.LOST).count(), 5)
+        self.assertFalse(Lead.objects.filter(team=self.other, status=Lead.LOST).exists())
+
+        response = self.post({'filter': {'assigned_to': 'none'}, 'patch': {'assigned_to': self.member.pk}})
+        self.assertEqual(response.data, {'updated': 10})
+        self.assertFalse(Lead.objects.filter(team=self.other, assigned_to__isnull=False).exists())
+
+    def test_other_teams_leads_are_not_found(self):
+        foreign = Lead.objects.filter(team=self.other).values_list('pk', flat=True).first()
+        own = Lead.objects.filter(team=self.team).values_list('pk', flat=True).first()
+        response = self.post({'ids': [own, foreign], 'patch': {'status': Lead.LOST}})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(foreign), str(response.data['ids']))
+        self.assertFalse(Lead.objects.filter(status=Lead.LOST).exists())
+
+    def test_validation_errors(self):
+        own = Lead.objects.filter(team=self.team).values_list('pk', flat=True).first()
+        cases = [
+            ({'ids': [own], 'filter': {'status': Lead.NEW}, 'patch': {'status': Lead.LOST}}, 'non_field_errors'),
+            ({'patch': {'status': Lead.LOST}}, 'non_field_errors'),
+            ({'ids': [own], 'patch': {}}, 'patch'),
+            ({'ids': [own], 'patch': {'status': 'bogus'}}, 'patch'),
+            ({'filter': {}, 'patch': {'status': Lead.LOST}}, 'filter'),
+            ({'filter': {'status': 'bogus'}, 'patch': {'status': Lead.LOST}}, 'status'),
+            ({'filter': {'confidence__gte': 'high'}, 'patch': {'status': Lead.LOST}}, 'confidence__gte'),
+            ({'ids': [own], 'patch': {'assigned_to': self.outsider.pk}}, 'assigned_to'),
+        ]
+        for data, field in cases:
+            with self.subTest(data=data):
+                response = self.post(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.data)
+        self.assertFalse(Lead.objects.filter(status=Lead.LOST).exists())
+        self.assertFalse(Lead.objects.filter(assigned_to=self.outsider).exists())
+
+    def test_filter_row_limit(self):
+        with patch.object(LeadBulkUpdateSerializer, 'MAX_ROWS', 4):
+            response = self.post({'filter': {'status': Lead.NEW}, 'patch': {'status': Lead.LOST}})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('filter', response.data)
+        self.assertFalse(Lead.objects.filter(status=Lead.LOST).exists())
+
+
+class LeadPipelineSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner@example.com', password='secret')
+        cls.member = User.objects.create_user('member@example.com', password='secret')
+        cls.other = User.objects.create_user('other@example.com', password='secret')
+        cls.team = Team.objects.create(name='Team', created_by=cls.owner)
+        cls.team.members.add(cls.owner, cls.member, cls.other)
+
+    def lead(self, creator=None, assignee=None, team=None, **kwargs):
+        return Lead.objects.create(
+            team=team or self.team, company='Acme', contact_person='Person', email='lead@example.com',
+            phone='555', created_by=creator or self.owner, assigned_to=assignee, **kwargs
+        )
+
+    def assertInSync(self):
+        self.assertEqual(verify(Lead, LeadPipelineSummary), {})
+
+    def test_writes_keep_the_summary_in_sync(self):
+        lead = self.lead(assignee=self.member, estimated_value=1000, confidence=50)
+        self.lead(status=Lead.WON, estimated_value=300)
+        self.assertInSync()
+
+        lead.status = Lead.CONTACTED
+        lead.save()
+        lead.confidence = 80
+        lead.save(update_fields=['confidence'])
+        self.assertInSync()
+
+        bulk_create(Lead, [
+            Lead(team=self.team, company='Bulk', contact_person='Person', email='bulk@example.com',
+                 phone='555', created_by=self.owner, estimated_value=i)
+            for i in range(5)
+        ])
+        bulk.bulk_update(Lead, Lead.objects.values_list('pk', flat=True), {'assigned_to': self.other})
+        self.assertInSync()
+
+        lead.refresh_from_db()
+        lead.delete()
+        self.assertInSync()
+
+        analytics = get_pipeline_analytics(self.team.pk)
+        self.assertEqual(analytics['total']['count'], 6)
+        self.assertEqual(analytics['total']['estimated_value'], 310)
+
+    def test_deleting_a_member(self):
+        self.lead(creator=self.member, assignee=self.member, estimated_value=100)
+        self.lead(creator=self.member, assignee=self.other, estimated_value=200)
+        self.lead(creator=self.owner, assignee=self.member, estimated_value=400, status=Lead.WON)
+        self.lead(creator=self.other, assignee=self.member, estimated_value=800)
+        own_team = Team.objects.create(name='Own', created_by=self.member)
+        self.lead(creator=self.owner, assignee=self.member, team=own_team)
+        self.assertInSync()
+
+        self.member.delete()
+
+        self.assertInSync()
+        self.assertFalse(LeadPipelineSummary.objects.filter(team=own_team.pk).exists())
+        analytics = get_pipeline_analytics(self.team.pk)
+        self.assertEqual(analytics['total']['count'], 2)
+        self.assertEqual(
+            [(row['assigned_to'], row['count'], row['estimated_value']) for row in analytics['by_assignee']],
+            [(None, 2, 1200)],
+        )
+
+
+class LeadConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret', first_name='Ann')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.token = Token.objects.create(user=cls.user)
+        cls.lead = Lead.objects.create(
+            team=cls.team, company='Acme', contact_person='Person', email='lead@example.com',
+            phone='555', created_by=cls.user, assigned_to=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def get(self, url='/api/v1/leads/', **headers):
+        return self.client.get(url, **headers)
+
+    def test_if_none_match(self):
+        for url in ('/api/v1/leads/', '/api/v1/leads/%d/' % self.lead.pk):
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+                self.assertIn('no-cache', response['Cache-Control'])
+
+                response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response.content, b'')
+
+    def test_writes_change_the_etag(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Lead.objects.filter(pk=self.lead.pk).first().save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_renaming_the_assignee_changes_the_etag(self):
+        list_etag = self.get()['ETag']
+        detail_etag = self.get('/api/v1/leads/%d/' % self.lead.pk)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Anne'
+            self.user.save()
+
+        response = self.get(HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['assigned_to']['first_name'], 'Anne')
+        response = self.get('/api/v1/leads/%d/' % self.lead.pk, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deletes_change_the_etag(self):
+        member = User.objects.create_user('member@example.com')
+        self.team.members.add(member)
+        older = Lead.objects.create(
+            team=self.team, company='Older', contact_person='Person', email='older@example.com',
+            phone='555', created_by=self.user, assigned_to=member,
+        )
+        Lead.objects.filter(pk=self.lead.pk).first().save()
+        for delete in (older.delete, member.delete):
+            with self.subTest(delete=delete):
+                etag = self.get()['ETag']
+                with self.captureOnCommitCallbacks(execute=True):
+                    delete()
+                response = self.get(HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_validators_are_one_index_lookup(self):
+        etag = self.get()['ETag']
+        for _ in range(2):  # the second is a response cache hit
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+            statements = [query['sql'] for query in ctx.captured_queries if 'MAX(' in query['sql']]
+            self.assertEqual(len(statements), 1)
+            self.assertNotIn('COUNT(', statements[0])
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_malformed_pk_is_not_found(self):
+        for url in ('/api/v1/leads/abc/', '/api/v1/clients/abc/', '/api/v1/notes/abc/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url).status_code, 404)
+
+    def test_if_modified_since(self):
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT').status_code, 200)
+
+    def test_precondition_failed(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_MATCH=etag).status_code, 200)
+        self.assertEqual(self.get(HTTP_IF_MATCH='"stale"').status_code, 412)
+        self.assertEqual(self.get(HTTP_IF_UNMODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT').status_code, 412)
+
+
+class LeadExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.token = Token.objects.create(user=cls.user)
+        other = Team.objects.create(name='Other', created_by=cls.user)
+        bulk_create(Lead, [
+            Lead(
+                team=team, company='Acme %d' % i, contact_person='Person', email='lead%d@example.com' % i,
+                phone='555', status=Lead.WON if i % 2 else Lead.NEW, created_by=cls.user,
+            )
+            for team, count in ((cls.team, 1500), (other, 10)) for i in range(count)
+        ])
+
+    def setUp(self):
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def export(self, query):
+        response = self.client.get('/api/v1/leads/export/?' + query)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_search_exports_every_match(self):
+        # more rows than the search used to be capped at
+        lines = self.export('output=csv&search=acme')
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'company'])
+        self.assertEqual(len(lines) - 1, 1500)
+
+        rows = [json.loads(line) for line in self.export('output=ndjson&search=acme&status=won')]
+        self.assertEqual(len(rows), 750)
+        self.assertEqual({row['status'] for row in rows}, {Lead.WON})
+        self.assertEqual([row['id'] for row in rows], sorted((row['id'] for row in rows), reverse=True))
 
-# Create your tests here.
+    def test_invalid_output(self):
+        self.assertEqual(self.client.get('/api/v1/leads/export/?output=xml').status_code, 400)
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from crm_django.asyncviews import async_routes
 from .views import LeadViewSet, delete_lead
 
 router = DefaultRouter()
 router.register('leads', LeadViewSet, basename='leads')
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(async_routes(router.urls, 'leads-list', 'leads-detail'))),
     path('lead/delete_lead/<int:pk>/', delete_lead, name='delete_lead'),
 ]
\ No newline at end of file
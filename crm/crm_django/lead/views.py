@@ -2,50 +2,162 @@ from django.shortcuts import render
 from django.contrib.auth.models import User
 from rest_framework import viewsets , filters
 from .models import Lead
-from .serializers import LeadSerializer
-from team.models import Team
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.decorators import api_view
+from .serializers import LeadSerializer, LeadBulkUpdateSerializer
+from .filters import LeadFilterBackend
+from search.filters import FullTextSearchFilter
+from team.context import TeamContextMixin, get_request_team_id
+from team.quotas import reserve
+from crm_django.pagination import PageNumberOrKeysetPagination
+from crm_django.streaming import ExportMixin
+from crm_django.conditional import ConditionalGetMixin
+from crm_django.cache import CachedListMixin
+from crm_django.values import ValuesListMixin
+from crm_django import bulk
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
+from rest_framework import status
+from .imports import CONTENT_TYPES, READERS, LeadImporter, iter_lines
+from .pipeline import get_pipeline_analytics
 
 
-class LeadPagination(PageNumberPagination):
+class LeadPagination(PageNumberOrKeysetPagination):
     page_size = 10
+    ordering = ('-modified_at', '-id')
+    keyset_fields = ('modified_at', 'created_at')
    
 
 
-class LeadViewSet(viewsets.ModelViewSet):
-    queryset = Lead.objects.all()
+class LeadViewSet(TeamContextMixin, ConditionalGetMixin, CachedListMixin, ValuesListMixin, ExportMixin, viewsets.ModelViewSet):
+    # LeadSerializer nests the assignee
+    queryset = Lead.objects.select_related('assigned_to')
     serializer_class = LeadSerializer
     pagination_class = LeadPagination
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [LeadFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['company', 'contact_person']
+    ordering_fields = ['created_at', 'modified_at', 'confidence', 'estimated_value', 'status', 'priority', 'assigned_to']
+    export_fields = [
+        'id', 'company', 'contact_person', 'email', 'phone', 'website', 'confidence',
+        'estimated_value', 'status', 'priority', 'assigned_to', 'created_by', 'created_at', 'modified_at',
+    ]
+    export_ordering = LeadPagination.ordering
     
     def get_queryset(self):
-        team = Team.objects.filter(members__in=[self.request.user]).first()
-        return self.queryset.filter(team=team)
+        return self.queryset.filter(team_id=self.get_team_id())
     
     
+    def get_member(self, member_id):
+        user = (
+            User.objects.filter(pk=member_id, teams__id=self.get_team_id())
+            .only('id', 'username', 'first_name', 'last_name')
+            .first()
+        )
+        if user is None:
+            raise ValidationError({'assigned_to': 'User is not a member of your team.'})
+        return user
+
     def perform_update(self, serializer):
-        obj = self.get_object()
-        member_id = self.request.data['assigned_to']
+        member_id = self.request.data.get('assigned_to')
         if member_id:
-            user = User.objects.get(pk=member_id)
-            serializer.save(assigned_to=user)
+            serializer.save(assigned_to=self.get_member(member_id))
         else:
             serializer.save()
     
     
     def perform_create(self, serializer):
-        team = Team.objects.filter(members__in=[self.request.user]).first()
-        serializer.save(team=team, created_by=self.request.user)
+        team = self.get_team()
+        if team is None:
+            raise ValidationError({'error': 'You are not a member of a team.'})
+        # plan limit, see team.quotas
+        with reserve(team, Lead):
+            serializer.save(team_id=team.pk, created_by=self.request.user)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """
+        Import leads from CSV or NDJSON.
+
+        Send the file as the raw request body (``Content-Type: text/csv`` or
+        ``application/x-ndjson``) or as a multipart upload in ``file``. The
+        body is parsed as a stream, so the file is never loaded into memory.
+        """
+        team = self.get_team()
+        if team is None:
+            return Response({'error': 'You are not a member of a team.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = request.content_type.split(';')[0].strip()
+        if content_type == 'multipart/form-data':
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'No file uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+            kind = 'ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+            stream = upload
+        elif content_type in CONTENT_TYPES:
+            kind = CONTENT_TYPES[content_type]
+            stream = request.stream
+        else:
+            return Response({'error': 'Unsupported content type %s.' % content_type}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        if stream is None:
+            return Response({'error': 'Empty request body.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = LeadImporter(team, request.user)
+        report = importer.run(READERS[kind](iter_lines(stream)))
+        return Response(report)
+
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """
+        Apply one patch (assigned_to, status, priority) to many leads.
+
+        Select the leads with ``ids`` or with ``filter`` (the same parameters
+        as the list endpoint). Ownership and assignee membership are checked
+        in a fixed number of queries and the change is one UPDATE.
+        """
+        serializer = LeadBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        patch = dict(data['patch'])
+
+        if patch.get('assigned_to') is not None:
+            patch['assigned_to'] = self.get_member(patch['assigned_to'])
+
+        queryset = self.get_queryset()
+        if 'ids' in data:
+            ids = set(data['ids'])
+            pks = set(queryset.filter(pk__in=ids).values_list('pk', flat=True))
+            missing = ids - pks
+            if missing:
+                raise ValidationError({'ids': 'Leads not found: %s' % ', '.join(map(str, sorted(missing)))})
+        else:
+            params = {
+                key: ','.join(map(str, value)) if isinstance(value, list) else str(value)
+                for key, value in data['filter'].items()
+            }
+            lookups = LeadFilterBackend().get_filters(params)
+            if not lookups:
+                raise ValidationError({'filter': 'Filter must not be empty.'})
+            limit = LeadBulkUpdateSerializer.MAX_ROWS
+            pks = list(queryset.filter(**lookups).values_list('pk', flat=True)[:limit + 1])
+            if len(pks) > limit:
+                raise ValidationError({'filter': 'Matches more than %d leads.' % limit})
+
+        updated = bulk.bulk_update(Lead, pks, patch)
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Pipeline totals: lead counts, ``estimated_value`` sums and
+        confidence-weighted values, overall and by status, priority and
+        assignee. Read from the team's pipeline summary, not the leads.
+        """
+        return Response(get_pipeline_analytics(self.get_team_id()))
 
 
 
 @api_view(['POST'])
 def delete_lead(request):
-    team = Team.objects.filter(members__in=[request.user]).first()
-    lead = Lead.objects.get(pk=request.data['id'])
+    lead = Lead.objects.get(pk=request.data['id'], team_id=get_request_team_id(request))
     lead.delete()
     return Response({'message': 'Lead deleted successfully'})
     
\ No newline at end of file
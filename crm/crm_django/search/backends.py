@@ -0,0 +1,167 @@
+import re
+
+from django.db import connection
+
+# Index rows are keyed by kind + object id so an upsert is a delete and an
+# insert on the primary key, without a lookup table.
+KINDS = {'lead': 1, 'client': 2, 'note': 3}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Lower-cased word tokens; also used to sanitise user queries."""
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def doc_key(kind, object_id):
+    return object_id * 4 + KINDS[kind]
+
+
+class SQLiteBackend:
+    """
+    SQLite FTS5 index.
+
+    Every token is stored behind a fixed-width team prefix (``t00001a_acme``),
+    so each team effectively has its own posting lists inside one FTS5 table.
+    A query only touches the team's own terms, and its cost does not depend
+    on how many other tenants share the table. Because the prefix has a fixed
+    width, FTS5 prefix indexes can cover the first few characters of the word.
+    """
+    vendor = 'sqlite'
+    team_prefix_width = 8  # 't' + 6 base36 digits + '_'
+
+    create_sql = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_document USING fts5("
+        "body, team_id UNINDEXED, kind UNINDEXED, object_id UNINDEXED, parent_id UNINDEXED, "
+        "tokenize = \"unicode61 tokenchars '_'\", prefix = '9 10 11')",
+    ]
+    drop_sql = ['DROP TABLE IF EXISTS search_document']
+
+    @staticmethod
+    def _team_prefix(team_id):
+        digits = ''
+        while team_id:
+            team_id, digit = divmod(team_id, 36)
+            digits = '0123456789abcdefghijklmnopqrstuvwxyz'[digit] + digits
+        return 't%s_' % digits.rjust(6, '0')
+
+    def _body(self, team_id, text):
+        prefix = self._team_prefix(team_id)
+        return ' '.join(prefix + token for token in tokenize(text))
+
+    def upsert(self, cursor, docs):
+        self.delete(cursor, [(kind, object_id) for kind, object_id, *_ in docs])
+        cursor.executemany(
+            'INSERT INTO search_document (rowid, body, team_id, kind, object_id, parent_id) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            [
+                (doc_key(kind, object_id), self._body(team_id, text), team_id, kind, object_id, parent_id)
+                for kind, object_id, team_id, parent_id, text in docs
+            ],
+        )
+
+    def delete(self, cursor, keys):
+        cursor.executemany(
+            'DELETE FROM search_document WHERE rowid = %s',
+            [(doc_key(kind, object_id),) for kind, object_id in keys],
+        )
+
+    def clear(self, cursor, team_ids=None):
+        if team_ids is None:
+            cursor.execute('DELETE FROM search_document')
+        elif team_ids:
+            # team_id is not indexed here, so one pass for all of the teams
+            cursor.execute(
+                'DELETE FROM search_document WHERE team_id IN (%s)' % ', '.join(['%s'] * len(team_ids)), list(team_ids)
+            )
+
+    def match(self, team_id, terms, kinds, prefix=True):
+        """The WHERE clause, and its params, selecting the team's documents that match ``terms``."""
+        # earlier terms must match whole words, the last one may be a prefix
+        team_prefix = self._team_prefix(team_id)
+        match = ' AND '.join('"%s%s"' % (team_prefix, term) for term in terms)
+        if prefix:
+            match += ' *'
+        sql = 'search_document MATCH %s'
+        params = [match]
+        if kinds:
+            sql += ' AND kind IN (%s)' % ', '.join(['%s'] * len(kinds))
+            params += list(kinds)
+        return sql, params
+
+    def search(self, cursor, team_id, terms, kinds, limit, prefix=True):
+        where, params = self.match(team_id, terms, kinds, prefix)
+        cursor.execute(
+            'SELECT kind, object_id, parent_id, rank FROM search_document WHERE ' + where + ' ORDER BY rank LIMIT %s',
+            params + [limit],
+        )
+        # bm25() ranks are negative, lower is better
+        return [(kind, object_id, parent_id, -rank) for kind, object_id, parent_id, rank in cursor.fetchall()]
+
+
+class PostgresBackend:
+    """Postgres ``tsvector`` index with a GIN index on the document."""
+    vendor = 'postgresql'
+
+    create_sql = [
+        'CREATE TABLE IF NOT EXISTS search_document ('
+        'key bigint PRIMARY KEY, team_id bigint NOT NULL, kind varchar(16) NOT NULL, '
+        'object_id bigint NOT NULL, parent_id bigint NULL, document tsvector NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS search_document_team_idx ON search_document (team_id, kind)',
+        'CREATE INDEX IF NOT EXISTS search_document_gin_idx ON search_document USING gin (document)',
+    ]
+    drop_sql = ['DROP TABLE IF EXISTS search_document']
+
+    def upsert(self, cursor, docs):
+        cursor.executemany(
+            "INSERT INTO search_document (key, team_id, kind, object_id, parent_id, document) "
+            "VALUES (%s, %s, %s, %s, %s, to_tsvector('simple', %s)) "
+            "ON CONFLICT (key) DO UPDATE SET team_id = EXCLUDED.team_id, "
+            "parent_id = EXCLUDED.parent_id, document = EXCLUDED.document",
+            [
+                (doc_key(kind, object_id), team_id, kind, object_id, parent_id, ' '.join(tokenize(text)))
+                for kind, object_id, team_id, parent_id, text in docs
+            ],
+        )
+
+    def delete(self, cursor, keys):
+        cursor.execute(
+            'DELETE FROM search_document WHERE key = ANY(%s)',
+            [[doc_key(kind, object_id) for kind, object_id in keys]],
+        )
+
+    def clear(self, cursor, team_ids=None):
+        if team_ids is None:
+            cursor.execute('TRUNCATE search_document')
+        elif team_ids:
+            cursor.execute('DELETE FROM search_document WHERE team_id = ANY(%s)', [list(team_ids)])
+
+    def match(self, team_id, terms, kinds, prefix=True):
+        """The WHERE clause, and its params, selecting the team's documents that match ``terms``."""
+        query = ' & '.join(terms) + (':*' if prefix else '')
+        sql = "team_id = %s AND document @@ to_tsquery('simple', %s)"
+        params = [team_id, query]
+        if kinds:
+            sql += ' AND kind = ANY(%s)'
+            params.append(list(kinds))
+        return sql, params
+
+    def search(self, cursor, team_id, terms, kinds, limit, prefix=True):
+        where, params = self.match(team_id, terms, kinds, prefix)
+        cursor.execute(
+            "SELECT kind, object_id, parent_id, ts_rank(document, to_tsquery('simple', %s)) AS rank "
+            'FROM search_document WHERE ' + where + ' ORDER BY rank DESC LIMIT %s',
+            [params[1]] + params + [limit],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {backend.vendor: backend for backend in (SQLiteBackend, PostgresBackend)}
+
+
+def get_backend(conn=None):
+    """Return the index backend for the connection's vendor, or None if unsupported."""
+    backend = BACKENDS.get((conn or connection).vendor)
+    return backend() if backend else None
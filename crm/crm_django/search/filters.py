@@ -0,0 +1,24 @@
+from rest_framework.filters import SearchFilter
+
+from team.context import get_request_team_id
+from .indexing import kind_for, matching_ids
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    ``?search=`` answered from the team's full-text index.
+
+    The matches are selected by a subquery on the index rather than a list
+    of ids, so the count and the pages cover all of them; the list keeps its
+    own ordering. Falls back to DRF's ``icontains`` search over
+    ``search_fields`` when the database has no full-text backend.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        ids = matching_ids(get_request_team_id(request), query, kind_for(queryset.model), using=queryset.db)
+        if ids is None:
+            return super().filter_queryset(request, queryset, view)
+        return queryset.filter(pk__in=ids)
@@ -0,0 +1,126 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.expressions import RawSQL
+
+from .backends import KINDS, get_backend, tokenize
+
+# A one-letter prefix expands to most of a team's documents; require a
+# couple of characters before the last term is matched as a prefix.
+MIN_PREFIX_LENGTH = 2
+
+# Fields that make up each kind's document. Notes are indexed on their own
+# and carry their client as parent_id so hits can link back to the client.
+DOCUMENT_FIELDS = {
+    'lead': ['company', 'contact_person', 'email', 'phone', 'website'],
+    'client': ['company', 'contact_person', 'email', 'phone', 'website'],
+    'note': ['name', 'body'],
+}
+PARENT_FIELDS = {'note': 'client_id'}
+
+
+def kind_for(model):
+    name = model._meta.model_name
+    return name if name in KINDS else None
+
+
+def document_for(kind, row):
+    """Build an index entry from a model instance or a ``values()`` dict."""
+    get = row.get if isinstance(row, dict) else lambda name: getattr(row, name)
+    text = ' '.join(str(get(field)) for field in DOCUMENT_FIELDS[kind] if get(field))
+    parent = PARENT_FIELDS.get(kind)
+    return (kind, get('id'), get('team_id'), get(parent) if parent else None, text)
+
+
+def index_objects(kind, rows, using=DEFAULT_DB_ALIAS):
+    """Add or replace index entries for model instances or ``values()`` dicts."""
+    backend = get_backend(connections[using])
+    docs = [document_for(kind, row) for row in rows]
+    if backend is None or not docs:
+        return
+    with connections[using].cursor() as cursor:
+        backend.upsert(cursor, docs)
+
+
+def unindex_objects(kind, object_ids, using=DEFAULT_DB_ALIAS):
+    backend = get_backend(connections[using])
+    object_ids = list(object_ids)
+    if backend is None or not object_ids:
+        return
+    with connections[using].cursor() as cursor:
+        backend.delete(cursor, [(kind, object_id) for object_id in object_ids])
+
+
+def unindex_teams(team_ids, using=DEFAULT_DB_ALIAS):
+    """Drop every document of the teams ``team_ids``."""
+    backend = get_backend(connections[using])
+    team_ids = list(team_ids)
+    if backend is None or not team_ids:
+        return
+    with connections[using].cursor() as cursor:
+        backend.clear(cursor, team_ids)
+
+
+def search(team_id, query, kinds=None, limit=50):
+    """
+    Return ranked ``(kind, object_id, parent_id, rank)`` hits for the team.
+
+    Every term must match a word in the document; the last term also matches
+    as a prefix so partially typed queries work. Returns None if the database has no full-text backend.
+    """
+    backend = get_backend()
+    if backend is None:
+        return None
+    terms = tokenize(query)
+    if team_id is None or not terms:
+        return []
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        return backend.search(
+            cursor, team_id, terms, kinds or (), limit,
+            prefix=len(terms[-1]) >= MIN_PREFIX_LENGTH,
+        )
+
+
+def matching_ids(team_id, query, kind, using=DEFAULT_DB_ALIAS):
+    """
+    A subquery selecting the ids of the team's ``kind`` documents that match
+    ``query``, for ``pk__in`` lookups, so every match is kept however many
+    there are. An empty list if nothing can match, None if the database has
+    no full-text backend.
+    """
+    backend = get_backend(connections[using])
+    if backend is None:
+        return None
+    terms = tokenize(query)
+    if team_id is None or not terms:
+        return []
+    where, params = backend.match(team_id, terms, [kind], prefix=len(terms[-1]) >= MIN_PREFIX_LENGTH)
+    return RawSQL('SELECT object_id FROM search_document WHERE ' + where, params)
+
+
+def rebuild(models, team_id=None, chunk_size=2000, using=DEFAULT_DB_ALIAS):
+    """Re-index every row of ``models`` (optionally for one team). Returns the row count."""
+    backend = get_backend(connections[using])
+    if backend is None:
+        return 0
+    with connections[using].cursor() as cursor:
+        backend.clear(cursor, None if team_id is None else [team_id])
+
+    total = 0
+    for model in models:
+        kind = kind_for(model)
+        fields = ['id', 'team_id'] + DOCUMENT_FIELDS[kind]
+        if kind in PARENT_FIELDS:
+            fields.append(PARENT_FIELDS[kind])
+        queryset = model._default_manager.using(using).order_by().values(*fields)
+        if team_id is not None:
+            queryset = queryset.filter(team_id=team_id)
+
+        batch = []
+        for row in queryset.iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                index_objects(kind, batch, using)
+                total += len(batch)
+                batch = []
+        index_objects(kind, batch, using)
+        total += len(batch)
+    return total
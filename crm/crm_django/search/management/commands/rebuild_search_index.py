@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from client.models import Client, Note
+from lead.models import Lead
+from search.backends import get_backend
+from search.indexing import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for leads, clients and notes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team', type=int, help='Only rebuild the index for this team id.')
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            self.stderr.write('Full-text search is not supported on this database.')
+            return
+        total = rebuild([Lead, Client, Note], team_id=options['team'])
+        self.stdout.write(self.style.SUCCESS('Indexed %d documents.' % total))
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+from search.backends import get_backend
+
+
+def create_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        for sql in backend.create_sql:
+            schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        for sql in backend.drop_sql:
+            schema_editor.execute(sql)
+
+
+def index_existing_rows(apps, schema_editor):
+    from search.indexing import rebuild
+    rebuild(
+        [apps.get_model('lead', 'Lead'), apps.get_model('client', 'Client'), apps.get_model('client', 'Note')],
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lead', '0006_filter_indexes'),
+        ('client', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(index_existing_rows, migrations.RunPython.noop),
+    ]
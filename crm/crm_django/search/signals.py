@@ -0,0 +1,31 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+
+from client.models import Client, Note
+from crm_django.signals import post_bulk_create
+from lead.models import Lead
+from .indexing import index_objects, kind_for, unindex_objects
+
+INDEXED_MODELS = (Lead, Client, Note)
+
+
+def update_search_index(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if not raw:
+        index_objects(kind_for(sender), [instance], using)
+
+
+def remove_from_search_index(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    unindex_objects(kind_for(sender), [instance.pk], using)
+
+
+for model in INDEXED_MODELS:
+    post_save.connect(update_search_index, sender=model, dispatch_uid='search_index_%s' % model._meta.label)
+    post_delete.connect(remove_from_search_index, sender=model, dispatch_uid='search_unindex_%s' % model._meta.label)
+
+
+def index_bulk_created(sender, instances, using=DEFAULT_DB_ALIAS, **kwargs):
+    index_objects(kind_for(sender), instances, using)
+
+
+for model in INDEXED_MODELS:
+    post_bulk_create.connect(index_bulk_created, sender=model, dispatch_uid='search_bulk_index_%s' % model._meta.label)
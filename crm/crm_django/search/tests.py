@@ -0,0 +1,97 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from crm_django.bulk import bulk_create
+from crm_django.testing import QueryCountTestCase
+from lead.models import Lead
+from team.context import invalidate_team_cache
+from team.models import Team
+from .backends import get_backend
+
+
+class SearchQueryCountTests(QueryCountTestCase):
+    def test_search(self):
+        self.assertConstantQueries('/api/v1/search/?q=company&limit=100', self.make_leads)
+
+
+@skipUnless(get_backend() is not None, 'no full-text backend for this database')
+class FullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com', password='secret')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.token = Token.objects.create(user=cls.user)
+        other = Team.objects.create(name='Other', created_by=cls.user)
+        bulk_create(Lead, [
+            Lead(
+                team=cls.team, company='Acme %d' % i, contact_person='Person %d' % i,
+                email='lead%d@example.com' % i, phone='555', created_by=cls.user,
+            )
+            for i in range(1100)
+        ] + [Lead(team=other, company='Acme Other', contact_person='Ann', email='a@example.com', phone='5', created_by=cls.user)])
+        Lead.objects.create(
+            team=cls.team, company='Globex', contact_person='Hank Scorpio', email='hank@example.com',
+            phone='555', created_by=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def count(self, query):
+        response = self.client.get('/api/v1/leads/?' + query)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['count']
+
+    def test_search_filter_keeps_every_match(self):
+        self.assertEqual(self.count('search=acme'), 1100)
+        self.assertEqual(self.count('search=ac'), 1100)
+        self.assertEqual(self.count('search=acme 7'), 1)
+        self.assertEqual(self.count('search=scorpio'), 1)
+        self.assertEqual(self.count('search=other'), 0)
+        self.assertEqual(self.count('search=!!!'), 0)
+
+        ids, page = [], 1
+        while page:
+            body = self.client.get('/api/v1/leads/?search=acme&page=%d' % page).json()
+            ids += [lead['id'] for lead in body['results']]
+            page = page + 1 if body['next'] else None
+        self.assertEqual(len(set(ids)), 1100)
+
+    def test_index_follows_saves_and_deletes(self):
+        lead = Lead.objects.get(company='Globex')
+        lead.company = 'Initech'
+        with self.captureOnCommitCallbacks(execute=True):
+            lead.save()
+        self.assertEqual(self.count('search=globex'), 0)
+        self.assertEqual(self.count('search=initech'), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            lead.delete()
+        self.assertEqual(self.count('search=initech'), 0)
+
+    def test_search_endpoint(self):
+        response = self.client.get('/api/v1/search/?q=hank scor&type=lead')
+        self.assertEqual([hit['company'] for hit in response.json()['results']], ['Globex'])
+        response = self.client.get('/api/v1/search/?q=acme&limit=5')
+        self.assertEqual(len(response.json()['results']), 5)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN format is backend specific')
+    def test_search_filter_reads_the_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/v1/leads/?cursor=&search=acme')
+        sql = [q['sql'] for q in ctx.captured_queries if 'FROM "lead_lead"' in q['sql']][-1]
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+        self.assertNotRegex(plan, r'SCAN (TABLE )?lead_lead(?! USING)')
@@ -0,0 +1,46 @@
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from client.models import Client, Note
+from lead.models import Lead
+from team.context import get_request_team_id
+from .backends import KINDS
+from . import indexing
+
+TITLE_FIELDS = {
+    'lead': (Lead, ['company', 'contact_person']),
+    'client': (Client, ['company', 'contact_person']),
+    'note': (Note, ['name', 'client_id']),
+}
+
+
+@api_view(['GET'])
+def search(request):
+    query = request.query_params.get('q', '')
+    kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind in KINDS]
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        limit = 20
+
+    team_id = get_request_team_id(request)
+    hits = indexing.search(team_id, query, kinds, limit)
+    if hits is None:
+        return Response({'error': 'Full-text search is not available on this database.'}, status=501)
+
+    # one query per kind to fetch display fields for the hits
+    details = {}
+    for kind in {kind for kind, *_ in hits}:
+        model, fields = TITLE_FIELDS[kind]
+        ids = [object_id for hit_kind, object_id, _, _ in hits if hit_kind == kind]
+        for row in model.objects.filter(team_id=team_id, pk__in=ids).values('id', *fields):
+            details[kind, row['id']] = row
+
+    results = []
+    for kind, object_id, parent_id, rank in hits:
+        row = details.get((kind, object_id))
+        if row is None:
+            continue
+        row = dict(row, type=kind, rank=rank)
+        results.append(row)
+    return Response({'query': query, 'results': results})
@@ -1,8 +1,15 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Plan , Team
+from .models import Plan , StripeEvent , Team
 
 admin.site.register(Plan)
 admin.site.register(Team)
 
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'type', 'status', 'attempts', 'created', 'processed_at')
+    list_filter = ('status', 'type')
+    search_fields = ('event_id',)
+
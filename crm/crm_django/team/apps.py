@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class TeamConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'team'
+
+    def ready(self):
+        from . import plans, quotas, signals  # noqa: F401
+        from .billing import configure_stripe
+        configure_stripe()
@@ -0,0 +1,215 @@
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import stripe
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Plan, StripeEvent, Team
+from .plans import plan_registry
+
+logger = logging.getLogger(__name__)
+
+# Stripe subscription statuses that keep a paid plan active
+ACTIVE_SUBSCRIPTION_STATUSES = ('active', 'trialing', 'past_due')
+
+
+def configure_stripe():
+    """Set the API key, and STRIPE_API_BASE (e.g. a local stripe-mock) if configured."""
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    api_base = getattr(settings, 'STRIPE_API_BASE', None)
+    if api_base:
+        stripe.api_base = api_base
+
+
+def stripe_cache():
+    return caches[getattr(settings, 'STRIPE_CACHE_ALIAS', None) or 'default']
+
+
+def stripe_cache_key(kind, object_id):
+    return 'stripe:%s:%s' % (kind, object_id)
+
+
+def retrieve_subscription(subscription_id):
+    """
+    The fields of a Stripe subscription the billing views use, cached for
+    ``STRIPE_CACHE_TIMEOUT`` seconds. Subscription webhook events drop the
+    cached copy (see ``forget_subscription``).
+    """
+    key = stripe_cache_key('subscription', subscription_id)
+    subscription = stripe_cache().get(key)
+    if subscription is None:
+        obj = stripe.Subscription.retrieve(subscription_id)
+        subscription = {
+            'id': obj.id,
+            'status': obj.status,
+            'current_period_end': obj.current_period_end,
+            'product': obj.plan.product,
+        }
+        stripe_cache().set(key, subscription, getattr(settings, 'STRIPE_CACHE_TIMEOUT', 300))
+    return subscription
+
+
+def forget_subscription(subscription_id):
+    stripe_cache().delete(stripe_cache_key('subscription', subscription_id))
+
+
+def retrieve_product(product_id):
+    """The id and name of a Stripe product, cached like ``retrieve_subscription``."""
+    key = stripe_cache_key('product', product_id)
+    product = stripe_cache().get(key)
+    if product is None:
+        obj = stripe.Product.retrieve(product_id)
+        product = {'id': obj.id, 'name': obj.name}
+        stripe_cache().set(key, product, getattr(settings, 'STRIPE_CACHE_TIMEOUT', 300))
+    return product
+
+
+def plan_for_product(product_id):
+    """
+    The plan linked to a Stripe product through ``Plan.stripe_product_id``,
+    else the plan named like the product (one cached Stripe lookup).
+    """
+    try:
+        return plan_registry.get(stripe_product_id=product_id)
+    except Plan.DoesNotExist:
+        return plan_registry.get(name=retrieve_product(product_id)['name'])
+
+
+def record_event(event):
+    """
+    Store a verified webhook event unless it is already stored; Stripe
+    retries and duplicate deliveries share the event id. Returns whether the
+    event is new.
+    """
+    _, created = StripeEvent.objects.get_or_create(
+        event_id=event['id'],
+        defaults={
+            'type': event['type'],
+            'payload': event,
+            'created': datetime.fromtimestamp(event['created'], tz=dt_timezone.utc),
+        },
+    )
+    return created
+
+
+def plan_for_price(price):
+    try:
+        return plan_registry.get(stripe_product_id=price.get('product'))
+    except Plan.DoesNotExist:
+        pass
+    names = {
+        settings.STRIPE_PRICE_ID_SMALL_TEAM: 'Small Team',
+        settings.STRIPE_PRICE_ID_BIG_TEAM: 'Big Team',
+    }
+    name = names.get(price.get('id')) if price.get('id') else None
+    try:
+        return plan_registry.get(name=name) if name else None
+    except Plan.DoesNotExist:
+        return None
+
+
+def subscription_team(subscription):
+    return (
+        Team.objects.filter(stripe_subscription_id=subscription['id']).first()
+        or Team.objects.filter(stripe_customer_id=subscription['customer']).first()
+    )
+
+
+def checkout_session_completed(session):
+    team = Team.objects.filter(pk=session.get('client_reference_id')).first()
+    if team is None:
+        logger.warning('Checkout session %s for unknown team %s', session.get('id'), session.get('client_reference_id'))
+        return
+    team.stripe_customer_id = session['customer']
+    team.stripe_subscription_id = session.get('subscription') or team.stripe_subscription_id
+    team.save(update_fields=['stripe_customer_id', 'stripe_subscription_id'])
+
+
+def subscription_changed(subscription):
+    team = subscription_team(subscription)
+    if team is None:
+        logger.warning('Subscription %s for unknown customer %s', subscription['id'], subscription['customer'])
+        return
+    forget_subscription(subscription['id'])
+    team.stripe_subscription_id = subscription['id']
+    team.plan_end_date = datetime.fromtimestamp(subscription['current_period_end'], tz=dt_timezone.utc)
+    if subscription['status'] in ACTIVE_SUBSCRIPTION_STATUSES:
+        team.plan_status = Team.PLAN_ACTIVE
+        items = subscription.get('items', {}).get('data') or [{}]
+        team.plan = plan_for_price(items[0].get('price') or {}) or team.plan
+    else:
+        team.plan_status = Team.PLAN_CANCELLED
+    team.save(update_fields=['stripe_subscription_id', 'plan_end_date', 'plan_status', 'plan'])
+
+
+def subscription_deleted(subscription):
+    forget_subscription(subscription['id'])
+    team = subscription_team(subscription)
+    if team is None:
+        return
+    team.plan = plan_registry.get(name='Free')
+    team.plan_status = Team.PLAN_CANCELLED
+    team.save(update_fields=['plan', 'plan_status'])
+
+
+# Event type -> handler, called with the event's data.object
+HANDLERS = {
+    'checkout.session.completed': checkout_session_completed,
+    'customer.subscription.created': subscription_changed,
+    'customer.subscription.updated': subscription_changed,
+    'customer.subscription.deleted': subscription_deleted,
+}
+
+
+def process_event(event):
+    """
+    Run the handler for one stored event, in a transaction with marking it
+    processed. A failure is recorded on the event, which is retried with
+    exponential backoff (``STRIPE_EVENT_RETRY_DELAY`` seconds, doubling with
+    each attempt) until ``STRIPE_EVENT_MAX_ATTEMPTS`` and then left as failed.
+    """
+    try:
+        with transaction.atomic():
+            # another worker may have taken it since it was listed
+            locked = (
+                StripeEvent.objects.select_for_update(skip_locked=True)
+                .filter(pk=event.pk, status=StripeEvent.PENDING)
+                .first()
+            )
+            if locked is None:
+                return False
+            handler = HANDLERS.get(locked.type)
+            if handler is not None:
+                handler(locked.payload['data']['object'])
+            locked.status = StripeEvent.PROCESSED
+            locked.attempts += 1
+            locked.processed_at = timezone.now()
+            locked.save(update_fields=['status', 'attempts', 'processed_at'])
+    except Exception as e:
+        logger.exception('Processing Stripe event %s failed', event.event_id)
+        event.attempts += 1
+        event.last_error = repr(e)
+        if event.attempts >= getattr(settings, 'STRIPE_EVENT_MAX_ATTEMPTS', 5):
+            event.status = StripeEvent.FAILED
+        else:
+            delay = getattr(settings, 'STRIPE_EVENT_RETRY_DELAY', 30) * 2 ** (event.attempts - 1)
+            event.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        event.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+        return False
+    return True
+
+
+def process_pending_events(batch_size=100):
+    """
+    Process up to ``batch_size`` pending events that are due, oldest first.
+    Returns how many were handled.
+    """
+    due = Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now())
+    events = list(StripeEvent.objects.filter(due, status=StripeEvent.PENDING).defer('payload')[:batch_size])
+    for event in events:
+        process_event(event)
+    return len(events)
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from django.conf import settings
+
+from crm_django.replicas import use_primary
+from .models import Team
+
+
+# user id -> (team id or None, expiry timestamp)
+_team_ids = {}
+_lock = threading.Lock()
+
+_MISSING = object()
+
+
+def _timeout():
+    return getattr(settings, 'TEAM_CACHE_TIMEOUT', 300)
+
+
+def get_team_id_for_user(user):
+    """
+    Return the id of the team the user belongs to, or None.
+
+    The result is kept in a process-level cache keyed by user id so the
+    members join only runs once per user (per process) instead of on every
+    request. Entries expire after ``TEAM_CACHE_TIMEOUT`` seconds so other
+    worker processes eventually see membership changes as well.
+    """
+    if user is None or not user.is_authenticated:
+        return None
+
+    found, team_id = peek_team_id(user)
+    if found:
+        return team_id
+
+    with use_primary():
+        team_id = (
+            Team.objects.filter(members__in=[user])
+            .order_by('pk')
+            .values_list('pk', flat=True)
+            .first()
+        )
+    with _lock:
+        _team_ids[user.pk] = (team_id, time.monotonic() + _timeout())
+    return team_id
+
+
+def peek_team_id(user):
+    """
+    ``(True, team id)`` if the user's team id is cached in this process,
+    else ``(False, None)``. Never queries, so it is safe to call from async code.
+    """
+    entry = _team_ids.get(user.pk, _MISSING)
+    if entry is not _MISSING and entry[1] > time.monotonic():
+        return True, entry[0]
+    return False, None
+
+
+def invalidate_team_cache(*user_ids):
+    """Drop cached team ids for the given users, or for everyone if none are given."""
+    with _lock:
+        if not user_ids:
+            _team_ids.clear()
+            return
+        for user_id in user_ids:
+            _team_ids.pop(user_id, None)
+
+
+def invalidate_team(team_id):
+    """Drop every cached entry pointing at ``team_id``."""
+    with _lock:
+        stale = [user_id for user_id, entry in _team_ids.items() if entry[0] == team_id]
+        for user_id in stale:
+            del _team_ids[user_id]
+
+
+def get_request_team_id(request):
+    """
+    Resolve the caller's team id once per request.
+
+    The id is kept on ``request.team_id``, where request-level code outside
+    the views (e.g. crm_django.slowqueries) can read it without a lookup.
+    """
+    request = getattr(request, '_request', request)
+    if not hasattr(request, 'team_id'):
+        request.team_id = get_team_id_for_user(request.user)
+    return request.team_id
+
+
+def get_request_team(request):
+    """
+    Resolve the caller's team once per request.
+
+    Only views that need the full ``Team`` row pay for loading it, and that
+    is a primary key lookup rather than the members join. The creator
+    (serialized by TeamSerializer) and the plan (quota checks) are joined in.
+    """
+    request = getattr(request, '_request', request)
+    if not hasattr(request, '_team'):
+        team_id = get_request_team_id(request)
+        teams = Team.objects.select_related('created_by', 'plan')
+        request._team = teams.filter(pk=team_id).first() if team_id is not None else None
+    return request._team
+
+
+class TeamContextMixin:
+    """Gives viewsets cached access to the requesting user's team."""
+
+    def get_team_id(self):
+        return get_request_team_id(self.request)
+
+    def get_team(self):
+        return get_request_team(self.request)
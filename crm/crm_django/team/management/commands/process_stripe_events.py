@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from team.billing import process_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Process the Stripe webhook events stored by the webhook endpoint, polling for new ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Events to process per batch.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Process what is pending and exit.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        try:
+            while True:
+                count = process_pending_events(batch_size)
+                if count:
+                    self.stdout.write('Handled %d Stripe events.' % count)
+                if count < batch_size:
+                    if options['once']:
+                        return
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from team.quotas import reconcile
+
+
+class Command(BaseCommand):
+    help = "Repair the teams' lead and client counters from the actual row counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team', type=int, help='Only reconcile this team id.')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it.')
+
+    def handle(self, *args, **options):
+        drift = reconcile(team_id=options['team'], dry_run=options['dry_run'])
+        for team_id, field, stored, actual in drift:
+            self.stdout.write('team=%s %s: stored %s, actual %s' % (team_id, field, stored, actual))
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Team counters are up to date.'))
+        elif options['dry_run']:
+            self.stdout.write('%d counters are out of date; run without --dry-run to fix them.' % len(drift))
+        else:
+            self.stdout.write(self.style.SUCCESS('Fixed %d counters.' % len(drift)))
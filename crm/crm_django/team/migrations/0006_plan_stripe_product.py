@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('team', '0005_stripe_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='stripe_product_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='plan',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2 on 2026-10-18 15:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_rows(apps, schema_editor):
+    Team = apps.get_model('team', 'Team')
+    for model_name, field in (('lead.Lead', 'lead_count'), ('client.Client', 'client_count')):
+        counts = apps.get_model(model_name).objects.order_by().values_list('team_id').annotate(count=Count('pk'))
+        for team_id, count in counts:
+            Team.objects.filter(pk=team_id).update(**{field: count})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('team', '0006_plan_stripe_product'),
+        ('lead', '0007_pipeline_summary'),
+        ('client', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='client_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='lead_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_rows, migrations.RunPython.noop),
+    ]
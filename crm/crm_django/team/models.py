@@ -3,10 +3,11 @@ from django.contrib.auth.models import User
 
 # Create your models here.
 class Plan(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     max_leads = models.IntegerField(default=5)
     max_clients = models.IntegerField(default=5)
     price = models.IntegerField(default=0)
+    stripe_product_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
     
     def __str__(self):
         return self.name
@@ -29,8 +30,46 @@ class Team(models.Model):
     plan_end_date = models.DateTimeField(null=True, blank=True)
     stripe_customer_id = models.CharField(max_length=255, null=True, blank=True)
     stripe_subscription_id = models.CharField(max_length=255, null=True, blank=True)
+    # rows of the team, kept up to date by the receivers in team.quotas and
+    # checked against the plan by team.quotas.reserve()
+    lead_count = models.IntegerField(default=0)
+    client_count = models.IntegerField(default=0)
 
     def __str__(self):
         return self.name
     
-    
\ No newline at end of file
+    
+
+class StripeEvent(models.Model):
+    """
+    A verified Stripe webhook event, stored as received and processed later
+    by the ``process_stripe_events`` worker (see team.billing).
+    """
+    PENDING = 'pending'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+    CHOICES_STATUS = [
+        (PENDING, 'Pending'),
+        (PROCESSED, 'Processed'),
+        (FAILED, 'Failed'),
+    ]
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=255)
+    payload = models.JSONField()
+    created = models.DateTimeField()
+    status = models.CharField(max_length=25, choices=CHOICES_STATUS, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    # not retried before this time after a failure (see team.billing)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = [
+            models.Index(fields=['status', 'created', 'id'], name='stripe_event_queue_idx'),
+        ]
+
+    def __str__(self):
+        return '%s (%s)' % (self.type, self.event_id)
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from .models import Plan
+
+
+class PlanRegistry:
+    """
+    Every ``Plan`` row, loaded at once and looked up in memory by id, name
+    or Stripe product id.
+
+    There are only a handful of plans, so the whole table is reloaded on the
+    first lookup after ``invalidate()`` (called when a plan is saved or
+    deleted, see plan_changed) or after ``PLAN_CACHE_TIMEOUT`` seconds, which
+    bounds how long other processes keep serving a changed plan.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = None
+        self.expires = 0.0
+
+    def load(self):
+        now = time.monotonic()
+        tables = self.tables
+        if tables is not None and self.expires > now:
+            return tables
+        plans = list(Plan.objects.all())
+        tables = {
+            'pk': {plan.pk: plan for plan in plans},
+            'name': {plan.name: plan for plan in plans},
+            'stripe_product_id': {plan.stripe_product_id: plan for plan in plans if plan.stripe_product_id},
+        }
+        with self.lock:
+            self.tables = tables
+            self.expires = now + getattr(settings, 'PLAN_CACHE_TIMEOUT', 300)
+        return tables
+
+    def get(self, **lookup):
+        """``get(name='Free')``, ``get(pk=1)`` or ``get(stripe_product_id=...)``; raises Plan.DoesNotExist."""
+        (field, value), = lookup.items()
+        plan = self.load()[field].get(value)
+        if plan is None:
+            raise Plan.DoesNotExist('No plan with %s=%r' % (field, value))
+        return plan
+
+    def invalidate(self):
+        with self.lock:
+            self.tables = None
+
+
+plan_registry = PlanRegistry()
+
+
+def plan_changed(sender, **kwargs):
+    plan_registry.invalidate()
+
+
+post_save.connect(plan_changed, sender=Plan, dispatch_uid='plan_registry_save')
+post_delete.connect(plan_changed, sender=Plan, dispatch_uid='plan_registry_delete')
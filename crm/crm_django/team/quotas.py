@@ -0,0 +1,145 @@
+import contextvars
+from contextlib import contextmanager
+
+from django.db import router, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from client.models import Client
+from crm_django.signals import post_bulk_create
+from lead.models import Lead
+from .models import Plan, Team
+from .plans import plan_registry
+
+# Counted model -> (Team counter field, Plan limit field)
+COUNTERS = {
+    Lead: ('lead_count', 'max_leads'),
+    Client: ('client_count', 'max_clients'),
+}
+
+# (model, team id) -> rows reserved but not inserted yet, see reserve()
+_reservations = contextvars.ContextVar('quota_reservations', default=None)
+
+
+class QuotaExceeded(APIException):
+    status_code = status.HTTP_403_FORBIDDEN
+    default_detail = 'Your plan does not allow more of these.'
+    default_code = 'quota_exceeded'
+
+
+def get_limit(team, model):
+    if team.plan_id is None:
+        return None
+    try:
+        plan = plan_registry.get(pk=team.plan_id)
+    except Plan.DoesNotExist:
+        plan = Plan.objects.get(pk=team.plan_id)
+    return getattr(plan, COUNTERS[model][1])
+
+
+def add_to_counter(model, team_id, delta, using=None):
+    if delta:
+        field = COUNTERS[model][0]
+        Team.objects.using(using).filter(pk=team_id).update(**{field: F(field) + delta})
+
+
+@contextmanager
+def reserve(team, model, count=1):
+    """
+    Reserve room for ``count`` new ``model`` rows in ``team``'s plan, then
+    create them inside the ``with`` block.
+
+    The check and the counter increment are a single conditional UPDATE of
+    the team row, so concurrent creates cannot both take the last slot. Rows
+    created in the block use up the reservation instead of being counted
+    again by the receivers below; whatever is left unused is given
+    back on exit. The block runs in a transaction with the reservation and
+    raises ``QuotaExceeded`` without running if the plan is full.
+    """
+    field = COUNTERS[model][0]
+    limit = get_limit(team, model)
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        teams = Team.objects.using(using).filter(pk=team.pk)
+        if limit is not None:
+            teams = teams.filter(**{'%s__lte' % field: limit - count})
+        if not teams.update(**{field: F(field) + count}):
+            raise QuotaExceeded()
+
+        key = (model, team.pk)
+        reservations = dict(_reservations.get() or {})
+        reservations[key] = reservations.get(key, 0) + count
+        token = _reservations.set(reservations)
+        try:
+            yield
+        finally:
+            unused = _reservations.get().get(key, 0)
+            _reservations.reset(token)
+        add_to_counter(model, team.pk, -unused, using)
+
+
+def count_created(model, team_ids, using=None):
+    """Count new rows, ``team_ids`` listing one team id per row, against open reservations."""
+    reservations = _reservations.get()
+    totals = {}
+    for team_id in team_ids:
+        totals[team_id] = totals.get(team_id, 0) + 1
+    for team_id, created in totals.items():
+        key = (model, team_id)
+        if reservations and reservations.get(key):
+            used = min(reservations[key], created)
+            reservations[key] -= used
+            created -= used
+        add_to_counter(model, team_id, created, using)
+
+
+def counted_rows(model, team_id=None):
+    """Team id -> actual number of ``model`` rows."""
+    rows = model.objects.all()
+    if team_id is not None:
+        rows = rows.filter(team_id=team_id)
+    return dict(rows.order_by().values_list('team_id').annotate(count=Count('pk')))
+
+
+def reconcile(team_id=None, dry_run=False):
+    """
+    Set every team's counters to the real row counts. Returns
+    ``[(team id, counter, stored, actual)]`` for the counters that drifted.
+    """
+    drift = []
+    with transaction.atomic():
+        teams = Team.objects.select_for_update().order_by('pk')
+        if team_id is not None:
+            teams = teams.filter(pk=team_id)
+        teams = list(teams.values('pk', *(field for field, _ in COUNTERS.values())))
+        for model, (field, _) in COUNTERS.items():
+            actual = counted_rows(model, team_id)
+            for team in teams:
+                count = actual.get(team['pk'], 0)
+                if team[field] != count:
+                    drift.append((team['pk'], field, team[field], count))
+                    if not dry_run:
+                        Team.objects.filter(pk=team['pk']).update(**{field: count})
+    return drift
+
+
+def counted_row_created(sender, instance, created, raw=False, using=None, **kwargs):
+    if created and not raw:
+        count_created(sender, [instance.team_id], using)
+
+
+def counted_row_deleted(sender, instance, using=None, **kwargs):
+    add_to_counter(sender, instance.team_id, -1, using)
+
+
+def counted_rows_bulk_created(sender, instances, using=None, **kwargs):
+    count_created(sender, [instance.team_id for instance in instances], using)
+
+
+for model in COUNTERS:
+    label = model._meta.label
+    post_save.connect(counted_row_created, sender=model, dispatch_uid='team_counter_save_%s' % label)
+    post_delete.connect(counted_row_deleted, sender=model, dispatch_uid='team_counter_delete_%s' % label)
+    post_bulk_create.connect(counted_rows_bulk_created, sender=model, dispatch_uid='team_counter_bulk_create_%s' % label)
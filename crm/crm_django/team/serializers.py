@@ -1,4 +1,5 @@
 from django.contrib.auth.models import User
+from django.db.models import Sum
 from rest_framework import serializers
 from .models import Team , Plan
 
@@ -15,15 +16,41 @@ class PlanSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'max_leads', 'max_clients', 'price']
 
 class TeamSerializer(serializers.ModelSerializer):
+    # Number of most recently modified leads embedded in the team payload.
+    # The full list lives at /teams/<id>/leads/ (paginated, or ?stream=1 for NDJSON).
+    RECENT_LEADS = 5
+
     members = UserSerializer(many=True, read_only=True)
     created_by = UserSerializer(read_only=True)
     leads = serializers.SerializerMethodField()
+    leads_summary = serializers.SerializerMethodField()
 
     class Meta:
         model = Team
-        fields = ['id', 'name', 'members', 'created_by', 'leads' , 'plan_end_date']
+        fields = ['id', 'name', 'members', 'created_by', 'leads', 'leads_summary', 'plan_end_date']
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # only what was sent: lead_count and client_count are changed with F()
+        # updates by team.quotas meanwhile, and a full save would undo them
+        instance.save(update_fields=list(validated_data))
+        return instance
 
     def get_leads(self, obj):
         from lead.serializers import LeadSerializer  # Lazy import here!
-        leads = obj.leads.all()
-        return LeadSerializer(leads, many=True).data
\ No newline at end of file
+        leads = obj.leads.select_related('assigned_to').order_by('-modified_at', '-id')[:self.RECENT_LEADS]
+        return LeadSerializer(leads, many=True).data
+
+    def get_leads_summary(self, obj):
+        # from the pipeline buckets kept by lead.pipeline: a few rows per
+        # status however many leads the team has
+        from lead.models import Lead, LeadPipelineSummary
+        by_status = {status: 0 for status, _ in Lead.CHOICES_STATUS}
+        rows = (
+            LeadPipelineSummary.objects.filter(team=obj).order_by()
+            .values('status').annotate(count=Sum('lead_count'))
+        )
+        for row in rows:
+            by_status[row['status']] = row['count']
+        return {'total': sum(by_status.values()), 'by_status': by_status}
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from crm_django.cache import bump_data_version_on_commit
+from .context import invalidate_team, invalidate_team_cache
+from .models import Team
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def team_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # instance is a user whose teams changed
+        invalidate_team_cache(instance.pk)
+    elif action == 'pre_clear':
+        invalidate_team(instance.pk)
+    else:
+        invalidate_team_cache(*(pk_set or ()))
+
+
+@receiver(post_delete, sender=Team)
+def team_deleted(sender, instance, **kwargs):
+    invalidate_team(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def member_changed(sender, instance, created, update_fields=None, **kwargs):
+    # lead lists embed the assignee's name; logins only touch last_login
+    if created or update_fields == frozenset(['last_login']):
+        return
+    bump_data_version_on_commit(*instance.teams.values_list('pk', flat=True), using=kwargs.get('using'))
+
+
+@receiver(pre_delete, sender=User)
+def member_deleted(sender, instance, using=None, **kwargs):
+    # their leads are unassigned with an UPDATE that sends no Lead signals
+    bump_data_version_on_commit(*instance.teams.values_list('pk', flat=True), using=using)
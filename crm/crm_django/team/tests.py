@@ -1,3 +1,405 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import time
+from unittest import mock
 
-# Create your tests here.
+import stripe
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from crm_django.testing import QueryCountTestCase
+from lead.models import Lead
+from .billing import process_pending_events
+from .context import invalidate_team_cache, peek_team_id
+from .models import Plan, StripeEvent, Team
+from .plans import plan_registry
+from .quotas import add_to_counter, reconcile
+from . import views
+
+
+class TeamQueryCountTests(QueryCountTestCase):
+    def test_my_team_with_leads(self):
+        self.assertConstantQueries('/api/v1/team/get-my-team/', self.make_leads)
+
+    def test_my_team_with_members(self):
+        self.assertConstantQueries('/api/v1/team/get-my-team/', self.make_members)
+
+    def test_team_list_with_members(self):
+        self.assertConstantQueries('/api/v1/teams/', self.make_members)
+
+    def test_team_leads(self):
+        self.assertConstantQueries('/api/v1/teams/%d/leads/?page_size=100' % self.team.pk, self.make_leads)
+
+
+class MyTeamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner@example.com')
+        cls.team = Team.objects.create(name='Team', created_by=cls.user)
+        cls.team.members.add(cls.user)
+        cls.token = Token.objects.create(user=cls.user)
+        statuses = [Lead.NEW] * 6 + [Lead.CONTACTED] * 3 + [Lead.WON] * 2 + [Lead.LOST]
+        for i, status in enumerate(statuses):
+            Lead.objects.create(
+                team=cls.team, company='Company %d' % i, contact_person='Person', email='lead%d@example.com' % i,
+                phone='555', status=status, created_by=cls.user, assigned_to=cls.user if i % 2 else None,
+            )
+        other = User.objects.create_user('other@example.com')
+        other_team = Team.objects.create(name='Other', created_by=other)
+        Lead.objects.create(team=other_team, company='Other', contact_person='Person', email='o@example.com', created_by=other)
+
+    def setUp(self):
+        cache.clear()
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def expected_leads(self):
+        return list(Lead.objects.filter(team=self.team).order_by('-modified_at', '-id').values_list('pk', flat=True))
+
+    def test_summary(self):
+        summary = self.client.get('/api/v1/team/get-my-team/').data['leads_summary']
+        self.assertEqual(summary, {
+            'total': 12,
+            'by_status': {Lead.NEW: 6, Lead.CONTACTED: 3, Lead.CONTACT_IN_PROGRESS: 0, Lead.LOST: 1, Lead.WON: 2},
+        })
+
+        lead = Lead.objects.filter(team=self.team, status=Lead.NEW).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            lead.status = Lead.WON
+            lead.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Lead.objects.filter(team=self.team, status=Lead.LOST).first().delete()
+        summary = self.client.get('/api/v1/team/get-my-team/').data['leads_summary']
+        self.assertEqual(summary['total'], 11)
+        self.assertEqual((summary['by_status'][Lead.NEW], summary['by_status'][Lead.WON]), (5, 3))
+        self.assertEqual(summary['by_status'][Lead.LOST], 0)
+
+    def test_leads_are_not_scanned(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/api/v1/team/get-my-team/').status_code, 200)
+        # only the recent leads, a LIMIT on the (team, modified_at) index
+        statements = [query['sql'] for query in ctx.captured_queries if 'FROM "lead_lead"' in query['sql']]
+        self.assertTrue(statements)
+        for sql in statements:
+            self.assertTrue('LIMIT' in sql or 'MAX(' in sql, sql)
+
+    def test_team_leads_pages(self):
+        ids, url = [], '/api/v1/teams/%d/leads/?page_size=5' % self.team.pk
+        while url:
+            page = self.client.get(url).json()
+            self.assertEqual(page['count'], 12)
+            ids += [lead['id'] for lead in page['results']]
+            url = page['next']
+        self.assertEqual(ids, self.expected_leads())
+
+    def test_team_leads_stream(self):
+        response = self.client.get('/api/v1/teams/%d/leads/?stream=1' % self.team.pk)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('team-%d-leads.ndjson' % self.team.pk, response['Content-Disposition'])
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], self.expected_leads())
+        self.assertEqual({row['team_id'] for row in rows}, {self.team.pk})
+
+    def test_other_teams_leads_are_not_found(self):
+        other_team = Team.objects.exclude(pk=self.team.pk).get()
+        self.assertEqual(self.client.get('/api/v1/teams/%d/leads/' % other_team.pk).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/teams/%d/leads/?stream=1' % other_team.pk).status_code, 404)
+
+
+class TeamCacheTests(TestCase):
+    """
+    Each user's cached team id must follow membership changes by itself. Only
+    setUp clears the cache, since user ids are reused between tests; the
+    tests prime it and never invalidate it.
+    """
+    def setUp(self):
+        cache.clear()
+        invalidate_team_cache()
+        self.owner = User.objects.create_user('owner@example.com')
+        self.team = Team.objects.create(name='Team', created_by=self.owner)
+        self.team.members.add(self.owner)
+        self.member = User.objects.create_user('member@example.com')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def my_team(self, user):
+        # without a team the payload is that of an empty TeamSerializer, without an id
+        team_id = self.client_for(user).get('/api/v1/team/get-my-team/').data.get('id')
+        self.assertEqual(peek_team_id(user), (True, team_id))
+        return team_id
+
+    def test_added_member_sees_the_team(self):
+        self.assertIsNone(self.my_team(self.member))
+        response = self.client_for(self.owner).post('/api/v1/team/add-member/', {'email': 'member@example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.my_team(self.member), self.team.pk)
+
+    def test_created_team_is_seen(self):
+        self.assertIsNone(self.my_team(self.member))
+        response = self.client_for(self.member).post('/api/v1/teams/', {'name': 'New'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.my_team(self.member), response.data['id'])
+
+        response = self.client_for(self.member).post('/api/v1/leads/', {
+            'company': 'Acme', 'contact_person': 'Person', 'email': 'acme@example.com', 'phone': '555',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Lead.objects.get().team_id, self.my_team(self.member))
+
+    def test_deleted_team_is_forgotten(self):
+        self.assertEqual(self.my_team(self.owner), self.team.pk)
+        self.assertEqual(self.client_for(self.owner).delete('/api/v1/teams/%d/' % self.team.pk).status_code, 204)
+        self.assertIsNone(self.my_team(self.owner))
+
+
+def stripe_signature(payload, secret, timestamp=None):
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode(), ('%d.%s' % (timestamp, payload)).encode(), hashlib.sha256).hexdigest()
+    return 't=%d,v1=%s' % (timestamp, signature)
+
+
+@override_settings(STRIPE_WEBHOOK_KEY='whsec_test', STRIPE_PRICE_ID_SMALL_TEAM='price_small', STRIPE_PRICE_ID_BIG_TEAM='price_big')
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        plan_registry.invalidate()
+        self.user = User.objects.create_user('owner@example.com', password='secret')
+        self.team = Team.objects.create(name='Team', created_by=self.user)
+        self.free = Plan.objects.create(name='Free')
+        self.small = Plan.objects.create(name='Small Team', max_leads=50)
+
+    def send(self, event_id, event_type, obj, created=1700000000):
+        payload = json.dumps({'id': event_id, 'object': 'event', 'type': event_type, 'created': created, 'data': {'object': obj}})
+        return self.client.post(
+            '/api/v1/stripe/webhook/', payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=stripe_signature(payload, 'whsec_test'),
+        )
+
+    def test_bad_signature_is_rejected(self):
+        response = self.client.post(
+            '/api/v1/stripe/webhook/', '{}', content_type='application/json', HTTP_STRIPE_SIGNATURE='t=1,v1=bad',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_events_are_stored_once_and_processed_later(self):
+        session = {'id': 'cs_1', 'client_reference_id': str(self.team.pk), 'customer': 'cus_1', 'subscription': 'sub_1'}
+        for _ in range(2):
+            self.assertEqual(self.send('evt_1', 'checkout.session.completed', session).status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        self.team.refresh_from_db()
+        self.assertIsNone(self.team.stripe_customer_id)
+
+        self.assertEqual(process_pending_events(), 1)
+        self.assertEqual(process_pending_events(), 0)
+        self.team.refresh_from_db()
+        self.assertEqual((self.team.stripe_customer_id, self.team.stripe_subscription_id), ('cus_1', 'sub_1'))
+        self.assertEqual(StripeEvent.objects.get().status, StripeEvent.PROCESSED)
+
+    def test_subscription_events(self):
+        Team.objects.filter(pk=self.team.pk).update(stripe_customer_id='cus_1')
+        subscription = {
+            'id': 'sub_1', 'customer': 'cus_1', 'status': 'active', 'current_period_end': 1800000000,
+            'items': {'data': [{'price': {'id': 'price_small'}}]},
+        }
+        self.send('evt_1', 'customer.subscription.created', subscription)
+        process_pending_events()
+        self.team.refresh_from_db()
+        self.assertEqual((self.team.plan, self.team.plan_status), (self.small, Team.PLAN_ACTIVE))
+        self.assertEqual(self.team.stripe_subscription_id, 'sub_1')
+
+        self.send('evt_2', 'customer.subscription.deleted', dict(subscription, status='canceled'), created=1700000001)
+        process_pending_events()
+        self.team.refresh_from_db()
+        self.assertEqual((self.team.plan, self.team.plan_status), (self.free, Team.PLAN_CANCELLED))
+
+    @override_settings(STRIPE_EVENT_MAX_ATTEMPTS=3, STRIPE_EVENT_RETRY_DELAY=60)
+    def test_failing_events_are_retried_with_backoff_then_marked_failed(self):
+        self.send('evt_1', 'customer.subscription.updated', {'id': 'sub_1'})
+        delays = []
+        for attempt in range(3):
+            start = timezone.now()
+            with self.assertLogs('team.billing', 'ERROR'):
+                self.assertEqual(process_pending_events(), 1)
+            event = StripeEvent.objects.get()
+            self.assertEqual(event.attempts, attempt + 1)
+            if event.status == StripeEvent.FAILED:
+                break
+            delays.append(round((event.next_attempt_at - start).total_seconds()))
+            # not due yet: the worker does not pick it up again
+            self.assertEqual(process_pending_events(), 0)
+            StripeEvent.objects.update(next_attempt_at=start)
+
+        self.assertEqual(delays, [60, 120])
+        self.assertEqual((event.status, event.attempts), (StripeEvent.FAILED, 3))
+        self.assertIn('KeyError', event.last_error)
+        self.assertEqual(process_pending_events(), 0)
+
+    def test_backoff_does_not_hold_up_other_events(self):
+        self.send('evt_1', 'customer.subscription.updated', {'id': 'sub_1'})
+        with self.assertLogs('team.billing', 'ERROR'):
+            process_pending_events()
+        session = {'id': 'cs_1', 'client_reference_id': str(self.team.pk), 'customer': 'cus_1', 'subscription': 'sub_1'}
+        self.send('evt_2', 'checkout.session.completed', session, created=1700000001)
+        self.assertEqual(process_pending_events(), 1)
+        self.assertEqual(StripeEvent.objects.get(event_id='evt_2').status, StripeEvent.PROCESSED)
+
+
+class PlanRegistryTests(TestCase):
+    def setUp(self):
+        plan_registry.invalidate()
+        self.free = Plan.objects.create(name='Free')
+        self.small = Plan.objects.create(name='Small Team', stripe_product_id='prod_small')
+
+    def test_lookups_are_query_free_after_the_first(self):
+        plan_registry.get(name='Free')
+        with self.assertNumQueries(0):
+            self.assertEqual(plan_registry.get(pk=self.free.pk), self.free)
+            self.assertEqual(plan_registry.get(stripe_product_id='prod_small'), self.small)
+            with self.assertRaises(Plan.DoesNotExist):
+                plan_registry.get(name='Big Team')
+
+    def test_saving_a_plan_reloads(self):
+        plan_registry.get(name='Free')
+        Plan.objects.create(name='Big Team')
+        self.assertEqual(plan_registry.get(name='Big Team').name, 'Big Team')
+
+
+class CheckSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        plan_registry.invalidate()
+        self.user = User.objects.create_user('owner@example.com', password='secret')
+        self.team = Team.objects.create(name='Team', created_by=self.user, stripe_subscription_id='sub_1')
+        self.team.members.add(self.user)
+        self.small = Plan.objects.create(name='Small Team', max_leads=50)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @mock.patch('stripe.Product.retrieve')
+    @mock.patch('stripe.Subscription.retrieve')
+    def test_stripe_lookups_are_cached(self, retrieve_subscription, retrieve_product):
+        retrieve_subscription.return_value = stripe.Subscription.construct_from({
+            'id': 'sub_1', 'status': 'active', 'current_period_end': 1800000000, 'plan': {'product': 'prod_small'},
+        }, 'sk_test')
+        retrieve_product.return_value = stripe.Product.construct_from({'id': 'prod_small', 'name': 'Small Team'}, 'sk_test')
+
+        for _ in range(3):
+            response = self.client.post('/api/v1/stripe/check_session/')
+            self.assertNotIn('error', response.data)
+        self.assertEqual((retrieve_subscription.call_count, retrieve_product.call_count), (1, 1))
+        self.team.refresh_from_db()
+        self.assertEqual((self.team.plan, self.team.plan_status), (self.small, Team.PLAN_ACTIVE))
+
+
+class TeamCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        plan_registry.invalidate()
+        self.user = User.objects.create_user('owner@example.com', password='secret')
+        self.plan = Plan.objects.create(name='Tiny', max_leads=3, max_clients=2)
+        self.team = Team.objects.create(name='Team', created_by=self.user, plan=self.plan)
+        self.team.members.add(self.user)
+        invalidate_team_cache()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_lead(self, i):
+        return self.client.post('/api/v1/leads/', {
+            'company': 'Company %d' % i, 'contact_person': 'Person', 'email': 'lead%d@example.com' % i, 'phone': '555',
+        })
+
+    def counters(self):
+        self.team.refresh_from_db()
+        return self.team.lead_count, self.team.client_count
+
+    def test_lead_limit(self):
+        for i in range(3):
+            self.assertEqual(self.create_lead(i).status_code, 201)
+        response = self.create_lead(3)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['detail'].code, 'quota_exceeded')
+        self.assertEqual(self.counters(), (3, 0))
+
+        Lead.objects.filter(team=self.team).first().delete()
+        self.assertEqual(self.counters(), (2, 0))
+        self.assertEqual(self.create_lead(4).status_code, 201)
+        self.assertEqual(self.counters(), (3, 0))
+
+    def test_import_stops_at_the_limit(self):
+        self.create_lead(0)
+        body = 'company,contact_person,email,phone\n' + ''.join('C%d,P,c%d@example.com,555\n' % (i, i) for i in range(4))
+        response = self.client.generic('POST', '/api/v1/leads/import/', body, content_type='text/csv')
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 2))
+        self.assertEqual(self.counters(), (3, 0))
+
+    def test_conversion_counts_clients(self):
+        for i in range(3):
+            self.create_lead(i)
+        lead_ids = list(Lead.objects.filter(team=self.team).values_list('pk', flat=True))
+        response = self.client.post('/api/v1/convert-leads-to-clients/', {'lead_ids': lead_ids}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.counters(), (3, 0))
+
+        response = self.client.post('/api/v1/convert-leads-to-clients/', {'lead_ids': lead_ids[:2]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counters(), (3, 2))
+
+    @mock.patch('stripe.Subscription.delete')
+    @mock.patch('team.views.plan_for_product')
+    @mock.patch('team.views.retrieve_subscription')
+    def test_team_writes_keep_concurrent_counts(self, retrieve_subscription, plan_for_product, delete_subscription):
+        retrieve_subscription.return_value = {'current_period_end': 1800000000, 'product': 'prod_tiny'}
+        plan_for_product.return_value = self.plan
+        Plan.objects.create(name='Free')
+        User.objects.create_user('member@example.com')
+        load_team, load_object = views.get_request_team, views.TeamViewSet.get_object
+
+        def created_meanwhile(load):
+            # another request takes a slot between this one's load and save
+            def wrapper(*args):
+                team = load(*args)
+                add_to_counter(Lead, team.pk, 1)
+                return team
+            return wrapper
+
+        requests = [
+            ('/api/v1/team/add-member/', {'email': 'member@example.com'}),
+            ('/api/v1/team/upgrade-plan/', {'plan': 'free'}),
+            ('/api/v1/stripe/check_session/', {}),
+            ('/api/v1/stripe/cancel_plan/', {}),
+        ]
+        with mock.patch('team.views.get_request_team', created_meanwhile(load_team)), \
+                mock.patch('team.views.TeamViewSet.get_object', created_meanwhile(load_object)):
+            for count, (url, data) in enumerate(requests, 1):
+                with self.subTest(url=url):
+                    self.assertEqual(self.client.post(url, data, format='json').status_code, 200)
+                    self.assertEqual(self.counters(), (count, 0))
+            response = self.client.patch('/api/v1/teams/%d/' % self.team.pk, {'name': 'Renamed'}, format='json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counters(), (5, 0))
+        self.assertEqual(self.team.name, 'Renamed')
+
+    def test_reconcile(self):
+        for i in range(2):
+            self.create_lead(i)
+        Team.objects.filter(pk=self.team.pk).update(lead_count=7, client_count=1)
+        self.assertEqual(
+            sorted(reconcile(dry_run=True)),
+            [(self.team.pk, 'client_count', 1, 0), (self.team.pk, 'lead_count', 7, 2)],
+        )
+        self.assertEqual(self.counters(), (7, 1))
+        reconcile()
+        self.assertEqual(self.counters(), (2, 0))
+        self.assertEqual(reconcile(), [])
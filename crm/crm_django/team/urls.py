@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from crm_django.asyncviews import async_routes
 from .views import TeamViewSet, get_my_team, add_member, UserDetail , upgrade_plan , get_stripe_pub_key , create_checkout_session , stripe_webhook , check_session , cancel_plan
 router = DefaultRouter()
 router.register('teams', TeamViewSet, basename='teams')
 
-urlpatterns = [
+urlpatterns = async_routes([
     path('', include(router.urls)),
     path('team/get-my-team/', get_my_team, name='get-my-team'),
     path('team/add-member/', add_member, name='add-member'),
@@ -16,4 +17,4 @@ urlpatterns = [
     path('stripe/check_session/', check_session, name='check_session'),
     path('stripe/cancel_plan/', cancel_plan, name='cancel_plan'),
  
-]
\ No newline at end of file
+], 'get-my-team')
@@ -1,10 +1,10 @@
 # Standard Library Imports
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Third-Party Imports
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth.models import User
@@ -14,9 +14,18 @@ from django.views.decorators.csrf import csrf_exempt
 import stripe
 
 # Local Application Imports
-from .models import Team, Plan
-from .serializers import TeamSerializer, UserSerializer, PlanSerializer
+from .billing import forget_subscription, plan_for_product, record_event, retrieve_subscription
+from .models import Team
+from .plans import plan_registry
+from .context import get_request_team
+from .serializers import TeamSerializer, UserSerializer
 from crm_django.settings import STRIPE_PUB_KEY
+from crm_django.streaming import ndjson_response
+from crm_django.cache import get_data_version
+from crm_django.conditional import make_etag, not_modified_response, scope_validators, set_validators
+from lead.models import Lead
+from lead.serializers import LeadSerializer
+from lead.views import LeadPagination
 
 
 
@@ -29,12 +38,33 @@ class TeamViewSet(viewsets.ModelViewSet):
     
     
     def get_queryset(self):
-        return self.queryset.filter(members__in=[self.request.user]).first()
+        # TeamSerializer nests the creator and the members
+        return (
+            self.queryset.filter(members__in=[self.request.user])
+            .select_related('created_by')
+            .prefetch_related('members')
+        )
     
     def perform_create(self, serializer):
+        # members.add() invalidates the cached team of the creator (see team.signals)
         obj = serializer.save(created_by=self.request.user)
         obj.members.add(self.request.user)
-        obj.save()
+
+    @action(detail=True, methods=['get'])
+    def leads(self, request, pk=None):
+        team = self.get_object()
+        leads = Lead.objects.filter(team=team).order_by('-modified_at', '-id')
+
+        if request.query_params.get('stream'):
+            return ndjson_response(
+                leads.values().iterator(chunk_size=2000),
+                filename='team-%s-leads.ndjson' % team.pk,
+            )
+
+        paginator = LeadPagination()
+        page = paginator.paginate_queryset(leads.select_related('assigned_to'), request, view=self)
+        serializer = LeadSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
         
 class UserDetail(APIView):
     def get_object(self, request, pk):
@@ -62,42 +92,60 @@ class UserDetail(APIView):
         return Response({'message': 'User deleted successfully'}, status=status.HTTP_200_OK)
         
         
+def team_validators(team):
+    """
+    Validators for the get_my_team payload: the team's own fields, its
+    members, and max(modified_at) of its leads with the team's data version
+    (recent leads and the status summary are both derived from those).
+    """
+    leads_etag, last_modified = scope_validators(Lead.objects.filter(team=team), version=get_data_version(team.pk))
+    members = list(team.members.order_by('pk').values_list('pk', 'username', 'first_name', 'last_name'))
+    etag = make_etag(team.pk, team.name, team.created_by_id, team.plan_end_date, members, leads_etag)
+    return etag, last_modified
+
+
 @api_view(['GET'])
 def get_my_team(request):
-    team = Team.objects.filter(created_by=request.user).first()
-    serializer = TeamSerializer(team)
-    return Response(serializer.data)
+    team = get_request_team(request)
+    if team is None:
+        return Response(TeamSerializer(team).data)
+    etag, last_modified = team_validators(team)
+    response = not_modified_response(request, etag, last_modified)
+    if response is None:
+        response = Response(TeamSerializer(team).data)
+    return set_validators(response, etag, last_modified)
 
 
 @api_view(['POST'])
 def add_member(request):
-    team = Team.objects.filter(members__in=[request.user]).first()
+    team = get_request_team(request)
     email = request.data['email']
     print('Email',email)
     
     user = User.objects.get(username=email)
+    # members.add() invalidates the new member's cached team (see team.signals)
     team.members.add(user)
-    team.save()
     return Response({'message': 'Member added to team'})
 
 
 @api_view(['POST'])
 def upgrade_plan(request):
-    team = Team.objects.filter(members__in=[request.user]).first()
+    team = get_request_team(request)
     plan = request.data.get('plan')
 
     print('Plan', plan)
 
     if plan == 'free':
-        team.plan = Plan.objects.get(name='Free')
+        team.plan = plan_registry.get(name='Free')
     elif plan == 'smallteam':
-        team.plan = Plan.objects.get(name='Small Team')
+        team.plan = plan_registry.get(name='Small Team')
     elif plan == 'bigteam':
-        team.plan = Plan.objects.get(name='Big Team')
+        team.plan = plan_registry.get(name='Big Team')
     else:
         return Response({'error': 'Invalid plan selected.'}, status=400)
 
-    team.save()
+    # never the whole row: lead_count and client_count change under us (team.quotas)
+    team.save(update_fields=['plan'])
     
     serializer = TeamSerializer(team)
     return Response(serializer.data)
@@ -111,7 +159,6 @@ def get_stripe_pub_key(request):
 
 @api_view(['POST'])
 def create_checkout_session(request):
-    stripe.api_key = settings.STRIPE_SECRET_KEY
     data = json.loads(request.body)
     plan = data['plan']
     
@@ -121,7 +168,7 @@ def create_checkout_session(request):
     else:
         price_id = settings.STRIPE_PRICE_ID_BIG_TEAM
         
-    team = Team.objects.filter(members__in=[request.user]).first()
+    team = get_request_team(request)
     
     try:
         checkout_session = stripe.checkout.Session.create(
@@ -145,17 +192,17 @@ def create_checkout_session(request):
         
 @csrf_exempt
 def stripe_webhook(request):
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+    """
+    Verify the event and store it for the ``process_stripe_events`` worker
+    (team.billing); Stripe gets its 200 without waiting for any processing.
+    """
     webhook_key = settings.STRIPE_WEBHOOK_KEY
     
     payload = request.body
-    sig_header = request.META['HTTP_STRIPE_SIGNATURE']
-    event = None
-    
-    print('Payload', payload)
+    sig_header = request.META.get('HTTP_STRIPE_SIGNATURE', '')
     
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, webhook_key
         )
     except ValueError as e:
@@ -163,29 +210,24 @@ def stripe_webhook(request):
     except stripe.error.SignatureVerificationError as e:
         return HttpResponse(status=400)
     
-    if event.type == 'checkout.session.completed':
-        session = event['data']['object']
-        team = Team.objects.get(pk=session['client_reference_id'])
-        team.stripe_customer_id = session['customer']
-        team.save()
+    record_event(json.loads(payload))
         
     return HttpResponse(status=200)
 
 
 @api_view(['POST'])
 def check_session(request):
-    stripe.api_key = settings.STRIPE_SECRET_KEY
     error = ''
     
     try:
-        team = Team.objects.filter(members__in=[request.user]).first()
-        subscription = stripe.Subscription.retrieve(team.stripe_subscription_id)
-        product = stripe.Product.retrieve(subscription.plan.product)
+        team = get_request_team(request)
+        # both Stripe lookups are cached, see team.billing
+        subscription = retrieve_subscription(team.stripe_subscription_id)
         
-        team.plan_status = Team.PLAN_STATUS_ACTIVE
-        team.plan_end_date = datetime.fromtimestamp(subscription.current_period_end)
-        team.plan = Plan.objects.get(name=product.name)
-        team.save()
+        team.plan_status = Team.PLAN_ACTIVE
+        team.plan_end_date = datetime.fromtimestamp(subscription['current_period_end'], tz=timezone.utc)
+        team.plan = plan_for_product(subscription['product'])
+        team.save(update_fields=['plan_status', 'plan_end_date', 'plan'])
         
         serializer = TeamSerializer(team)
         return Response(serializer.data)
@@ -198,16 +240,16 @@ def check_session(request):
 @api_view(['POST'])
 def cancel_plan(request):
     
-    team = Team.objects.filter(members__in=[request.user]).first()
-    plan_free = Plan.objects.get(name='Free')
+    team = get_request_team(request)
+    plan_free = plan_registry.get(name='Free')
     team.plan = plan_free
     team.plan_status = Team.PLAN_CANCELLED
     
-    team.save()
+    team.save(update_fields=['plan', 'plan_status'])
     
     try:
-        stripe.api_key = settings.STRIPE_SECRET_KEY
         stripe.Subscription.delete(team.stripe_subscription_id)
+        forget_subscription(team.stripe_subscription_id)
     except Exception as e:
         return Response({'error': str(e)}, status=400)
     
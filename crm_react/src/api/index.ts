@@ -96,7 +96,9 @@ export const clientService = {
   updateClient: (id: string, data: any) => api.put(`clients/${id}/`, data),
   deleteClient: (id: string) => api.post(`client/delete_client/${id}/`),
   convertLeadToClient: (lead_id: string) => 
-    api.post('convert-lead-to-client/', { lead_id })
+    api.post('convert-lead-to-client/', { lead_id }),
+  convertLeadsToClients: (lead_ids: number[]) =>
+    api.post('convert-leads-to-clients/', { lead_ids })
 };
 
 // Notes services
@@ -26,6 +26,12 @@ export interface Team {
   stripe_customer_id?: string;
   stripe_subscription_id?: string;
   leads: Lead[];
+  leads_summary?: LeadsSummary;
+}
+
+export interface LeadsSummary {
+  total: number;
+  by_status: Record<string, number>;
 }
 
 // Lead related types